@@ -0,0 +1,85 @@
+"""Concurrent claim benchmark.
+
+Seeds one open v1 job and many testers, fires every claim at once and checks that the
+job ends up with exactly max_testers claims and one submission per claim.
+
+    MONGO_URI=mongodb://localhost:27017/peertesthub_bench python benchmarks/claims.py --testers 500 --slots 10
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017/peertesthub_bench")
+os.environ.setdefault("UPLOAD_DIR", "/tmp/peertesthub_bench_uploads")
+os.environ.setdefault("EMAIL_BACKEND", "stub")
+os.makedirs(os.environ["UPLOAD_DIR"], exist_ok=True)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import HTTPException  # noqa: E402
+
+import main  # noqa: E402
+
+JOB_ID = "job_bench_claims"
+BUILDER = "bench-builder@example.com"
+
+async def seed(num_testers: int, slots: int):
+    if not main.db.name.endswith("_bench"):
+        raise SystemExit(f"Refusing to seed '{main.db.name}': benchmark databases must end in _bench")
+    await main.db.client.drop_database(main.db.name)
+    await main.create_indexes()
+
+    await main.users_col.insert_many([
+        {"email": f"bench-tester-{i}@example.com", "first_name": "Bench", "last_name": str(i), "role": "tester"}
+        for i in range(num_testers)
+    ])
+    await main.jobs_col.insert_one({
+        "_id": JOB_ID,
+        "project_id": "proj_bench",
+        "builder_email": BUILDER,
+        "title": "Claim benchmark",
+        "status": "open",
+        "payout_amount": 10.0,
+        "max_testers": slots,
+        "assigned_testers": [],
+        "submissions": [],
+        "resolved_submissions": 0,
+        "created_at": "2024-01-01T00:00:00",
+    })
+
+async def claim(email: str) -> bool:
+    try:
+        await main.claim_job(JOB_ID, email=email)
+        return True
+    except HTTPException as e:
+        if e.status_code != 400:
+            raise
+        return False
+
+async def run(num_testers: int, slots: int):
+    await seed(num_testers, slots)
+    emails = [f"bench-tester-{i}@example.com" for i in range(num_testers)]
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(claim(e) for e in emails))
+    elapsed = time.perf_counter() - start
+
+    job = await main.jobs_col.find_one({"_id": JOB_ID})
+    submissions = await main.submissions_col.count_documents({"job_id": JOB_ID})
+    granted = sum(results)
+    print(f"{num_testers} concurrent claims in {elapsed * 1000:.0f}ms ({num_testers / elapsed:.0f} claims/s)")
+    print(f"granted={granted} assigned={len(job['assigned_testers'])} submissions={submissions} slots={slots}")
+
+    ok = granted == len(job["assigned_testers"]) == submissions == min(slots, num_testers)
+    await main.db.client.drop_database(main.db.name)
+    if not ok:
+        raise SystemExit("OVERBOOKED or lost claims")
+    print("no overbooking")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--testers", type=int, default=500)
+    parser.add_argument("--slots", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(run(args.testers, args.slots))
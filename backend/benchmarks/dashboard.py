@@ -0,0 +1,83 @@
+"""Dashboard latency benchmark.
+
+Seeds a throwaway database with one builder owning many jobs (half v2, each with bids)
+and one tester with many submissions, then times the dashboard aggregations.
+
+    MONGO_URI=mongodb://localhost:27017/peertesthub_bench python benchmarks/dashboard.py --jobs 10000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017/peertesthub_bench")
+os.environ.setdefault("UPLOAD_DIR", "/tmp/peertesthub_bench_uploads")
+os.makedirs(os.environ["UPLOAD_DIR"], exist_ok=True)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+BUILDER = "bench-builder@example.com"
+TESTER = "bench-tester@example.com"
+
+async def seed(num_jobs: int):
+    if not main.db.name.endswith("_bench"):
+        raise SystemExit(f"Refusing to seed '{main.db.name}': benchmark databases must end in _bench")
+    await main.db.client.drop_database(main.db.name)
+    await main.create_indexes()
+
+    jobs, bids, subs = [], [], []
+    for i in range(num_jobs):
+        job_id = f"job_bench_{i}"
+        is_v2 = i % 2 == 0
+        jobs.append({
+            "_id": job_id,
+            "builder_email": BUILDER,
+            "version": 2 if is_v2 else 1,
+            "status": ["open", "in_progress", "completed"][i % 3],
+            "total_charge": None if is_v2 else 57.5,
+            "payout_amount": None if is_v2 else 25.0,
+            "created_at": f"2024-01-01T00:00:{i:06d}",
+        })
+        if is_v2:
+            bids.append({"_id": f"bid_bench_{i}_a", "job_id": job_id, "tester_email": TESTER, "status": "accepted", "payment_status": "paid", "total_charge": 46.0})
+            bids.append({"_id": f"bid_bench_{i}_b", "job_id": job_id, "tester_email": TESTER, "status": "pending", "payment_status": None, "total_charge": None})
+        subs.append({
+            "_id": f"sub_bench_{i}",
+            "job_id": job_id,
+            "builder_email": BUILDER,
+            "tester_email": TESTER,
+            "status": ["draft", "submitted", "approved"][i % 3],
+            "payout_amount": 20.0 if is_v2 else None,
+        })
+
+    for col, docs in ((main.jobs_col, jobs), (main.bids_col, bids), (main.submissions_col, subs)):
+        for start in range(0, len(docs), 5000):
+            await col.insert_many(docs[start:start + 5000])
+
+async def timed(label: str, fn, runs: int):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    p95 = samples[max(int(len(samples) * 0.95) - 1, 0)]
+    print(f"{label:<10} p50={statistics.median(samples):7.1f}ms  p95={p95:7.1f}ms  max={samples[-1]:7.1f}ms")
+
+async def run(num_jobs: int, runs: int):
+    print(f"Seeding {num_jobs} jobs for one builder...")
+    await seed(num_jobs)
+    print(await main.builder_dashboard_stats(BUILDER))
+    await timed("builder", lambda: main.builder_dashboard_stats(BUILDER), runs)
+    await timed("tester", lambda: main.tester_dashboard_stats(TESTER), runs)
+    await main.db.client.drop_database(main.db.name)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=10000)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.jobs, args.runs))
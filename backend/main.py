@@ -1,23 +1,43 @@
-from fastapi import FastAPI, HTTPException, Depends, status, Response, Request, Cookie, UploadFile, File
+from fastapi import FastAPI, HTTPException, Depends, Query, status, Response, Request, Cookie, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import RedirectResponse
 from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List
-from pathlib import Path
-from datetime import datetime, timedelta
+from pathlib import Path, PurePosixPath
+from datetime import datetime, timedelta, timezone
 from jose import jwt, JWTError, ExpiredSignatureError
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from dotenv import load_dotenv
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import asyncio
+import base64
 import bcrypt
+import copy
+import gzip
+import hashlib
+import json
 import os
 import uuid
 import secrets
+import shutil
 import random
 import stripe
 import resend
 import logging
+import media_jobs
+import multiprocessing
+import mimetypes
+import posixpath
+import re
 import aiofiles
+import time
+import zlib
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
+from functools import partial
+from types import SimpleNamespace
 
 load_dotenv()
 
@@ -44,7 +64,95 @@ FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:5008")
 PLATFORM_FEE_RATE = 0.15
 UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads")
 MAX_UPLOAD_SIZE = 500 * 1024 * 1024  # 500MB
+MAX_RRWEB_SIZE = 50 * 1024 * 1024  # 50MB compressed
+MAX_RRWEB_SEGMENT_SIZE = 10 * 1024 * 1024
+# Each segment is parsed whole at finalize, so it gets a far smaller decompressed cap than a full recording
+MAX_RRWEB_SEGMENT_DECOMPRESSED_SIZE = int(os.getenv("MAX_RRWEB_SEGMENT_DECOMPRESSED_MB", "32")) * 1024 * 1024
+MAX_RRWEB_SEGMENTS = 10000
+RRWEB_INDEX_SEGMENT_SECONDS = int(os.getenv("RRWEB_INDEX_SEGMENT_SECONDS", "30"))
+RRWEB_POINTER_SAMPLE_MS = int(os.getenv("RRWEB_POINTER_SAMPLE_MS", "50"))
+# Recordings are parsed whole, so at most RRWEB_PROCESS_WORKERS at a time, each capped once decompressed
+RRWEB_PROCESS_WORKERS = int(os.getenv("RRWEB_PROCESS_WORKERS", "2"))
+MAX_RRWEB_DECOMPRESSED_SIZE = int(os.getenv("MAX_RRWEB_DECOMPRESSED_MB", "512")) * 1024 * 1024
+# A compacted recording only replaces the original when it is at least this fraction smaller
+RRWEB_COMPACT_MIN_SAVINGS = float(os.getenv("RRWEB_COMPACT_MIN_SAVINGS", "0.1"))
 ALLOWED_VIDEO_TYPES = {"video/webm", "video/mp4", "video/quicktime"}
+VIDEO_CHUNK_SIZE = 8 * 1024 * 1024  # recommended chunk size for resumable uploads
+VIDEO_CHUNK_MAX_SIZE = 64 * 1024 * 1024
+VIDEO_UPLOAD_EXPIRE_HOURS = int(os.getenv("VIDEO_UPLOAD_EXPIRE_HOURS", "24"))
+# Thumbnails, posters and previews are made on a process pool (Pillow in-process, ffmpeg as a subprocess)
+MEDIA_WORKERS = int(os.getenv("MEDIA_WORKERS", "2"))
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+THUMBNAIL_MAX_PX = int(os.getenv("THUMBNAIL_MAX_PX", "480"))
+VIDEO_POSTER_WIDTH = int(os.getenv("VIDEO_POSTER_WIDTH", "640"))
+VIDEO_PREVIEW_HEIGHT = int(os.getenv("VIDEO_PREVIEW_HEIGHT", "360"))
+VIDEO_PREVIEW_SECONDS = int(os.getenv("VIDEO_PREVIEW_SECONDS", "15"))
+# HLS transcodes: at most TRANSCODE_WORKERS ffmpeg processes; HLS_LADDER is "height:video_kbps,..."
+TRANSCODE_WORKERS = int(os.getenv("TRANSCODE_WORKERS", "1"))
+FFPROBE_BIN = os.getenv("FFPROBE_BIN", "ffprobe")
+HLS_LADDER = [tuple(int(x) for x in rung.split(":")) for rung in os.getenv("HLS_LADDER", "1080:5000,720:2800,480:1400,360:800").split(",")]
+HLS_SEGMENT_SECONDS = int(os.getenv("HLS_SEGMENT_SECONDS", "4"))
+TRANSCODE_TIMEOUT_SECONDS = int(os.getenv("TRANSCODE_TIMEOUT_SECONDS", "3600"))
+# Clips are cut from video_tags ranges; stream copy is used when a keyframe is this close before the start
+CLIP_WORKERS = int(os.getenv("CLIP_WORKERS", "2"))
+CLIP_KEYFRAME_TOLERANCE_SECONDS = float(os.getenv("CLIP_KEYFRAME_TOLERANCE_SECONDS", "0.5"))
+CLIP_MAX_SECONDS = int(os.getenv("CLIP_MAX_SECONDS", "600"))
+MEDIA_TOKEN_EXPIRE_HOURS = int(os.getenv("MEDIA_TOKEN_EXPIRE_HOURS", "12"))
+MEDIA_CACHE_MAX_AGE_SECONDS = int(os.getenv("MEDIA_CACHE_MAX_AGE_SECONDS", "3600"))
+# Behind nginx, set to an `internal` location aliased to UPLOAD_DIR (e.g. /_media/) so nginx sends the file
+MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv("MEDIA_ACCEL_REDIRECT_PREFIX", "")
+# Object storage: "local" keeps media in UPLOAD_DIR, "s3" uses an S3-compatible bucket (UPLOAD_DIR is then scratch space)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+STORAGE_WORKERS = int(os.getenv("STORAGE_WORKERS", "8"))
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL", "")
+S3_PUBLIC_ENDPOINT_URL = os.getenv("S3_PUBLIC_ENDPOINT_URL", "")
+S3_BUCKET = os.getenv("S3_BUCKET", "peertesthub-media")
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+S3_ACCESS_KEY_ID = os.getenv("S3_ACCESS_KEY_ID", "")
+S3_SECRET_ACCESS_KEY = os.getenv("S3_SECRET_ACCESS_KEY", "")
+S3_PRESIGN_EXPIRE_SECONDS = int(os.getenv("S3_PRESIGN_EXPIRE_SECONDS", "3600"))
+# Unreferenced uploads older than the grace period are deleted; 0 quota means unlimited
+STORAGE_GC_INTERVAL_SECONDS = int(os.getenv("STORAGE_GC_INTERVAL_SECONDS", "3600"))
+STORAGE_GC_GRACE_HOURS = int(os.getenv("STORAGE_GC_GRACE_HOURS", "24"))
+STORAGE_GC_DRY_RUN = os.getenv("STORAGE_GC_DRY_RUN", "false").lower() == "true"
+# Storage is listed a page at a time and checked against submissions this many units at a time
+STORAGE_SCAN_PAGE_SIZE = 1000
+STORAGE_GC_BATCH_SIZE = int(os.getenv("STORAGE_GC_BATCH_SIZE", "500"))
+# Video and rrweb media of drafts this old, untouched for as long, is detached and deleted (0 keeps it)
+STORAGE_GC_DRAFT_IDLE_DAYS = int(os.getenv("STORAGE_GC_DRAFT_IDLE_DAYS", "30"))
+TESTER_STORAGE_QUOTA_MB = int(os.getenv("TESTER_STORAGE_QUOTA_MB", "0"))
+
+# Password hashing runs on its own thread pool so bcrypt never blocks the event loop
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+PASSWORD_REHASH_ON_LOGIN = os.getenv("PASSWORD_REHASH_ON_LOGIN", "false").lower() == "true"
+
+# Payment gateway: "stripe" talks to Stripe, "fake" is an offline backend for load testing
+PAYMENTS_BACKEND = os.getenv("PAYMENTS_BACKEND", "stripe")
+STRIPE_MAX_CONCURRENCY = int(os.getenv("STRIPE_MAX_CONCURRENCY", "16"))
+STRIPE_TIMEOUT_SECONDS = float(os.getenv("STRIPE_TIMEOUT_SECONDS", "20"))
+STRIPE_FAKE_LATENCY_MS = int(os.getenv("STRIPE_FAKE_LATENCY_MS", "0"))
+STRIPE_TRANSFER_RETRY_SECONDS = int(os.getenv("STRIPE_TRANSFER_RETRY_SECONDS", "300"))
+STRIPE_TRANSFER_MAX_ATTEMPTS = int(os.getenv("STRIPE_TRANSFER_MAX_ATTEMPTS", "10"))
+
+# Email outbox: "resend" delivers via Resend, "stub" only logs (for benchmarking without network)
+EMAIL_BACKEND = os.getenv("EMAIL_BACKEND", "resend")
+EMAIL_WORKERS = int(os.getenv("EMAIL_WORKERS", "2"))
+EMAIL_BATCH_SIZE = min(int(os.getenv("EMAIL_BATCH_SIZE", "50")), 100)  # Resend batch limit is 100
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "6"))
+EMAIL_RETRY_BASE_SECONDS = int(os.getenv("EMAIL_RETRY_BASE_SECONDS", "30"))
+EMAIL_POLL_SECONDS = float(os.getenv("EMAIL_POLL_SECONDS", "5"))
+EMAIL_LEASE_SECONDS = 120
+EMAIL_STUB_LATENCY_MS = int(os.getenv("EMAIL_STUB_LATENCY_MS", "0"))
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+
+COUNTERS_RECONCILE_SECONDS = int(os.getenv("COUNTERS_RECONCILE_SECONDS", "300"))
+DASHBOARD_CACHE_TTL_SECONDS = float(os.getenv("DASHBOARD_CACHE_TTL_SECONDS", "15"))
+PUBLIC_FEED_CACHE_TTL_SECONDS = int(os.getenv("PUBLIC_FEED_CACHE_TTL_SECONDS", "60"))
+TESTER_PROFILE_CACHE_TTL_SECONDS = float(os.getenv("TESTER_PROFILE_CACHE_TTL_SECONDS", "300"))
 
 stripe.api_key = STRIPE_SECRET_KEY
 resend.api_key = RESEND_API_KEY
@@ -59,6 +167,25 @@ jobs_col = db.jobs
 submissions_col = db.submissions
 bids_col = db.bids
 refresh_tokens_col = db.refresh_tokens
+email_outbox_col = db.email_outbox
+counters_col = db.counters
+video_uploads_col = db.video_uploads
+direct_uploads_col = db.direct_uploads
+screenshots_col = db.screenshots
+clips_col = db.clips
+storage_usage_col = db.storage_usage
+cache_col = db.cache
+
+transactions_supported = False
+
+async def run_in_transaction(fn):
+    """Run fn(session) as one multi-document transaction when the deployment supports it
+    (replica set / sharded). On a standalone server fn runs with session=None, so callers
+    must keep their writes idempotent."""
+    if not transactions_supported:
+        return await fn(None)
+    async with await client.start_session() as session:
+        return await session.with_transaction(fn)
 
 # --- App ---
 
@@ -71,15 +198,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 ALLOWED_IMAGE_TYPES = {"image/png", "image/jpeg", "image/webp"}
+IMAGE_EXTENSIONS = {"image/png": "png", "image/jpeg": "jpg", "image/webp": "webp"}
 MAX_SCREENSHOT_SIZE = 10 * 1024 * 1024  # 10MB
 
+@app.on_event("startup")
+async def detect_transaction_support():
+    global transactions_supported
+    try:
+        hello = await client.admin.command("hello")
+        transactions_supported = bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
+    except Exception as e:
+        logger.warning("Could not detect MongoDB topology, transactions disabled: %s", e)
+    if not transactions_supported:
+        logger.info("MongoDB is standalone; multi-document writes fall back to idempotent sequences")
+
 @app.on_event("startup")
 async def create_indexes():
     Path(UPLOAD_DIR).mkdir(exist_ok=True)
     (Path(UPLOAD_DIR) / "screenshots").mkdir(exist_ok=True)
+    (Path(UPLOAD_DIR) / "partial").mkdir(exist_ok=True)
+    (Path(UPLOAD_DIR) / "clips").mkdir(exist_ok=True)
     await users_col.create_index("email", unique=True)
     await users_col.create_index("email_verification_code", sparse=True)
     await users_col.create_index("stripe_connect_id", sparse=True)
@@ -87,6 +229,7 @@ async def create_indexes():
     await projects_col.create_index("builder_email")
     await jobs_col.create_index("builder_email")
     await jobs_col.create_index("status")
+    await jobs_col.create_index([("status", 1), ("created_at", -1)])
     await jobs_col.create_index("stripe_payment_intent_id", sparse=True)
     await submissions_col.create_index("job_id")
     await submissions_col.create_index("tester_email")
@@ -95,10 +238,34 @@ async def create_indexes():
     await bids_col.create_index("tester_email")
     await bids_col.create_index([("job_id", 1), ("tester_email", 1)])
     await bids_col.create_index("status")
+    # Keyset pagination: (owner filter, created_at, _id)
+    await projects_col.create_index([("builder_email", 1), ("created_at", -1), ("_id", -1)])
+    await projects_col.create_index([("status", 1), ("created_at", -1), ("_id", -1)])
+    await jobs_col.create_index([("builder_email", 1), ("created_at", -1), ("_id", -1)])
+    await jobs_col.create_index([("assigned_testers", 1), ("created_at", -1), ("_id", -1)])
+    await submissions_col.create_index([("builder_email", 1), ("created_at", -1), ("_id", -1)])
+    await submissions_col.create_index([("tester_email", 1), ("created_at", -1), ("_id", -1)])
+    await submissions_col.create_index([("job_id", 1), ("created_at", -1), ("_id", -1)])
+    await bids_col.create_index([("tester_email", 1), ("created_at", -1), ("_id", -1)])
+    await bids_col.create_index([("builder_email", 1), ("created_at", -1), ("_id", -1)])
+    await bids_col.create_index([("job_id", 1), ("created_at", -1), ("_id", -1)])
     await submissions_col.create_index("bid_id", sparse=True)
     await submissions_col.create_index("item_id", sparse=True)
+    await submissions_col.create_index("stripe_transfer_error", sparse=True)
     await refresh_tokens_col.create_index("token", unique=True)
     await refresh_tokens_col.create_index("expires_at", expireAfterSeconds=0)
+    await email_outbox_col.create_index([("status", 1), ("next_attempt_at", 1)])
+    await video_uploads_col.create_index([("status", 1), ("expires_at", 1)])
+    await direct_uploads_col.create_index([("status", 1), ("expires_at", 1)])
+    await clips_col.create_index("submission_id")
+    # Storage GC checks listed files against these
+    for field in (*STORAGE_MEDIA_FIELDS, "screenshots", "bug_reports.screenshot_url", "rrweb_index.key", "storage_usage.files"):
+        await submissions_col.create_index(field, sparse=True)
+    await clips_col.create_index("clip_url", sparse=True)
+    await direct_uploads_col.create_index("key")
+    await storage_usage_col.create_index("files")
+    await email_outbox_col.create_index("lease_token", sparse=True)
+    await email_outbox_col.create_index("sent_at", expireAfterSeconds=7 * 24 * 60 * 60)
 
 # --- Pydantic Models ---
 
@@ -165,6 +332,17 @@ class VideoTagsUpdate(BaseModel):
 class VerifyCodeBody(BaseModel):
     code: str
 
+class VideoUploadCreate(BaseModel):
+    filename: str = Field(..., max_length=255)
+    content_type: str
+    size: int = Field(..., gt=0, le=MAX_UPLOAD_SIZE)
+
+class DirectUploadCreate(BaseModel):
+    kind: str = Field(..., pattern="^video$")
+    filename: str = Field("", max_length=255)
+    content_type: str
+    size: int = Field(..., gt=0)
+
 # --- V2 Structured Jobs + Bidding Models ---
 
 class TestPlanPage(BaseModel):
@@ -206,21 +384,6 @@ class BidCreate(BaseModel):
 
 # --- Email Helpers ---
 
-def send_email(to: str, subject: str, html: str):
-    """Fire-and-forget email via Resend. Failures logged but never block."""
-    if not RESEND_API_KEY:
-        logger.warning("RESEND_API_KEY not set, skipping email to %s", to)
-        return
-    try:
-        resend.Emails.send({
-            "from": RESEND_FROM_EMAIL,
-            "to": [to],
-            "subject": subject,
-            "html": html,
-        })
-    except Exception as e:
-        logger.error("Failed to send email to %s: %s", to, e)
-
 def generate_verification_code() -> str:
     return f"{random.randint(0, 999999):06d}"
 
@@ -313,14 +476,473 @@ def email_rejected_html(tester_name: str, job_title: str, feedback: str) -> str:
     </div>
     """
 
-# --- Helpers ---
+# --- Email Outbox ---
+
+EMAIL_TEMPLATES = {
+    "verification_code": email_verification_code_html,
+    "job_claimed": email_job_claimed_html,
+    "submission_submitted": email_submission_submitted_html,
+    "approved": email_approved_html,
+    "new_bid": email_new_bid_html,
+    "bid_accepted": email_bid_accepted_html,
+    "bid_rejected": email_bid_rejected_html,
+    "rejected": email_rejected_html,
+}
+
+class ResendSender:
+    """Delivers a batch of rendered emails through the Resend batch API."""
+
+    def send_batch(self, messages: list):
+        if not RESEND_API_KEY:
+            logger.warning("RESEND_API_KEY not set, skipping %d email(s)", len(messages))
+            return
+        resend.Batch.send([
+            {"from": RESEND_FROM_EMAIL, "to": [m["to"]], "subject": m["subject"], "html": m["html"]}
+            for m in messages
+        ])
+
+class StubEmailSender:
+    """Offline sender: counts messages and simulates latency with EMAIL_STUB_LATENCY_MS."""
+
+    def __init__(self, latency_ms: int = 0):
+        self.latency = latency_ms / 1000
+        self.delivered = 0
+
+    def send_batch(self, messages: list):
+        if self.latency:
+            time.sleep(self.latency)
+        self.delivered += len(messages)
+        logger.info("Stub email sender: delivered batch of %d", len(messages))
+
+class EmailOutbox:
+    """Persistent email queue backed by email_outbox_col.
+
+    Request handlers only insert a pending row. Worker tasks claim batches under a lease,
+    render the template, send the batch off the event loop and retry failures with
+    exponential backoff. Rows whose lease expires (worker crash) are picked up again.
+    """
+
+    def __init__(self, sender):
+        self.sender = sender
+        self.wakeup = asyncio.Event()
+        self.tasks: list = []
+        self.depth = 0
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+
+    async def enqueue(self, to: str, subject: str, template: str, args: list):
+        now = datetime.utcnow()
+        await email_outbox_col.insert_one({
+            "_id": f"email_{uuid.uuid4().hex[:12]}",
+            "to": to,
+            "subject": subject,
+            "template": template,
+            "args": args,
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now.isoformat(),
+            "last_error": None,
+        })
+        self.depth += 1
+        self.wakeup.set()
+
+    def start(self, workers: int):
+        self.tasks = [asyncio.create_task(self._run()) for _ in range(workers)]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    async def _claim_batch(self) -> list:
+        now = datetime.utcnow()
+        claimable = {"$or": [
+            {"status": "pending", "next_attempt_at": {"$lte": now}},
+            {"status": "sending", "lease_expires_at": {"$lt": now}},
+        ]}
+        candidates = await email_outbox_col.find(claimable, {"_id": 1}).sort("next_attempt_at", 1).to_list(EMAIL_BATCH_SIZE)
+        if not candidates:
+            return []
+        token = uuid.uuid4().hex
+        await email_outbox_col.update_many(
+            {"_id": {"$in": [c["_id"] for c in candidates]}, **claimable},
+            {
+                "$set": {"status": "sending", "lease_token": token, "lease_expires_at": now + timedelta(seconds=EMAIL_LEASE_SECONDS)},
+                "$inc": {"attempts": 1},
+            },
+        )
+        return await email_outbox_col.find({"lease_token": token, "status": "sending"}).to_list(EMAIL_BATCH_SIZE)
+
+    async def _deliver(self, batch: list):
+        messages, ids = [], []
+        for doc in batch:
+            try:
+                html = EMAIL_TEMPLATES[doc["template"]](*doc["args"])
+            except Exception as e:
+                logger.error("Failed to render email %s (%s): %s", doc["_id"], doc["template"], e)
+                await email_outbox_col.update_one({"_id": doc["_id"]}, {"$set": {"status": "failed", "last_error": str(e)}})
+                self.failed += 1
+                continue
+            messages.append({"to": doc["to"], "subject": doc["subject"], "html": html})
+            ids.append(doc["_id"])
+        if not messages:
+            return
+
+        try:
+            await asyncio.to_thread(self.sender.send_batch, messages)
+        except Exception as e:
+            logger.error("Failed to send email batch of %d: %s", len(messages), e)
+            now = datetime.utcnow()
+            for doc in batch:
+                if doc["_id"] not in ids:
+                    continue
+                if doc["attempts"] >= EMAIL_MAX_ATTEMPTS:
+                    await email_outbox_col.update_one({"_id": doc["_id"]}, {"$set": {"status": "failed", "last_error": str(e)}})
+                    self.failed += 1
+                else:
+                    backoff = min(EMAIL_RETRY_BASE_SECONDS * 2 ** (doc["attempts"] - 1), 3600)
+                    await email_outbox_col.update_one({"_id": doc["_id"]}, {"$set": {
+                        "status": "pending",
+                        "next_attempt_at": now + timedelta(seconds=backoff * random.uniform(0.8, 1.2)),
+                        "last_error": str(e),
+                    }})
+                    self.retried += 1
+            return
+
+        await email_outbox_col.update_many(
+            {"_id": {"$in": ids}},
+            {"$set": {"status": "sent", "sent_at": datetime.utcnow()}, "$unset": {"lease_token": "", "lease_expires_at": ""}},
+        )
+        self.sent += len(ids)
+
+    async def _run(self):
+        while True:
+            self.wakeup.clear()
+            try:
+                batch = await self._claim_batch()
+                if batch:
+                    await self._deliver(batch)
+                    continue
+                self.depth = await email_outbox_col.count_documents({"status": {"$in": ["pending", "sending"]}})
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Email outbox worker error: %s", e)
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), EMAIL_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    def metrics(self) -> dict:
+        return {
+            "backend": EMAIL_BACKEND,
+            "queue_depth": self.depth,
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+email_outbox = EmailOutbox(StubEmailSender(EMAIL_STUB_LATENCY_MS) if EMAIL_BACKEND == "stub" else ResendSender())
+
+async def queue_email(to: str, subject: str, template: str, *args):
+    """Queue a templated email; rendering and delivery happen on the outbox workers."""
+    await email_outbox.enqueue(to, subject, template, list(args))
+
+@app.on_event("startup")
+async def start_email_outbox():
+    email_outbox.start(EMAIL_WORKERS)
+
+@app.on_event("shutdown")
+async def stop_email_outbox():
+    await email_outbox.stop()
+
+# --- Password Hashing Pool ---
+
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+password_jobs_in_flight = 0
 
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+def _hash_password_sync(password: str) -> str:
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode("utf-8")
 
-def check_password(plain: str, hashed: str) -> bool:
+def _check_password_sync(plain: str, hashed: str) -> bool:
     return bcrypt.checkpw(plain.encode("utf-8"), hashed.encode("utf-8"))
 
+async def run_password_job(fn, *args):
+    """Run bcrypt work on the password pool. Rejects with 503 once workers + queue are saturated."""
+    global password_jobs_in_flight
+    if password_jobs_in_flight >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_QUEUE:
+        logger.warning("Password pool saturated (%d in flight), rejecting request", password_jobs_in_flight)
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy, please try again shortly",
+            headers={"Retry-After": "1"},
+        )
+    password_jobs_in_flight += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(password_executor, fn, *args)
+    finally:
+        password_jobs_in_flight -= 1
+
+async def hash_password(password: str) -> str:
+    return await run_password_job(_hash_password_sync, password)
+
+async def check_password(plain: str, hashed: str) -> bool:
+    return await run_password_job(_check_password_sync, plain, hashed)
+
+def password_needs_rehash(hashed: str) -> bool:
+    """True if the stored hash was made with a different cost factor than BCRYPT_ROUNDS."""
+    try:
+        return int(hashed.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return False
+
+@app.on_event("shutdown")
+async def shutdown_password_pool():
+    password_executor.shutdown(wait=False, cancel_futures=True)
+
+# --- Payment Gateway ---
+
+# Per-operation timeouts (seconds); anything not listed uses STRIPE_TIMEOUT_SECONDS
+STRIPE_OP_TIMEOUTS = {
+    "retrieve_payment_intent": min(STRIPE_TIMEOUT_SECONDS, 10),
+    "retrieve_account": min(STRIPE_TIMEOUT_SECONDS, 10),
+    "create_refund": STRIPE_TIMEOUT_SECONDS * 1.5,
+    "create_transfer": STRIPE_TIMEOUT_SECONDS * 1.5,
+    "list_transfers": min(STRIPE_TIMEOUT_SECONDS, 10),
+}
+
+def idempotency_options(key: Optional[str]) -> dict:
+    return {"idempotency_key": key} if key else {}
+
+class StripeBackend:
+    """Blocking calls into the Stripe SDK. Only ever invoked from the gateway's thread pool.
+
+    Every operation goes through a client whose HTTP timeout is that operation's timeout, so when
+    a call gives up the request has really ended and its pool thread is free again.
+    """
+
+    def __init__(self):
+        self.clients: dict = {}
+        for timeout in {STRIPE_TIMEOUT_SECONDS, *STRIPE_OP_TIMEOUTS.values()}:
+            # requests-based client keeps one keep-alive session per pool thread; no SDK retries
+            # so the timeout bounds the whole call (idempotency keys make caller retries safe)
+            client = stripe.StripeClient(
+                STRIPE_SECRET_KEY, http_client=stripe.RequestsClient(timeout=timeout), max_network_retries=0,
+            )
+            # Newer SDKs namespace the API services under v1
+            self.clients[timeout] = getattr(client, "v1", client)
+
+    def _api(self, op: str):
+        return self.clients[STRIPE_OP_TIMEOUTS.get(op, STRIPE_TIMEOUT_SECONDS)]
+
+    def create_customer(self, **params):
+        return self._api("create_customer").customers.create(params)
+
+    def create_payment_intent(self, idempotency_key: Optional[str] = None, **params):
+        return self._api("create_payment_intent").payment_intents.create(params, idempotency_options(idempotency_key))
+
+    def retrieve_payment_intent(self, pi_id: str):
+        return self._api("retrieve_payment_intent").payment_intents.retrieve(pi_id)
+
+    def create_transfer(self, idempotency_key: Optional[str] = None, **params):
+        return self._api("create_transfer").transfers.create(params, idempotency_options(idempotency_key))
+
+    def list_transfers(self, **params):
+        return self._api("list_transfers").transfers.list(params).data
+
+    def create_refund(self, idempotency_key: Optional[str] = None, **params):
+        return self._api("create_refund").refunds.create(params, idempotency_options(idempotency_key))
+
+    def create_account(self, **params):
+        return self._api("create_account").accounts.create(params)
+
+    def retrieve_account(self, account_id: str):
+        return self._api("retrieve_account").accounts.retrieve(account_id)
+
+    def create_account_link(self, **params):
+        return self._api("create_account_link").account_links.create(params)
+
+class FakeStripeBackend:
+    """Offline stand-in for Stripe. Payments always succeed; latency is simulated with STRIPE_FAKE_LATENCY_MS."""
+
+    def __init__(self, latency_ms: int = 0):
+        self.latency = latency_ms / 1000
+        self.payment_intents: dict = {}
+        self.accounts: dict = {}
+        self.transfers: list = []
+        self.idempotent: dict = {}
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _new_id(self, prefix: str) -> str:
+        return f"{prefix}_fake_{uuid.uuid4().hex[:16]}"
+
+    def _once(self, key: Optional[str], make):
+        if not key:
+            return make()
+        if key not in self.idempotent:
+            self.idempotent[key] = make()
+        return self.idempotent[key]
+
+    def create_customer(self, **params):
+        self._wait()
+        return SimpleNamespace(id=self._new_id("cus"), **params)
+
+    def create_payment_intent(self, idempotency_key: Optional[str] = None, **params):
+        self._wait()
+
+        def make():
+            pi_id = self._new_id("pi")
+            pi = SimpleNamespace(id=pi_id, client_secret=f"{pi_id}_secret", status="succeeded", **params)
+            self.payment_intents[pi_id] = pi
+            return pi
+        return self._once(idempotency_key, make)
+
+    def retrieve_payment_intent(self, pi_id: str):
+        self._wait()
+        return self.payment_intents.get(pi_id) or SimpleNamespace(id=pi_id, client_secret=f"{pi_id}_secret", status="succeeded")
+
+    def create_transfer(self, idempotency_key: Optional[str] = None, **params):
+        self._wait()
+
+        def make():
+            transfer = SimpleNamespace(id=self._new_id("tr"), **params)
+            self.transfers.append(transfer)
+            return transfer
+        return self._once(idempotency_key, make)
+
+    def list_transfers(self, **params):
+        self._wait()
+        group = params.get("transfer_group")
+        return [t for t in self.transfers if getattr(t, "transfer_group", None) == group]
+
+    def create_refund(self, idempotency_key: Optional[str] = None, **params):
+        self._wait()
+        return self._once(idempotency_key, lambda: SimpleNamespace(id=self._new_id("re"), status="succeeded", **params))
+
+    def create_account(self, **params):
+        self._wait()
+        account = SimpleNamespace(id=self._new_id("acct"), charges_enabled=True, payouts_enabled=True)
+        self.accounts[account.id] = account
+        return account
+
+    def retrieve_account(self, account_id: str):
+        self._wait()
+        return self.accounts.get(account_id) or SimpleNamespace(id=account_id, charges_enabled=True, payouts_enabled=True)
+
+    def create_account_link(self, **params):
+        self._wait()
+        return SimpleNamespace(url=params.get("return_url", FRONTEND_URL))
+
+class PaymentGateway:
+    """Async front for all payment provider calls.
+
+    Calls run on a dedicated thread pool (bounded by STRIPE_MAX_CONCURRENCY) so a slow Stripe
+    response never stalls the event loop. Timeouts are enforced by the backend's HTTP client, so
+    a slot is only released once its request has actually finished; a call that times out or
+    cannot connect raises a 504 to the caller. Creates take an idempotency_key so a retry after
+    a 504 returns the original object instead of charging or paying twice.
+    """
+
+    def __init__(self, backend, max_concurrency: int):
+        self.backend = backend
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="payments")
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.stats: dict = {}
+
+    def _record(self, op: str, elapsed_ms: float, outcome: str):
+        st = self.stats.setdefault(op, {"calls": 0, "errors": 0, "timeouts": 0, "total_ms": 0.0, "max_ms": 0.0})
+        st["calls"] += 1
+        st["total_ms"] += elapsed_ms
+        st["max_ms"] = max(st["max_ms"], elapsed_ms)
+        if outcome == "error":
+            st["errors"] += 1
+        elif outcome == "timeout":
+            st["timeouts"] += 1
+
+    async def _call(self, op: str, *args, **params):
+        timeout = STRIPE_OP_TIMEOUTS.get(op, STRIPE_TIMEOUT_SECONDS)
+        fn = partial(getattr(self.backend, op), *args, **params)
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            async with self.semaphore:
+                self.in_flight += 1
+                try:
+                    return await asyncio.get_running_loop().run_in_executor(self.executor, fn)
+                finally:
+                    self.in_flight -= 1
+        except stripe.APIConnectionError as e:
+            # Raised by the HTTP client on timeouts as well as connection failures
+            outcome = "timeout"
+            logger.error("Payment call %s failed to complete within %.1fs: %s", op, timeout, e)
+            raise HTTPException(status_code=504, detail="Payment provider timed out, please retry")
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            self._record(op, (time.perf_counter() - start) * 1000, outcome)
+
+    async def create_customer(self, **params):
+        return await self._call("create_customer", **params)
+
+    async def create_payment_intent(self, **params):
+        return await self._call("create_payment_intent", **params)
+
+    async def retrieve_payment_intent(self, pi_id: str):
+        return await self._call("retrieve_payment_intent", pi_id)
+
+    async def create_transfer(self, **params):
+        return await self._call("create_transfer", **params)
+
+    async def list_transfers(self, **params):
+        return await self._call("list_transfers", **params)
+
+    async def create_refund(self, **params):
+        return await self._call("create_refund", **params)
+
+    async def create_account(self, **params):
+        return await self._call("create_account", **params)
+
+    async def retrieve_account(self, account_id: str):
+        return await self._call("retrieve_account", account_id)
+
+    async def create_account_link(self, **params):
+        return await self._call("create_account_link", **params)
+
+    def metrics(self) -> dict:
+        return {
+            "backend": PAYMENTS_BACKEND,
+            "in_flight": self.in_flight,
+            "operations": {
+                op: {
+                    "calls": st["calls"],
+                    "errors": st["errors"],
+                    "timeouts": st["timeouts"],
+                    "avg_ms": round(st["total_ms"] / st["calls"], 1) if st["calls"] else 0,
+                    "max_ms": round(st["max_ms"], 1),
+                }
+                for op, st in self.stats.items()
+            },
+        }
+
+payments = PaymentGateway(
+    FakeStripeBackend(STRIPE_FAKE_LATENCY_MS) if PAYMENTS_BACKEND == "fake" else StripeBackend(),
+    STRIPE_MAX_CONCURRENCY,
+)
+
+@app.on_event("shutdown")
+async def shutdown_payment_gateway():
+    payments.executor.shutdown(wait=False, cancel_futures=True)
+
+# --- Helpers ---
+
+
 def create_access_token(data: dict) -> str:
     payload = data.copy()
     payload["exp"] = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -350,6 +972,68 @@ def doc_to_dict(doc):
     doc.pop("password_hash", None)
     return doc
 
+def encode_cursor(doc: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps([doc["created_at"], doc["_id"]]).encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        created_at, doc_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        # Anything but strings would reach the query as an operator expression
+        if not isinstance(created_at, str) or not isinstance(doc_id, str):
+            raise ValueError
+        return created_at, doc_id
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def find_page(col, query: dict, response: Response, limit: int, cursor: Optional[str] = None, projection: Optional[dict] = None) -> list:
+    """Keyset page ordered by (created_at, _id) descending. Sets X-Next-Cursor when more rows remain."""
+    if cursor:
+        created_at, doc_id = decode_cursor(cursor)
+        query = {"$and": [query, {"$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": doc_id}},
+        ]}]}
+    docs = await col.find(query, projection).sort([("created_at", -1), ("_id", -1)]).limit(limit + 1).to_list(limit + 1)
+    if len(docs) > limit:
+        docs = docs[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(docs[-1])
+    return docs
+
+# Field sets for list endpoints: `view=summary` returns only what list pages render,
+# `fields=a,b,c` picks from the allowed set. _id and created_at are always returned (cursor keys).
+JOB_SUMMARY_FIELDS = {
+    "project_id", "project_name", "builder_email", "title", "status", "version", "assignment_type",
+    "payout_amount", "max_testers", "assigned_testers", "estimated_time_minutes", "total_charge",
+    "proposed_total", "service_types", "price_range", "roles_count", "items_count",
+}
+JOB_LIST_FIELDS = JOB_SUMMARY_FIELDS | {
+    "description", "test_url", "test_credentials", "roles", "platform_fee", "stripe_payment_intent_id",
+}
+SUBMISSION_SUMMARY_FIELDS = {
+    "job_id", "job_title", "project_id", "builder_email", "tester_email", "tester_name", "status",
+    "service_type", "bid_id", "item_id", "role_id", "payout_amount", "usability_score", "builder_rating",
+    "video_url", "rrweb_recording_url", "submitted_at", "reviewed_at",
+    "video_poster_url", "video_preview_url", "video_hls_url", "screenshot_thumbnails",
+}
+SUBMISSION_LIST_FIELDS = SUBMISSION_SUMMARY_FIELDS | {
+    "overall_feedback", "bug_reports", "suggestions", "review_feedback", "document_content", "transcript",
+    "screenshots", "video_tags", "stripe_transfer_id", "session_started_at", "session_ended_at",
+    "session_duration_seconds",
+}
+
+def list_projection(view: str, fields: Optional[str], summary_fields: set, allowed_fields: set) -> Optional[dict]:
+    """Mongo projection for a list request, or None for full documents."""
+    if fields:
+        selected = {f.strip() for f in fields.split(",") if f.strip()}
+        unknown = selected - allowed_fields
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    elif view == "summary":
+        selected = summary_fields
+    else:
+        return None
+    return {f: 1 for f in selected | {"created_at"}}
+
 def user_public(user: dict) -> dict:
     return {
         "email": user["email"],
@@ -364,8 +1048,73 @@ def user_public(user: dict) -> dict:
         "specialties": user.get("specialties", []),
     }
 
+class TTLCache:
+    """In-process LRU cache with per-entry expiry. Not shared between worker processes."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        entry = self.data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self.data[key]
+            self.misses += 1
+            return None
+        self.data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        self.data[key] = (time.monotonic() + (ttl if ttl is not None else self.ttl), value)
+        self.data.move_to_end(key)
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key):
+        self.data.pop(key, None)
+
+    def clear(self):
+        self.data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0,
+        }
+
+user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS)
+
+async def get_user(email: str) -> Optional[dict]:
+    """Cached user lookup. Returns a deep copy, so callers can mutate it (nested lists and
+    dicts included) without touching the cache. Invalidation is per process: another worker
+    may serve its own entry for up to USER_CACHE_TTL_SECONDS after a write."""
+    user = user_cache.get(email)
+    if user is None:
+        user = await users_col.find_one({"email": email})
+        if not user:
+            return None
+        user_cache.set(email, user)
+    return copy.deepcopy(user)
+
+def invalidate_user(email: str):
+    """Drop a cached user (and the dashboard built from it). Call after every write to users_col."""
+    user_cache.invalidate(email)
+    dashboard_cache.invalidate(email)
+
 async def get_user_or_404(email: str) -> dict:
-    user = await users_col.find_one({"email": email})
+    user = await get_user(email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
@@ -384,26 +1133,44 @@ def set_refresh_cookie(response: Response, token: str):
 def clear_refresh_cookie(response: Response):
     response.delete_cookie(key="refresh_token", path="/api/auth")
 
+def set_media_cookie(response: Response, email: str):
+    """<video>/<img> requests can't carry the bearer token, so /uploads is authorized by this cookie."""
+    token = jwt.encode(
+        {"sub": email, "type": "media", "exp": datetime.utcnow() + timedelta(hours=MEDIA_TOKEN_EXPIRE_HOURS)},
+        SECRET_KEY, algorithm=ALGORITHM,
+    )
+    response.set_cookie(
+        key="media_token",
+        value=token,
+        httponly=True,
+        secure=COOKIE_SECURE,
+        samesite="lax",
+        max_age=MEDIA_TOKEN_EXPIRE_HOURS * 60 * 60,
+        path="/uploads",
+    )
+
+def clear_media_cookie(response: Response):
+    response.delete_cookie(key="media_token", path="/uploads")
+
 async def get_or_create_stripe_customer(user: dict) -> str:
     """Get existing or create new Stripe Customer for a builder."""
     if user.get("stripe_customer_id"):
         return user["stripe_customer_id"]
-    customer = stripe.Customer.create(
+    customer = await payments.create_customer(
         email=user["email"],
         name=f"{user['first_name']} {user['last_name']}",
         metadata={"peertesthub_email": user["email"]},
     )
     await users_col.update_one({"email": user["email"]}, {"$set": {"stripe_customer_id": customer.id}})
+    invalidate_user(user["email"])
     return customer.id
 
 async def check_and_refund_unclaimed_slots(job: dict):
-    """After all submissions are resolved, refund unclaimed slot costs to builder."""
-    all_subs = await submissions_col.find({"job_id": job["_id"]}).to_list(50)
-    resolved_statuses = {"approved", "rejected"}
-    if not all_subs or not all(s["status"] in resolved_statuses for s in all_subs):
+    """Once a v1 job completes, refund unclaimed slot costs to builder."""
+    if job.get("version") == 2:
         return
 
-    claimed_count = len(all_subs)
+    claimed_count = len(job.get("submissions", []))
     unclaimed = job["max_testers"] - claimed_count
     if unclaimed <= 0 or not job.get("stripe_payment_intent_id"):
         return
@@ -413,14 +1180,222 @@ async def check_and_refund_unclaimed_slots(job: dict):
         return
 
     try:
-        stripe.Refund.create(
+        await payments.create_refund(
             payment_intent=job["stripe_payment_intent_id"],
             amount=refund_amount,
+            idempotency_key=f"refund-unclaimed-{job['_id']}",
         )
         logger.info("Refunded %d cents for %d unclaimed slots on job %s", refund_amount, unclaimed, job["_id"])
     except Exception as e:
         logger.error("Failed to refund unclaimed slots for job %s: %s", job["_id"], e)
 
+async def pay_out_submission(doc: dict, destination: str, payout: float) -> Optional[str]:
+    """Transfer an approved submission's payout to the tester's Connect account.
+
+    The transfer is keyed and grouped by submission id, so retrying after a timeout can't pay
+    twice. A failed attempt is recorded on the submission and retried by retry_transfers_loop.
+    """
+    sub_id = doc["_id"]
+    try:
+        # An earlier attempt may have gone through after we gave up on it
+        existing = await payments.list_transfers(transfer_group=sub_id, destination=destination, limit=1)
+        transfer = existing[0] if existing else await payments.create_transfer(
+            amount=int(round(payout * 100)),
+            currency="usd",
+            destination=destination,
+            transfer_group=sub_id,
+            metadata={
+                "submission_id": sub_id,
+                "job_id": doc["job_id"],
+                "tester_email": doc["tester_email"],
+            },
+            idempotency_key=f"transfer-{sub_id}",
+        )
+    except Exception as e:
+        logger.error("Failed to transfer to tester %s: %s", doc["tester_email"], e)
+        await submissions_col.update_one(
+            {"_id": sub_id},
+            {"$set": {"stripe_transfer_error": getattr(e, "detail", None) or str(e) or type(e).__name__}, "$inc": {"stripe_transfer_attempts": 1}},
+        )
+        return None
+    await submissions_col.update_one(
+        {"_id": sub_id}, {"$set": {"stripe_transfer_id": transfer.id}, "$unset": {"stripe_transfer_error": ""}},
+    )
+    return transfer.id
+
+async def retry_failed_transfers():
+    cursor = submissions_col.find(
+        {"status": "approved", "stripe_transfer_error": {"$exists": True}, "stripe_transfer_id": None,
+         "stripe_transfer_attempts": {"$lt": STRIPE_TRANSFER_MAX_ATTEMPTS}},
+        {"job_id": 1, "tester_email": 1, "payout_amount": 1},
+    )
+    async for doc in cursor:
+        tester = await get_user(doc["tester_email"])
+        payout = doc.get("payout_amount")
+        if not payout:
+            job = await jobs_col.find_one({"_id": doc["job_id"]}, {"payout_amount": 1})
+            payout = (job or {}).get("payout_amount") or 0
+        if tester and tester.get("stripe_connect_id") and payout > 0:
+            await pay_out_submission(doc, tester["stripe_connect_id"], payout)
+
+async def retry_transfers_loop():
+    while True:
+        await asyncio.sleep(STRIPE_TRANSFER_RETRY_SECONDS)
+        try:
+            await retry_failed_transfers()
+        except Exception as e:
+            logger.error("Failed to retry tester transfers: %s", e)
+
+transfers_task: Optional[asyncio.Task] = None
+
+@app.on_event("startup")
+async def start_transfer_retries():
+    global transfers_task
+    transfers_task = asyncio.create_task(retry_transfers_loop())
+
+@app.on_event("shutdown")
+async def stop_transfer_retries():
+    if transfers_task:
+        transfers_task.cancel()
+
+# --- Platform Counters ---
+
+# Single document kept current by the insert/status-transition paths so /health and
+# /api/stats never scan collections. A background task reconciles it against real counts.
+PLATFORM_COUNTERS_ID = "platform"
+
+async def bump_counters(**deltas):
+    await counters_col.update_one({"_id": PLATFORM_COUNTERS_ID}, {"$inc": deltas}, upsert=True)
+
+async def transition_job_status(job_id: str, from_statuses: List[str], to_status: str, extra_filter: Optional[dict] = None) -> bool:
+    """Move a job to to_status only if it is currently in from_statuses, keeping open_jobs in step."""
+    prev = await jobs_col.find_one_and_update(
+        {"_id": job_id, "status": {"$in": from_statuses}, **(extra_filter or {})},
+        {"$set": {"status": to_status}},
+        projection={"status": 1, "builder_email": 1},
+    )
+    if not prev:
+        return False
+    delta = (to_status == "open") - (prev["status"] == "open")
+    if delta:
+        await bump_counters(open_jobs=delta)
+    await invalidate_public_feed()
+    invalidate_dashboard(prev.get("builder_email"))
+    return True
+
+async def record_submission_resolved(job_id: str) -> bool:
+    """Count one more approved/rejected submission on the job and complete it once every
+    submission in job.submissions is resolved. Returns True if this call completed the job."""
+    await jobs_col.update_one({"_id": job_id}, {"$inc": {"resolved_submissions": 1}})
+    return await transition_job_status(
+        job_id, ["open", "in_progress"], "completed",
+        {"$expr": {"$gte": ["$resolved_submissions", {"$size": "$submissions"}]}},
+    )
+
+@app.on_event("startup")
+async def backfill_resolved_submission_counts():
+    """One-off: seed jobs.resolved_submissions for jobs created before it was maintained."""
+    if not await jobs_col.find_one({"resolved_submissions": {"$exists": False}}, {"_id": 1}):
+        return
+    pipeline = [
+        {"$match": {"status": {"$in": ["approved", "rejected"]}}},
+        {"$group": {"_id": "$job_id", "n": {"$sum": 1}}},
+    ]
+    async for row in submissions_col.aggregate(pipeline):
+        await jobs_col.update_one({"_id": row["_id"], "resolved_submissions": {"$exists": False}}, {"$set": {"resolved_submissions": row["n"]}})
+    await jobs_col.update_many({"resolved_submissions": {"$exists": False}}, {"$set": {"resolved_submissions": 0}})
+
+async def reconcile_counters() -> dict:
+    users, builders, testers, projects, jobs, open_jobs = await asyncio.gather(
+        users_col.count_documents({}),
+        users_col.count_documents({"role": "builder"}),
+        users_col.count_documents({"role": "tester"}),
+        projects_col.count_documents({}),
+        jobs_col.count_documents({}),
+        jobs_col.count_documents({"status": "open"}),
+    )
+    counters = {
+        "users": users,
+        "builders": builders,
+        "testers": testers,
+        "projects": projects,
+        "jobs": jobs,
+        "open_jobs": open_jobs,
+    }
+    await counters_col.update_one(
+        {"_id": PLATFORM_COUNTERS_ID},
+        {"$set": {**counters, "reconciled_at": datetime.utcnow().isoformat()}},
+        upsert=True,
+    )
+    return counters
+
+async def get_counters() -> dict:
+    doc = await counters_col.find_one({"_id": PLATFORM_COUNTERS_ID})
+    if not doc or "reconciled_at" not in doc:
+        return await reconcile_counters()
+    return doc
+
+async def reconcile_counters_loop():
+    while True:
+        try:
+            await reconcile_counters()
+        except Exception as e:
+            logger.error("Failed to reconcile platform counters: %s", e)
+        await asyncio.sleep(COUNTERS_RECONCILE_SECONDS)
+
+counters_task: Optional[asyncio.Task] = None
+
+@app.on_event("startup")
+async def start_counters_reconciler():
+    global counters_task
+    counters_task = asyncio.create_task(reconcile_counters_loop())
+
+@app.on_event("shutdown")
+async def stop_counters_reconciler():
+    if counters_task:
+        counters_task.cancel()
+
+# --- Public Job Feed Cache ---
+
+# The rendered feed lives in one shared cache document so every worker process serves it
+# with a single read. Invalidation bumps `generation`; a rebuild only stores its result if
+# no invalidation happened while it was running.
+PUBLIC_FEED_CACHE_ID = "public_jobs"
+PUBLIC_FEED_FIELDS = [
+    "title", "estimated_time_minutes", "project_id", "description", "created_at", "version",
+    "service_types", "price_range", "roles_count", "items_count", "assignment_type", "proposed_total",
+    "payout_amount", "max_testers", "assigned_testers",
+]
+
+async def invalidate_public_feed():
+    await cache_col.update_one(
+        {"_id": PUBLIC_FEED_CACHE_ID},
+        {"$inc": {"generation": 1}, "$unset": {"entries": "", "expires_at": ""}},
+        upsert=True,
+    )
+
+def summarize_test_plan(roles: list) -> dict:
+    """Derived v2 fields shown in job listings, computed once at write time."""
+    all_items = [item for r in roles for item in r.get("items", [])]
+    prices = [item["proposed_price"] for item in all_items]
+    return {
+        "service_types": sorted({item["service_type"] for item in all_items}),
+        "price_range": [min(prices), max(prices)] if prices else [0, 0],
+        "roles_count": len(roles),
+        "items_count": len(all_items),
+    }
+
+@app.on_event("startup")
+async def backfill_test_plan_summaries():
+    async for job in jobs_col.find({"version": 2, "items_count": {"$exists": False}}, {"roles": 1}):
+        await jobs_col.update_one({"_id": job["_id"]}, {"$set": summarize_test_plan(job.get("roles", []))})
+
+@app.on_event("startup")
+async def backfill_bid_builder_emails():
+    job_ids = await bids_col.distinct("job_id", {"builder_email": {"$exists": False}})
+    async for job in jobs_col.find({"_id": {"$in": job_ids}}, {"builder_email": 1}):
+        await bids_col.update_many({"job_id": job["_id"]}, {"$set": {"builder_email": job["builder_email"]}})
+
 SERVICE_TYPES = [
     {
         "id": "test",
@@ -456,12 +1431,19 @@ async def root():
 
 @app.get("/health")
 async def health():
+    counters = await get_counters()
     return {
         "status": "healthy",
         "timestamp": datetime.utcnow().isoformat(),
-        "users": await users_col.count_documents({}),
-        "projects": await projects_col.count_documents({}),
-        "jobs": await jobs_col.count_documents({}),
+        "users": counters.get("users", 0),
+        "projects": counters.get("projects", 0),
+        "jobs": counters.get("jobs", 0),
+        "payments": payments.metrics(),
+        "email": email_outbox.metrics(),
+        "user_cache": user_cache.stats(),
+        "dashboard_cache": dashboard_cache.stats(),
+        "tester_profile_cache": tester_profile_cache.stats(),
+        "storage": await counters_col.find_one({"_id": STORAGE_COUNTERS_ID}, {"_id": 0, "gc_lease_until": 0, "gc_lease_owner": 0}) or {},
     }
 
 # --- Auth ---
@@ -474,7 +1456,7 @@ async def register(body: UserRegister, response: Response):
     verification_code = generate_verification_code()
     user_doc = {
         "email": body.email,
-        "password_hash": hash_password(body.password),
+        "password_hash": await hash_password(body.password),
         "first_name": body.first_name,
         "last_name": body.last_name,
         "role": body.role,
@@ -495,13 +1477,15 @@ async def register(body: UserRegister, response: Response):
         "profile_visible": True,
         "total_ratings": 0,
         "rating_sum": 0,
+        "completed_tests": 0,
     }
     await users_col.insert_one(user_doc)
+    await bump_counters(users=1, builders=int(body.role == "builder"), testers=int(body.role == "tester"))
 
-    send_email(
+    await queue_email(
         body.email,
         "Your PeerTest Hub verification code",
-        email_verification_code_html(body.first_name, verification_code),
+        "verification_code", body.first_name, verification_code,
     )
 
     access_token = create_access_token({"sub": body.email, "role": body.role})
@@ -512,15 +1496,22 @@ async def register(body: UserRegister, response: Response):
         "expires_at": datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
     })
     set_refresh_cookie(response, refresh_token)
+    set_media_cookie(response, body.email)
 
     return {"access_token": access_token, "token_type": "bearer", "user": user_public(user_doc)}
 
 @app.post("/api/auth/login")
 async def login(body: UserLogin, response: Response):
     user = await users_col.find_one({"email": body.email})
-    if not user or not check_password(body.password, user["password_hash"]):
+    if not user or not await check_password(body.password, user["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid email or password")
 
+    # Opt-in: upgrade hashes transparently after BCRYPT_ROUNDS changes
+    if PASSWORD_REHASH_ON_LOGIN and password_needs_rehash(user["password_hash"]):
+        new_hash = await hash_password(body.password)
+        await users_col.update_one({"email": user["email"]}, {"$set": {"password_hash": new_hash}})
+        invalidate_user(user["email"])
+
     access_token = create_access_token({"sub": user["email"], "role": user["role"]})
     refresh_token = create_refresh_token()
     await refresh_tokens_col.insert_one({
@@ -529,6 +1520,7 @@ async def login(body: UserLogin, response: Response):
         "expires_at": datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
     })
     set_refresh_cookie(response, refresh_token)
+    set_media_cookie(response, user["email"])
 
     return {"access_token": access_token, "token_type": "bearer", "user": user_public(user)}
 
@@ -545,9 +1537,10 @@ async def refresh(request: Request, response: Response):
     if record["expires_at"] < datetime.utcnow():
         await refresh_tokens_col.delete_one({"_id": record["_id"]})
         clear_refresh_cookie(response)
+        clear_media_cookie(response)
         raise HTTPException(status_code=401, detail="Refresh token expired")
 
-    user = await users_col.find_one({"email": record["email"]})
+    user = await get_user(record["email"])
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
 
@@ -560,6 +1553,7 @@ async def refresh(request: Request, response: Response):
         "expires_at": datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
     })
     set_refresh_cookie(response, new_refresh)
+    set_media_cookie(response, user["email"])
 
     access_token = create_access_token({"sub": user["email"], "role": user["role"]})
     return {"access_token": access_token, "token_type": "bearer", "user": user_public(user)}
@@ -570,6 +1564,7 @@ async def logout(request: Request, response: Response):
     if token:
         await refresh_tokens_col.delete_one({"token": token})
     clear_refresh_cookie(response)
+    clear_media_cookie(response)
     return {"message": "Logged out"}
 
 @app.get("/api/auth/me")
@@ -602,6 +1597,7 @@ async def verify_email_code(body: VerifyCodeBody, email: str = Depends(verify_to
             {"email": email},
             {"$inc": {"email_verification_attempts": 1}},
         )
+        invalidate_user(email)
         remaining = 2 - user.get("email_verification_attempts", 0)
         raise HTTPException(
             status_code=400,
@@ -621,6 +1617,7 @@ async def verify_email_code(body: VerifyCodeBody, email: str = Depends(verify_to
         user["onboarding_completed"] = True
 
     await users_col.update_one({"email": email}, {"$set": update})
+    invalidate_user(email)
     return {"message": "Email verified successfully", "user": user_public(user)}
 
 @app.post("/api/auth/resend-verification-code")
@@ -648,96 +1645,133 @@ async def resend_verification_code(email: str = Depends(verify_token)):
             "verification_last_sent": datetime.utcnow().isoformat(),
         }},
     )
-    send_email(
+    invalidate_user(email)
+    await queue_email(
         email,
         "Your PeerTest Hub verification code",
-        email_verification_code_html(user["first_name"], new_code),
+        "verification_code", user["first_name"], new_code,
     )
     return {"message": "New verification code sent"}
 
 # --- Dashboard ---
 
+dashboard_cache = TTLCache(USER_CACHE_SIZE, DASHBOARD_CACHE_TTL_SECONDS)
+
+def invalidate_dashboard(*emails: Optional[str]):
+    """Drop cached dashboards. Call after every write that changes a project, job, bid or
+    submission count or total; other processes catch up within DASHBOARD_CACHE_TTL_SECONDS."""
+    for email in emails:
+        if email:
+            dashboard_cache.invalidate(email)
+
+def facet_count(facet: list) -> int:
+    return facet[0]["n"] if facet else 0
+
+def facet_total(facet: list) -> float:
+    return facet[0]["total"] if facet else 0
+
+async def builder_dashboard_stats(email: str) -> dict:
+    job_stats_pipeline = [
+        {"$match": {"builder_email": email}},
+        {"$facet": {
+            "active_jobs": [{"$match": {"status": {"$in": ["open", "in_progress"]}}}, {"$count": "n"}],
+            "completed_jobs": [{"$match": {"status": "completed"}}, {"$count": "n"}],
+            # v1 jobs are charged up front: job.total_charge
+            "job_spent": [
+                {"$match": {"status": {"$ne": "pending_payment"}, "total_charge": {"$gt": 0}}},
+                {"$group": {"_id": None, "total": {"$sum": "$total_charge"}}},
+            ],
+            # v2 jobs are charged per accepted bid: bid.total_charge
+            "bids": [
+                {"$match": {"version": 2}},
+                {"$lookup": {
+                    "from": "bids",
+                    "localField": "_id",
+                    "foreignField": "job_id",
+                    "pipeline": [
+                        {"$match": {"$or": [{"payment_status": "paid"}, {"status": "pending"}]}},
+                        {"$project": {"status": 1, "payment_status": 1, "total_charge": 1}},
+                    ],
+                    "as": "bids",
+                }},
+                {"$unwind": "$bids"},
+                {"$group": {
+                    "_id": None,
+                    "spent": {"$sum": {"$cond": [{"$eq": ["$bids.payment_status", "paid"]}, "$bids.total_charge", 0]}},
+                    "pending": {"$sum": {"$cond": [{"$eq": ["$bids.status", "pending"]}, 1, 0]}},
+                }},
+            ],
+        }},
+    ]
+    total_projects, pending_reviews, job_stats = await asyncio.gather(
+        projects_col.count_documents({"builder_email": email}),
+        submissions_col.count_documents({"builder_email": email, "status": "submitted"}),
+        jobs_col.aggregate(job_stats_pipeline).to_list(1),
+    )
+    facets = job_stats[0]
+    bids = facets["bids"][0] if facets["bids"] else {"spent": 0, "pending": 0}
+
+    return {
+        "total_projects": total_projects,
+        "active_jobs": facet_count(facets["active_jobs"]),
+        "pending_reviews": pending_reviews,
+        "completed_jobs": facet_count(facets["completed_jobs"]),
+        "total_spent": facet_total(facets["job_spent"]) + (bids["spent"] or 0),
+        "pending_bids": bids["pending"],
+    }
+
+async def tester_dashboard_stats(email: str) -> dict:
+    submission_stats_pipeline = [
+        {"$match": {"tester_email": email}},
+        {"$facet": {
+            "by_status": [{"$group": {"_id": "$status", "n": {"$sum": 1}}}],
+            "earnings": [
+                {"$match": {"status": "approved", "payout_amount": {"$gt": 0}}},
+                {"$group": {"_id": None, "total": {"$sum": "$payout_amount"}}},
+            ],
+            # Older v1 submissions have no payout_amount and fall back to the job's
+            "legacy_earnings": [
+                {"$match": {"status": "approved", "payout_amount": None}},
+                {"$lookup": {"from": "jobs", "localField": "job_id", "foreignField": "_id", "as": "job"}},
+                {"$unwind": "$job"},
+                {"$group": {"_id": None, "total": {"$sum": "$job.payout_amount"}}},
+            ],
+        }},
+    ]
+    submission_stats, active_bids = await asyncio.gather(
+        submissions_col.aggregate(submission_stats_pipeline).to_list(1),
+        bids_col.count_documents({"tester_email": email, "status": "pending"}),
+    )
+    facets = submission_stats[0]
+    by_status = {row["_id"]: row["n"] for row in facets["by_status"]}
+
+    return {
+        "claimed_jobs": by_status.get("draft", 0),
+        "completed": by_status.get("approved", 0),
+        "pending_review": by_status.get("submitted", 0),
+        "earnings": facet_total(facets["earnings"]) + facet_total(facets["legacy_earnings"]),
+        "active_bids": active_bids,
+    }
+
 @app.get("/api/dashboard")
 async def get_dashboard(email: str = Depends(verify_token)):
-    user = await get_user_or_404(email)
+    cached = dashboard_cache.get(email)
+    if cached is not None:
+        return cached
 
+    user = await get_user_or_404(email)
     if user["role"] == "builder":
-        total_projects = await projects_col.count_documents({"builder_email": email})
-        active_jobs = await jobs_col.count_documents({"builder_email": email, "status": {"$in": ["open", "in_progress"]}})
-        pending_reviews = await submissions_col.count_documents({"builder_email": email, "status": "submitted"})
-        completed_jobs = await jobs_col.count_documents({"builder_email": email, "status": "completed"})
-
-        # Total spent: v1 jobs total_charge + v2 bid total_charge
-        spent_pipeline = [
-            {"$match": {"builder_email": email, "status": {"$ne": "pending_payment"}, "total_charge": {"$gt": 0}}},
-            {"$group": {"_id": None, "total": {"$sum": "$total_charge"}}},
-        ]
-        spent_result = await jobs_col.aggregate(spent_pipeline).to_list(1)
-        total_spent = spent_result[0]["total"] if spent_result else 0
-
-        # V2 bid spending
-        builder_v2_jobs = await jobs_col.find({"builder_email": email, "version": 2}).to_list(200)
-        v2_job_ids = [j["_id"] for j in builder_v2_jobs]
-        bid_spent_pipeline = [
-            {"$match": {"job_id": {"$in": v2_job_ids}, "payment_status": "paid"}},
-            {"$group": {"_id": None, "total": {"$sum": "$total_charge"}}},
-        ]
-        bid_spent_result = await bids_col.aggregate(bid_spent_pipeline).to_list(1)
-        total_spent += bid_spent_result[0]["total"] if bid_spent_result else 0
-
-        # Pending bids count for builder
-        pending_bids = await bids_col.count_documents({"job_id": {"$in": v2_job_ids}, "status": "pending"})
-
-        return {
-            "role": "builder",
-            "stats": {
-                "total_projects": total_projects,
-                "active_jobs": active_jobs,
-                "pending_reviews": pending_reviews,
-                "completed_jobs": completed_jobs,
-                "total_spent": total_spent,
-                "pending_bids": pending_bids,
-            },
-        }
+        result = {"role": "builder", "stats": await builder_dashboard_stats(email)}
     else:
-        claimed = await submissions_col.count_documents({"tester_email": email, "status": "draft"})
-        completed = await submissions_col.count_documents({"tester_email": email, "status": "approved"})
-        pending = await submissions_col.count_documents({"tester_email": email, "status": "submitted"})
-
-        # Earnings: v1 from job.payout_amount, v2 from submission.payout_amount
-        v1_pipeline = [
-            {"$match": {"tester_email": email, "status": "approved", "payout_amount": None}},
-            {"$lookup": {"from": "jobs", "localField": "job_id", "foreignField": "_id", "as": "job"}},
-            {"$unwind": "$job"},
-            {"$group": {"_id": None, "total": {"$sum": "$job.payout_amount"}}},
-        ]
-        v1_result = await submissions_col.aggregate(v1_pipeline).to_list(1)
-        v1_earnings = v1_result[0]["total"] if v1_result else 0
-
-        v2_pipeline = [
-            {"$match": {"tester_email": email, "status": "approved", "payout_amount": {"$gt": 0}}},
-            {"$group": {"_id": None, "total": {"$sum": "$payout_amount"}}},
-        ]
-        v2_result = await submissions_col.aggregate(v2_pipeline).to_list(1)
-        v2_earnings = v2_result[0]["total"] if v2_result else 0
-
-        earnings = v1_earnings + v2_earnings
-
-        # Active bids count for tester
-        active_bids = await bids_col.count_documents({"tester_email": email, "status": "pending"})
-
-        return {
+        result = {
             "role": "tester",
-            "stats": {
-                "claimed_jobs": claimed,
-                "completed": completed,
-                "pending_review": pending,
-                "earnings": earnings,
-                "active_bids": active_bids,
-            },
+            "stats": await tester_dashboard_stats(email),
             "stripe_connect_onboarded": user.get("stripe_connect_onboarded", False),
         }
 
+    dashboard_cache.set(email, result)
+    return result
+
 # --- Projects ---
 
 @app.post("/api/projects", status_code=201)
@@ -757,16 +1791,23 @@ async def create_project(body: ProjectCreate, email: str = Depends(verify_token)
         "status": "active",
     }
     await projects_col.insert_one(doc)
+    await bump_counters(projects=1)
+    invalidate_dashboard(email)
     return doc_to_dict(doc)
 
 @app.get("/api/projects")
-async def list_projects(email: str = Depends(verify_token)):
+async def list_projects(
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    email: str = Depends(verify_token),
+):
     user = await get_user_or_404(email)
     if user["role"] == "builder":
-        cursor = projects_col.find({"builder_email": email})
+        query = {"builder_email": email}
     else:
-        cursor = projects_col.find({"status": "active"})
-    return [doc_to_dict(d) for d in await cursor.to_list(100)]
+        query = {"status": "active"}
+    return [doc_to_dict(d) for d in await find_page(projects_col, query, response, limit, cursor)]
 
 @app.get("/api/projects/{project_id}")
 async def get_project(project_id: str, email: str = Depends(verify_token)):
@@ -789,6 +1830,7 @@ async def update_project(project_id: str, body: ProjectUpdate, email: str = Depe
     if updates:
         await projects_col.update_one({"_id": project_id}, {"$set": updates})
         doc.update(updates)
+        await invalidate_public_feed()
     return doc_to_dict(doc)
 
 # --- Service Types (public) ---
@@ -818,15 +1860,16 @@ async def create_job(body: JobCreate, email: str = Depends(verify_token)):
     customer_id = await get_or_create_stripe_customer(user)
 
     # Create PaymentIntent
-    pi = stripe.PaymentIntent.create(
+    job_id = f"job_{uuid.uuid4().hex[:8]}"
+    pi = await payments.create_payment_intent(
         amount=int(round(total_charge * 100)),  # cents
         currency="usd",
         customer=customer_id,
         metadata={"type": "job_payment", "builder_email": email},
         automatic_payment_methods={"enabled": True},
+        idempotency_key=f"job-payment-{job_id}",
     )
 
-    job_id = f"job_{uuid.uuid4().hex[:8]}"
     doc = {
         "_id": job_id,
         "project_id": body.project_id,
@@ -846,8 +1889,11 @@ async def create_job(body: JobCreate, email: str = Depends(verify_token)):
         "created_at": datetime.utcnow().isoformat(),
         "assigned_testers": [],
         "submissions": [],
+        "resolved_submissions": 0,
     }
     await jobs_col.insert_one(doc)
+    await bump_counters(jobs=1)
+    invalidate_dashboard(email)
 
     result = doc_to_dict(doc)
     result["client_secret"] = pi.client_secret
@@ -866,11 +1912,11 @@ async def confirm_payment(job_id: str, email: str = Depends(verify_token)):
         raise HTTPException(status_code=400, detail="Job is not pending payment")
 
     # Verify with Stripe that the PI succeeded
-    pi = stripe.PaymentIntent.retrieve(job["stripe_payment_intent_id"])
+    pi = await payments.retrieve_payment_intent(job["stripe_payment_intent_id"])
     if pi.status != "succeeded":
         raise HTTPException(status_code=400, detail=f"Payment not completed. Status: {pi.status}")
 
-    await jobs_col.update_one({"_id": job_id}, {"$set": {"status": "open"}})
+    await transition_job_status(job_id, ["pending_payment"], "open")
     job["status"] = "open"
     return doc_to_dict(job)
 
@@ -889,22 +1935,24 @@ async def get_payment_intent(job_id: str, email: str = Depends(verify_token)):
 
     pi_id = job.get("stripe_payment_intent_id")
     if pi_id:
-        pi = stripe.PaymentIntent.retrieve(pi_id)
+        pi = await payments.retrieve_payment_intent(pi_id)
         if pi.status == "succeeded":
             # Already paid — go ahead and mark open
-            await jobs_col.update_one({"_id": job_id}, {"$set": {"status": "open"}})
+            await transition_job_status(job_id, ["pending_payment"], "open")
             return {"client_secret": pi.client_secret, "already_paid": True}
         if pi.status in ("requires_payment_method", "requires_confirmation", "requires_action"):
             return {"client_secret": pi.client_secret, "already_paid": False}
 
     # PI cancelled or in a bad state — create a new one
     customer_id = await get_or_create_stripe_customer(user)
-    new_pi = stripe.PaymentIntent.create(
+    new_pi = await payments.create_payment_intent(
         amount=int(round(job["total_charge"] * 100)),
         currency="usd",
         customer=customer_id,
         metadata={"type": "job_payment", "builder_email": email},
         automatic_payment_methods={"enabled": True},
+        # Keyed by the intent being replaced, so retries reuse one replacement
+        idempotency_key=f"job-payment-{job_id}-after-{pi_id}",
     )
     await jobs_col.update_one({"_id": job_id}, {"$set": {"stripe_payment_intent_id": new_pi.id}})
     return {"client_secret": new_pi.client_secret, "already_paid": False}
@@ -957,6 +2005,7 @@ async def create_job_v2(body: JobCreateV2, email: str = Depends(verify_token)):
         "status": "open",
         "roles": roles,
         "proposed_total": round(proposed_total, 2),
+        **summarize_test_plan(roles),
         "estimated_time_minutes": body.estimated_time_minutes,
         "created_at": datetime.utcnow().isoformat(),
         # Legacy fields null for v2
@@ -964,35 +2013,56 @@ async def create_job_v2(body: JobCreateV2, email: str = Depends(verify_token)):
         "max_testers": None,
         "assigned_testers": [],
         "submissions": [],
+        "resolved_submissions": 0,
         "total_charge": None,
         "platform_fee": None,
         "stripe_payment_intent_id": None,
     }
     await jobs_col.insert_one(doc)
+    await bump_counters(jobs=1, open_jobs=1)
+    await invalidate_public_feed()
+    invalidate_dashboard(email)
     return doc_to_dict(doc)
 
 @app.get("/api/jobs")
-async def list_jobs(email: str = Depends(verify_token)):
+async def list_jobs(
+    response: Response,
+    limit: int = Query(200, ge=1, le=500),
+    cursor: Optional[str] = None,
+    view: str = Query("full", pattern="^(full|summary)$"),
+    fields: Optional[str] = None,
+    email: str = Depends(verify_token),
+):
     user = await get_user_or_404(email)
     if user["role"] == "builder":
-        cursor = jobs_col.find({"builder_email": email})
+        query = {"builder_email": email}
     else:
         # Testers should not see pending_payment jobs
-        cursor = jobs_col.find({
+        query = {
             "$or": [
                 {"status": {"$in": ["open", "in_progress"]}},
                 {"assigned_testers": email},
             ]
-        })
-    return [doc_to_dict(d) for d in await cursor.to_list(200)]
-
-@app.get("/api/jobs/public")
-async def list_public_jobs():
-    jobs = await jobs_col.find({"status": {"$in": ["open", "in_progress"]}}).sort("created_at", -1).to_list(50)
+        }
+    projection = list_projection(view, fields, JOB_SUMMARY_FIELDS, JOB_LIST_FIELDS) or {"submissions": 0}
+    jobs = await find_page(jobs_col, query, response, limit, cursor, projection)
+    return [doc_to_dict(d) for d in jobs]
+
+async def build_public_feed() -> list:
+    jobs = await jobs_col.find(
+        {"status": {"$in": ["open", "in_progress"]}},
+        {field: 1 for field in PUBLIC_FEED_FIELDS},
+    ).sort("created_at", -1).to_list(50)
+
+    project_ids = list({job.get("project_id") for job in jobs})
+    projects = {
+        p["_id"]: p
+        async for p in projects_col.find({"_id": {"$in": project_ids}}, {"name": 1, "category": 1})
+    }
 
     result = []
     for job in jobs:
-        project = await projects_col.find_one({"_id": job.get("project_id")})
+        project = projects.get(job.get("project_id"))
         is_v2 = job.get("version") == 2
 
         entry = {
@@ -1007,14 +2077,10 @@ async def list_public_jobs():
         }
 
         if is_v2:
-            roles = job.get("roles", [])
-            all_items = [item for r in roles for item in r.get("items", [])]
-            prices = [item["proposed_price"] for item in all_items]
-            service_types = list({item["service_type"] for item in all_items})
-            entry["service_types"] = service_types
-            entry["price_range"] = [min(prices), max(prices)] if prices else [0, 0]
-            entry["roles_count"] = len(roles)
-            entry["items_count"] = len(all_items)
+            entry["service_types"] = job.get("service_types")
+            entry["price_range"] = job.get("price_range")
+            entry["roles_count"] = job.get("roles_count")
+            entry["items_count"] = job.get("items_count")
             entry["assignment_type"] = job.get("assignment_type")
             entry["proposed_total"] = job.get("proposed_total")
             entry["payout_amount"] = None
@@ -1036,6 +2102,24 @@ async def list_public_jobs():
 
     return result
 
+@app.get("/api/jobs/public")
+async def list_public_jobs():
+    now = datetime.utcnow()
+    cached = await cache_col.find_one({"_id": PUBLIC_FEED_CACHE_ID})
+    if cached and "entries" in cached and cached["expires_at"] > now:
+        return cached["entries"]
+
+    entries = await build_public_feed()
+    fresh = {"entries": entries, "expires_at": now + timedelta(seconds=PUBLIC_FEED_CACHE_TTL_SECONDS)}
+    try:
+        if cached:
+            await cache_col.update_one({"_id": PUBLIC_FEED_CACHE_ID, "generation": cached.get("generation", 0)}, {"$set": fresh})
+        else:
+            await cache_col.insert_one({"_id": PUBLIC_FEED_CACHE_ID, "generation": 0, **fresh})
+    except DuplicateKeyError:
+        pass  # another worker created the cache document first
+    return entries
+
 @app.get("/api/jobs/{job_id}")
 async def get_job(job_id: str, email: str = Depends(verify_token)):
     doc = await jobs_col.find_one({"_id": job_id})
@@ -1043,25 +2127,43 @@ async def get_job(job_id: str, email: str = Depends(verify_token)):
         raise HTTPException(status_code=404, detail="Job not found")
     return doc_to_dict(doc)
 
+def claim_rejection(job: Optional[dict], email: str) -> HTTPException:
+    """Explain why a conditional claim matched nothing."""
+    if not job:
+        return HTTPException(status_code=404, detail="Job not found")
+    if job.get("version") == 2:
+        return HTTPException(status_code=400, detail="Use bidding for structured jobs")
+    if job["status"] not in ("open", "in_progress"):
+        return HTTPException(status_code=400, detail="Job is not available for claiming")
+    if email in job.get("assigned_testers", []):
+        return HTTPException(status_code=400, detail="You already claimed this job")
+    return HTTPException(status_code=400, detail="Job has reached maximum testers")
+
 @app.post("/api/jobs/{job_id}/claim")
 async def claim_job(job_id: str, email: str = Depends(verify_token)):
     user = await get_user_or_404(email)
     if user["role"] != "tester":
         raise HTTPException(status_code=403, detail="Only testers can claim jobs")
 
-    job = await jobs_col.find_one({"_id": job_id})
+    # Take the slot in one conditional update: availability, membership and slot count are
+    # checked by the server, so racing testers can never overbook the job.
+    sub_id = f"sub_{uuid.uuid4().hex[:8]}"
+    job = await jobs_col.find_one_and_update(
+        {
+            "_id": job_id,
+            "version": {"$ne": 2},
+            "status": {"$in": ["open", "in_progress"]},
+            "assigned_testers": {"$ne": email},
+            "$expr": {"$lt": [{"$size": "$assigned_testers"}, "$max_testers"]},
+        },
+        {
+            "$push": {"assigned_testers": email, "submissions": sub_id},
+            "$set": {"status": "in_progress"},
+        },
+    )
     if not job:
-        raise HTTPException(status_code=404, detail="Job not found")
-    if job.get("version") == 2:
-        raise HTTPException(status_code=400, detail="Use bidding for structured jobs")
-    if job["status"] not in ("open", "in_progress"):
-        raise HTTPException(status_code=400, detail="Job is not available for claiming")
-    if email in job.get("assigned_testers", []):
-        raise HTTPException(status_code=400, detail="You already claimed this job")
-    if len(job.get("assigned_testers", [])) >= job["max_testers"]:
-        raise HTTPException(status_code=400, detail="Job has reached maximum testers")
+        raise claim_rejection(await jobs_col.find_one({"_id": job_id}), email)
 
-    sub_id = f"sub_{uuid.uuid4().hex[:8]}"
     submission = {
         "_id": sub_id,
         "job_id": job_id,
@@ -1071,6 +2173,7 @@ async def claim_job(job_id: str, email: str = Depends(verify_token)):
         "tester_email": email,
         "tester_name": f"{user['first_name']} {user['last_name']}",
         "status": "draft",
+        "payout_amount": job["payout_amount"],
         "overall_feedback": "",
         "bug_reports": [],
         "usability_score": None,
@@ -1085,25 +2188,29 @@ async def claim_job(job_id: str, email: str = Depends(verify_token)):
         "submitted_at": None,
         "reviewed_at": None,
     }
-    await submissions_col.insert_one(submission)
+    try:
+        await submissions_col.insert_one(submission)
+    except Exception:
+        # Give the slot back so a failed insert never strands it
+        await jobs_col.update_one({"_id": job_id}, {"$pull": {"assigned_testers": email, "submissions": sub_id}})
+        raise
 
-    new_status = "in_progress" if job["status"] == "open" else job["status"]
-    await jobs_col.update_one(
-        {"_id": job_id},
-        {"$push": {"assigned_testers": email, "submissions": sub_id}, "$set": {"status": new_status}},
-    )
+    if job["status"] == "open":
+        await bump_counters(open_jobs=-1)
+    await invalidate_public_feed()
+    invalidate_dashboard(email, job["builder_email"])
 
     job["assigned_testers"].append(email)
     job["submissions"].append(sub_id)
-    job["status"] = new_status
+    job["status"] = "in_progress"
 
     # Notify builder
-    builder = await users_col.find_one({"email": job["builder_email"]})
+    builder = await get_user(job["builder_email"])
     if builder:
-        send_email(
+        await queue_email(
             job["builder_email"],
             f"A tester claimed your job: {job['title']}",
-            email_job_claimed_html(builder["first_name"], f"{user['first_name']} {user['last_name']}", job["title"], job_id),
+            "job_claimed", builder["first_name"], f"{user['first_name']} {user['last_name']}", job["title"], job_id,
         )
 
     return {"message": "Job claimed successfully", "submission_id": sub_id, "job": doc_to_dict(job)}
@@ -1189,6 +2296,7 @@ async def create_bid(job_id: str, body: BidCreate, email: str = Depends(verify_t
         "_id": bid_id,
         "job_id": job_id,
         "job_title": job["title"],
+        "builder_email": job["builder_email"],
         "tester_email": email,
         "tester_name": f"{user['first_name']} {user['last_name']}",
         "status": "pending",
@@ -1207,44 +2315,54 @@ async def create_bid(job_id: str, body: BidCreate, email: str = Depends(verify_t
         "accepted_at": None,
     }
     await bids_col.insert_one(bid_doc)
+    invalidate_dashboard(email, job["builder_email"])
 
     # Notify builder
-    builder = await users_col.find_one({"email": job["builder_email"]})
+    builder = await get_user(job["builder_email"])
     if builder:
-        send_email(
+        await queue_email(
             job["builder_email"],
             f"New bid on your job: {job['title']}",
-            email_new_bid_html(builder["first_name"], f"{user['first_name']} {user['last_name']}", job["title"], job_id, body.bid_price, is_counter),
+            "new_bid", builder["first_name"], f"{user['first_name']} {user['last_name']}", job["title"], job_id, body.bid_price, is_counter,
         )
 
     return doc_to_dict(bid_doc)
 
 @app.get("/api/jobs/{job_id}/bids")
-async def list_job_bids(job_id: str, email: str = Depends(verify_token)):
+async def list_job_bids(
+    job_id: str,
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    email: str = Depends(verify_token),
+):
     user = await get_user_or_404(email)
-    job = await jobs_col.find_one({"_id": job_id})
+    job = await jobs_col.find_one({"_id": job_id}, {"builder_email": 1})
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
 
     if user["role"] == "builder" and job["builder_email"] == email:
-        bids = await bids_col.find({"job_id": job_id}).sort("created_at", -1).to_list(100)
+        bids = await find_page(bids_col, {"job_id": job_id}, response, limit, cursor)
     elif user["role"] == "tester":
-        bids = await bids_col.find({"job_id": job_id, "tester_email": email}).sort("created_at", -1).to_list(100)
+        bids = await find_page(bids_col, {"job_id": job_id, "tester_email": email}, response, limit, cursor)
     else:
         raise HTTPException(status_code=403, detail="Not authorized to view bids for this job")
 
     return [doc_to_dict(b) for b in bids]
 
 @app.get("/api/bids")
-async def list_my_bids(email: str = Depends(verify_token)):
+async def list_my_bids(
+    response: Response,
+    limit: int = Query(200, ge=1, le=500),
+    cursor: Optional[str] = None,
+    email: str = Depends(verify_token),
+):
     user = await get_user_or_404(email)
     if user["role"] == "tester":
-        bids = await bids_col.find({"tester_email": email}).sort("created_at", -1).to_list(200)
+        bids = await find_page(bids_col, {"tester_email": email}, response, limit, cursor)
     else:
         # Builder sees bids on all their jobs
-        builder_jobs = await jobs_col.find({"builder_email": email, "version": 2}).to_list(200)
-        job_ids = [j["_id"] for j in builder_jobs]
-        bids = await bids_col.find({"job_id": {"$in": job_ids}}).sort("created_at", -1).to_list(200)
+        bids = await find_page(bids_col, {"builder_email": email}, response, limit, cursor)
 
     # Enrich bids missing job_title
     missing_title_ids = list({b["job_id"] for b in bids if not b.get("job_title")})
@@ -1291,12 +2409,13 @@ async def accept_bid(bid_id: str, email: str = Depends(verify_token)):
     total_charge = round(bid["bid_price"] + platform_fee, 2)
 
     customer_id = await get_or_create_stripe_customer(user)
-    pi = stripe.PaymentIntent.create(
+    pi = await payments.create_payment_intent(
         amount=int(round(total_charge * 100)),
         currency="usd",
         customer=customer_id,
         metadata={"type": "bid_payment", "bid_id": bid_id, "job_id": bid["job_id"], "builder_email": email},
         automatic_payment_methods={"enabled": True},
+        idempotency_key=f"bid-payment-{bid_id}",
     )
 
     await bids_col.update_one({"_id": bid_id}, {"$set": {
@@ -1307,6 +2426,7 @@ async def accept_bid(bid_id: str, email: str = Depends(verify_token)):
         "payment_status": "pending",
         "accepted_at": datetime.utcnow().isoformat(),
     }})
+    invalidate_dashboard(email, bid["tester_email"])
 
     bid["status"] = "accepted"
     bid["platform_fee"] = platform_fee
@@ -1335,14 +2455,15 @@ async def reject_bid(bid_id: str, email: str = Depends(verify_token)):
         raise HTTPException(status_code=403, detail="Not your job")
 
     await bids_col.update_one({"_id": bid_id}, {"$set": {"status": "rejected"}})
+    invalidate_dashboard(email, bid["tester_email"])
 
     # Notify tester
-    tester = await users_col.find_one({"email": bid["tester_email"]})
+    tester = await get_user(bid["tester_email"])
     if tester:
-        send_email(
+        await queue_email(
             bid["tester_email"],
             f"Your bid on \"{job['title']}\" was not accepted",
-            email_bid_rejected_html(tester["first_name"], job["title"]),
+            "bid_rejected", tester["first_name"], job["title"],
         )
 
     bid["status"] = "rejected"
@@ -1361,33 +2482,21 @@ async def withdraw_bid(bid_id: str, email: str = Depends(verify_token)):
         raise HTTPException(status_code=400, detail="Can only withdraw pending bids")
 
     await bids_col.update_one({"_id": bid_id}, {"$set": {"status": "withdrawn"}})
+    invalidate_dashboard(email, bid.get("builder_email"))
     bid["status"] = "withdrawn"
     return doc_to_dict(bid)
 
-@app.post("/api/bids/{bid_id}/confirm-payment")
-async def confirm_bid_payment(bid_id: str, email: str = Depends(verify_token)):
-    user = await get_user_or_404(email)
-    if user["role"] != "builder":
-        raise HTTPException(status_code=403, detail="Only builders can confirm payment")
-
-    bid = await bids_col.find_one({"_id": bid_id})
-    if not bid:
-        raise HTTPException(status_code=404, detail="Bid not found")
-    if bid["status"] != "accepted" or bid.get("payment_status") != "pending":
-        raise HTTPException(status_code=400, detail="Bid payment not in pending state")
-
-    job = await jobs_col.find_one({"_id": bid["job_id"]})
-    if not job or job["builder_email"] != email:
-        raise HTTPException(status_code=403, detail="Not your job")
-
-    # Verify PI succeeded
-    pi = stripe.PaymentIntent.retrieve(bid["stripe_payment_intent_id"])
-    if pi.status != "succeeded":
-        raise HTTPException(status_code=400, detail=f"Payment not completed. Status: {pi.status}")
+def bid_submission_id(bid_id: str, item_id: str) -> str:
+    """Deterministic submission id per (bid, item) so repeated fulfillment can never duplicate rows."""
+    return f"sub_{hashlib.sha1(f'{bid_id}:{item_id}'.encode()).hexdigest()[:12]}"
 
-    await bids_col.update_one({"_id": bid_id}, {"$set": {"payment_status": "paid"}})
+async def fulfill_bid_payment(bid: dict, job: dict) -> tuple:
+    """Create a paid bid's submissions, attach them to the job and mark the bid paid.
 
-    # Create submissions for each item in scope
+    Safe to call from both the client confirmation and the Stripe webhook: runs as one
+    transaction where supported, and every step is idempotent otherwise. Returns
+    (submission_ids, fulfilled_now).
+    """
     scope_items = get_scope_items(job, bid)
     num_items = len(scope_items) or 1
     per_item_payout = round(bid["bid_price"] / num_items, 2)
@@ -1398,14 +2507,13 @@ async def confirm_bid_payment(bid_id: str, email: str = Depends(verify_token)):
         for item in r.get("items", []):
             role_map[item["id"]] = r["id"]
 
-    tester = await users_col.find_one({"email": bid["tester_email"]})
+    tester = await get_user(bid["tester_email"])
     tester_name = f"{tester['first_name']} {tester['last_name']}" if tester else bid.get("tester_name", "")
 
-    sub_ids = []
-    for item in scope_items:
-        sub_id = f"sub_{uuid.uuid4().hex[:8]}"
-        submission = {
-            "_id": sub_id,
+    now = datetime.utcnow().isoformat()
+    submissions = [
+        {
+            "_id": bid_submission_id(bid["_id"], item["id"]),
             "job_id": bid["job_id"],
             "job_title": job["title"],
             "project_id": job["project_id"],
@@ -1423,11 +2531,11 @@ async def confirm_bid_payment(bid_id: str, email: str = Depends(verify_token)):
             "video_url": None,
             "video_tags": [],
             "screenshots": [],
-            "created_at": datetime.utcnow().isoformat(),
+            "created_at": now,
             "submitted_at": None,
             "reviewed_at": None,
             # V2 fields
-            "bid_id": bid_id,
+            "bid_id": bid["_id"],
             "item_id": item["id"],
             "role_id": role_map.get(item["id"]),
             "service_type": item["service_type"],
@@ -1435,43 +2543,110 @@ async def confirm_bid_payment(bid_id: str, email: str = Depends(verify_token)):
             "transcript": None,
             "payout_amount": per_item_payout,
         }
-        await submissions_col.insert_one(submission)
-        sub_ids.append(sub_id)
+        for item in scope_items
+    ]
+    sub_ids = [sub["_id"] for sub in submissions]
+
+    async def fulfill(session):
+        current = await bids_col.find_one({"_id": bid["_id"]}, {"submissions_created": 1}, session=session)
+        if current and current.get("submissions_created"):
+            return False
+        # Bids paid before submissions_created existed already have randomly-id'd submissions
+        if await submissions_col.find_one({"bid_id": bid["_id"], "_id": {"$nin": sub_ids}}, {"_id": 1}, session=session):
+            await bids_col.update_one({"_id": bid["_id"]}, {"$set": {"submissions_created": True}}, session=session)
+            return False
+
+        if submissions:
+            try:
+                await submissions_col.insert_many(submissions, ordered=False, session=session)
+            except BulkWriteError as e:
+                # Rows left by an earlier interrupted attempt are fine; anything else is not
+                if any(err["code"] != 11000 for err in e.details.get("writeErrors", [])):
+                    raise
+
+        await jobs_col.update_one({"_id": bid["job_id"]}, {
+            "$addToSet": {"assigned_testers": bid["tester_email"], "submissions": {"$each": sub_ids}},
+        }, session=session)
+
+        result = await bids_col.update_one(
+            {"_id": bid["_id"], "submissions_created": {"$ne": True}},
+            {"$set": {"payment_status": "paid", "submissions_created": True}},
+            session=session,
+        )
+        return result.modified_count == 1
 
-    # Update job
-    await jobs_col.update_one({"_id": bid["job_id"]}, {
-        "$addToSet": {"assigned_testers": bid["tester_email"]},
-        "$push": {"submissions": {"$each": sub_ids}},
-        "$set": {"status": "in_progress"},
-    })
+    fulfilled_now = await run_in_transaction(fulfill)
+    if not fulfilled_now:
+        existing = await submissions_col.find({"bid_id": bid["_id"]}, {"_id": 1}).to_list(None)
+        return [sub["_id"] for sub in existing], False
+    invalidate_dashboard(bid["tester_email"], job["builder_email"])
 
-    # Email tester
+    await transition_job_status(bid["job_id"], ["open", "completed"], "in_progress")
     if tester:
-        send_email(
+        await queue_email(
             bid["tester_email"],
             f"Your bid on \"{job['title']}\" was accepted!",
-            email_bid_accepted_html(tester["first_name"], job["title"], bid["job_id"], bid["bid_price"]),
+            "bid_accepted", tester["first_name"], job["title"], bid["job_id"], bid["bid_price"],
         )
+    return sub_ids, True
 
-    return {"message": "Payment confirmed, submissions created", "submission_ids": sub_ids}
-
-# --- Submissions ---
-
-@app.get("/api/submissions")
-async def list_submissions(job_id: Optional[str] = None, email: str = Depends(verify_token)):
+@app.post("/api/bids/{bid_id}/confirm-payment")
+async def confirm_bid_payment(bid_id: str, email: str = Depends(verify_token)):
     user = await get_user_or_404(email)
-    query = {}
-    if job_id:
-        query["job_id"] = job_id
-    if user["role"] == "builder":
-        query["builder_email"] = email
-    else:
-        query["tester_email"] = email
-    return [doc_to_dict(d) for d in await submissions_col.find(query).to_list(200)]
+    if user["role"] != "builder":
+        raise HTTPException(status_code=403, detail="Only builders can confirm payment")
 
-@app.get("/api/submissions/{sub_id}")
-async def get_submission(sub_id: str, email: str = Depends(verify_token)):
-    doc = await submissions_col.find_one({"_id": sub_id})
+    bid = await bids_col.find_one({"_id": bid_id})
+    if not bid:
+        raise HTTPException(status_code=404, detail="Bid not found")
+
+    job = await jobs_col.find_one({"_id": bid["job_id"]})
+    if not job or job["builder_email"] != email:
+        raise HTTPException(status_code=403, detail="Not your job")
+
+    # Already fulfilled (double click, or the webhook got there first)
+    if bid.get("submissions_created"):
+        existing = await submissions_col.find({"bid_id": bid_id}, {"_id": 1}).to_list(None)
+        return {"message": "Payment confirmed, submissions created", "submission_ids": [sub["_id"] for sub in existing]}
+
+    if bid["status"] != "accepted" or bid.get("payment_status") not in ("pending", "paid"):
+        raise HTTPException(status_code=400, detail="Bid payment not in pending state")
+
+    # Verify PI succeeded
+    pi = await payments.retrieve_payment_intent(bid["stripe_payment_intent_id"])
+    if pi.status != "succeeded":
+        raise HTTPException(status_code=400, detail=f"Payment not completed. Status: {pi.status}")
+
+    sub_ids, _ = await fulfill_bid_payment(bid, job)
+    return {"message": "Payment confirmed, submissions created", "submission_ids": sub_ids}
+
+# --- Submissions ---
+
+@app.get("/api/submissions")
+async def list_submissions(
+    response: Response,
+    job_id: Optional[str] = None,
+    limit: int = Query(200, ge=1, le=500),
+    cursor: Optional[str] = None,
+    view: str = Query("full", pattern="^(full|summary)$"),
+    fields: Optional[str] = None,
+    email: str = Depends(verify_token),
+):
+    user = await get_user_or_404(email)
+    query = {}
+    if job_id:
+        query["job_id"] = job_id
+    if user["role"] == "builder":
+        query["builder_email"] = email
+    else:
+        query["tester_email"] = email
+    projection = list_projection(view, fields, SUBMISSION_SUMMARY_FIELDS, SUBMISSION_LIST_FIELDS)
+    return [doc_to_dict(d) for d in await find_page(submissions_col, query, response, limit, cursor, projection)]
+
+async def get_viewable_submission(sub_id: str, email: str, projection: Optional[dict] = None) -> dict:
+    if projection is not None:
+        projection = {**projection, "builder_email": 1, "tester_email": 1}
+    doc = await submissions_col.find_one({"_id": sub_id}, projection)
     if not doc:
         raise HTTPException(status_code=404, detail="Submission not found")
     user = await get_user_or_404(email)
@@ -1479,7 +2654,22 @@ async def get_submission(sub_id: str, email: str = Depends(verify_token)):
         raise HTTPException(status_code=403, detail="Not your submission to view")
     if user["role"] == "tester" and doc["tester_email"] != email:
         raise HTTPException(status_code=403, detail="Not your submission")
-    return doc_to_dict(doc)
+    return doc
+
+async def can_view_any_submission(sub_ids: list, email: str) -> Optional[str]:
+    """First of sub_ids the user may view, or None."""
+    if not sub_ids:
+        return None
+    user = await get_user_or_404(email)
+    query = {"_id": {"$in": sub_ids}}
+    if user["role"] in ("builder", "tester"):
+        query[f"{user['role']}_email"] = email
+    doc = await submissions_col.find_one(query, {"_id": 1})
+    return doc["_id"] if doc else None
+
+@app.get("/api/submissions/{sub_id}")
+async def get_submission(sub_id: str, email: str = Depends(verify_token)):
+    return doc_to_dict(await get_viewable_submission(sub_id, email))
 
 @app.put("/api/submissions/{sub_id}")
 async def update_submission(sub_id: str, body: SubmissionUpdate, email: str = Depends(verify_token)):
@@ -1495,8 +2685,12 @@ async def update_submission(sub_id: str, body: SubmissionUpdate, email: str = De
 
     updates = {k: v for k, v in body.model_dump().items() if v is not None}
     if updates:
-        await submissions_col.update_one({"_id": sub_id}, {"$set": updates})
+        before = await submissions_col.find_one_and_update(
+            {"_id": sub_id}, {"$set": updates}, {"screenshots": 1, "bug_reports": 1},
+        )
         doc.update(updates)
+        if "screenshots" in updates or "bug_reports" in updates:
+            await sync_screenshot_refs(sub_id, before or {}, doc)
     return doc_to_dict(doc)
 
 @app.post("/api/submissions/{sub_id}/submit")
@@ -1534,22 +2728,22 @@ async def submit_submission(sub_id: str, email: str = Depends(verify_token)):
         {"_id": sub_id},
         {"$set": {"status": "submitted", "submitted_at": datetime.utcnow().isoformat()}},
     )
+    invalidate_dashboard(email, doc["builder_email"])
     doc["status"] = "submitted"
     doc["submitted_at"] = datetime.utcnow().isoformat()
 
     # Notify builder
-    builder = await users_col.find_one({"email": doc["builder_email"]})
+    builder = await get_user(doc["builder_email"])
     job = await jobs_col.find_one({"_id": doc["job_id"]})
     if builder and job:
-        send_email(
+        await queue_email(
             doc["builder_email"],
             f"New submission for: {job['title']}",
-            email_submission_submitted_html(
-                builder["first_name"],
-                doc["tester_name"],
-                job["title"],
-                doc["job_id"],
-            ),
+            "submission_submitted",
+            builder["first_name"],
+            doc["tester_name"],
+            job["title"],
+            doc["job_id"],
         )
 
     return doc_to_dict(doc)
@@ -1568,54 +2762,42 @@ async def approve_submission(sub_id: str, action: ReviewAction, email: str = Dep
 
     now = datetime.utcnow().isoformat()
     update_fields = {"status": "approved", "review_feedback": action.feedback, "reviewed_at": now}
-
+    tester_stats = {"completed_tests": 1}
     if action.rating is not None:
         update_fields["builder_rating"] = action.rating
-        await users_col.update_one(
-            {"email": doc["tester_email"]},
-            {"$inc": {"total_ratings": 1, "rating_sum": action.rating}},
-        )
+        tester_stats.update(total_ratings=1, rating_sum=action.rating)
+
+    # Conditional on status so a concurrent approve/reject can't pay or count twice
+    result = await submissions_col.update_one({"_id": sub_id, "status": "submitted"}, {"$set": update_fields})
+    if not result.modified_count:
+        raise HTTPException(status_code=400, detail="Can only approve submitted submissions")
+    invalidate_dashboard(email, doc["tester_email"])
+
+    await users_col.update_one({"email": doc["tester_email"]}, {"$inc": tester_stats})
+    invalidate_user(doc["tester_email"])
 
     # Determine payout amount — v2 uses per-item payout from bid, v1 uses job.payout_amount
     job = await jobs_col.find_one({"_id": doc["job_id"]})
-    tester = await users_col.find_one({"email": doc["tester_email"]})
+    tester = await get_user(doc["tester_email"])
     transfer_id = None
 
     payout = doc.get("payout_amount") or (job.get("payout_amount") if job else 0) or 0
+    if tester:
+        tester_profile_cache.invalidate(tester.get("public_slug"))
 
     if tester and tester.get("stripe_connect_onboarded") and tester.get("stripe_connect_id") and payout > 0:
-        try:
-            transfer = stripe.Transfer.create(
-                amount=int(round(payout * 100)),
-                currency="usd",
-                destination=tester["stripe_connect_id"],
-                metadata={
-                    "submission_id": sub_id,
-                    "job_id": doc["job_id"],
-                    "tester_email": doc["tester_email"],
-                },
-            )
-            transfer_id = transfer.id
-            update_fields["stripe_transfer_id"] = transfer_id
-        except Exception as e:
-            logger.error("Failed to transfer to tester %s: %s", doc["tester_email"], e)
-
-    await submissions_col.update_one({"_id": sub_id}, {"$set": update_fields})
+        transfer_id = await pay_out_submission(doc, tester["stripe_connect_id"], payout)
 
     # Auto-complete job if all submissions resolved
-    if job:
-        all_subs = await submissions_col.find({"job_id": doc["job_id"]}).to_list(200)
-        if all(s["status"] in ("approved", "rejected") or s["_id"] == sub_id for s in all_subs):
-            await jobs_col.update_one({"_id": doc["job_id"]}, {"$set": {"status": "completed"}})
-            if not job.get("version") == 2:
-                await check_and_refund_unclaimed_slots(job)
+    if job and await record_submission_resolved(doc["job_id"]):
+        await check_and_refund_unclaimed_slots(job)
 
     # Notify tester
     if tester and job:
-        send_email(
+        await queue_email(
             doc["tester_email"],
             f"Your submission for \"{job['title']}\" was approved!",
-            email_approved_html(tester["first_name"], job["title"], payout),
+            "approved", tester["first_name"], job["title"], payout,
         )
 
     doc["status"] = "approved"
@@ -1638,26 +2820,26 @@ async def reject_submission(sub_id: str, action: ReviewAction, email: str = Depe
         raise HTTPException(status_code=400, detail="Can only reject submitted submissions")
 
     now = datetime.utcnow().isoformat()
-    await submissions_col.update_one(
-        {"_id": sub_id},
+    result = await submissions_col.update_one(
+        {"_id": sub_id, "status": "submitted"},
         {"$set": {"status": "rejected", "review_feedback": action.feedback, "reviewed_at": now}},
     )
+    if not result.modified_count:
+        raise HTTPException(status_code=400, detail="Can only reject submitted submissions")
+    invalidate_dashboard(email, doc["tester_email"])
 
     # Auto-complete job if all submissions resolved
     job = await jobs_col.find_one({"_id": doc["job_id"]})
-    if job:
-        all_subs = await submissions_col.find({"job_id": doc["job_id"]}).to_list(50)
-        if all(s["status"] in ("approved", "rejected") or s["_id"] == sub_id for s in all_subs):
-            await jobs_col.update_one({"_id": doc["job_id"]}, {"$set": {"status": "completed"}})
-            await check_and_refund_unclaimed_slots(job)
+    if job and await record_submission_resolved(doc["job_id"]):
+        await check_and_refund_unclaimed_slots(job)
 
     # Notify tester
-    tester = await users_col.find_one({"email": doc["tester_email"]})
+    tester = await get_user(doc["tester_email"])
     if tester and job:
-        send_email(
+        await queue_email(
             doc["tester_email"],
             f"Your submission for \"{job['title']}\" was not approved",
-            email_rejected_html(tester["first_name"], job["title"], action.feedback),
+            "rejected", tester["first_name"], job["title"], action.feedback,
         )
 
     doc["status"] = "rejected"
@@ -1667,32 +2849,57 @@ async def reject_submission(sub_id: str, action: ReviewAction, email: str = Depe
 
 # --- Tester Profiles ---
 
+tester_profile_cache = TTLCache(USER_CACHE_SIZE, TESTER_PROFILE_CACHE_TTL_SECONDS)
+
+@app.on_event("startup")
+async def backfill_completed_tests():
+    """One-off: seed users.completed_tests for testers created before it was maintained on approval."""
+    if not await users_col.find_one({"role": "tester", "completed_tests": {"$exists": False}}, {"_id": 1}):
+        return
+    pipeline = [
+        {"$match": {"status": "approved"}},
+        {"$group": {"_id": "$tester_email", "n": {"$sum": 1}}},
+    ]
+    async for row in submissions_col.aggregate(pipeline):
+        await users_col.update_one({"email": row["_id"], "completed_tests": {"$exists": False}}, {"$set": {"completed_tests": row["n"]}})
+    await users_col.update_many({"role": "tester", "completed_tests": {"$exists": False}}, {"$set": {"completed_tests": 0}})
+
 @app.get("/api/testers/{slug}")
 async def get_tester_profile(slug: str):
+    cached = tester_profile_cache.get(slug)
+    if cached is not None:
+        return cached
+
     user = await users_col.find_one({"public_slug": slug, "role": "tester"})
     if not user or not user.get("profile_visible", True):
         raise HTTPException(status_code=404, detail="Tester not found")
 
     total_ratings = user.get("total_ratings", 0)
     avg_rating = round(user.get("rating_sum", 0) / total_ratings, 1) if total_ratings > 0 else 0
-    completed = await submissions_col.count_documents({"tester_email": user["email"], "status": "approved"})
 
     reviews = await submissions_col.find(
         {"tester_email": user["email"], "status": "approved", "builder_rating": {"$ne": None}},
+        {"builder_email": 1, "job_title": 1, "builder_rating": 1, "review_feedback": 1, "reviewed_at": 1},
     ).sort("reviewed_at", -1).limit(10).to_list(10)
 
-    public_reviews = []
-    for r in reviews:
-        builder = await users_col.find_one({"email": r["builder_email"]})
-        public_reviews.append({
+    builder_emails = list({r["builder_email"] for r in reviews})
+    builder_names = {
+        b["email"]: f"{b['first_name']} {b['last_name']}"
+        async for b in users_col.find({"email": {"$in": builder_emails}}, {"email": 1, "first_name": 1, "last_name": 1})
+    }
+
+    public_reviews = [
+        {
             "job_title": r.get("job_title", ""),
-            "builder_name": f"{builder['first_name']} {builder['last_name']}" if builder else "Unknown",
+            "builder_name": builder_names.get(r["builder_email"], "Unknown"),
             "rating": r["builder_rating"],
             "feedback": r.get("review_feedback", ""),
             "reviewed_at": r.get("reviewed_at"),
-        })
+        }
+        for r in reviews
+    ]
 
-    return {
+    profile = {
         "first_name": user["first_name"],
         "last_name": user["last_name"],
         "public_slug": slug,
@@ -1700,10 +2907,12 @@ async def get_tester_profile(slug: str):
         "specialties": user.get("specialties", []),
         "avg_rating": avg_rating,
         "total_ratings": total_ratings,
-        "completed_tests": completed,
+        "completed_tests": user.get("completed_tests", 0),
         "created_at": user.get("created_at"),
         "reviews": public_reviews,
     }
+    tester_profile_cache.set(slug, profile)
+    return profile
 
 @app.put("/api/profile")
 async def update_profile(body: ProfileUpdate, email: str = Depends(verify_token)):
@@ -1715,11 +2924,419 @@ async def update_profile(body: ProfileUpdate, email: str = Depends(verify_token)
         {"email": email},
         {"$set": {"bio": body.bio, "specialties": body.specialties[:10], "profile_visible": body.profile_visible}},
     )
+    invalidate_user(email)
+    tester_profile_cache.invalidate(user.get("public_slug"))
     user["bio"] = body.bio
     user["specialties"] = body.specialties[:10]
     user["profile_visible"] = body.profile_visible
     return {"message": "Profile updated", "user": user_public(user)}
 
+# --- Object Storage ---
+#
+# Uploads are addressed by key, the path under /uploads ("sub_x_ab12cd34.mp4",
+# "screenshots/{sha256}.png", "hls/{name}/master.m3u8", ...). Writers produce a file at
+# storage.staging_path(key) and then put() it; code that needs a local file (Pillow, rrweb
+# processing) reads through `async with storage.fetch(key)`, while ffmpeg jobs read through
+# `async with storage.source(key)`, a path or presigned URL, so no job downloads a whole video.
+# With the local driver the staging path is the final location, so put() and fetch() are free. With the s3 driver
+# objects live in an S3-compatible bucket (AWS, MinIO, R2, ...), staging is node-local
+# scratch space, media is served by redirecting to presigned URLs, and clients can PUT
+# large files straight to the bucket (see Direct Uploads).
+
+class LocalStorage:
+    """Files under UPLOAD_DIR, served by the /uploads route itself."""
+
+    presigned = False
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def staging_path(self, key: str) -> Path:
+        path = self.root / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return path
+
+    async def put(self, key: str, src: Path, content_type: Optional[str] = None):
+        dst = self.staging_path(key)
+        if src != dst:
+            os.replace(src, dst)
+
+    async def put_tree(self, prefix: str, src_dir: Path):
+        dst = self.staging_path(prefix)
+        if src_dir != dst:
+            shutil.rmtree(dst, ignore_errors=True)
+            os.replace(src_dir, dst)
+
+    @asynccontextmanager
+    async def fetch(self, key: str):
+        path = self.root / key
+        if not path.is_file():
+            raise FileNotFoundError(key)
+        yield path
+
+    @asynccontextmanager
+    async def source(self, key: str):
+        """Where ffmpeg can read key from: here simply the stored file."""
+        async with self.fetch(key) as path:
+            yield str(path)
+
+    async def read(self, key: str) -> bytes:
+        async with aiofiles.open(self.root / key, "rb") as f:
+            return await f.read()
+
+    async def head(self, key: str) -> Optional[dict]:
+        path = self.root / key
+        if not path.is_file():
+            return None
+        return {"size": path.stat().st_size}
+
+    async def delete(self, key: str):
+        (self.root / key).unlink(missing_ok=True)
+
+    async def delete_prefix(self, prefix: str):
+        shutil.rmtree(self.root / prefix, ignore_errors=True)
+
+    async def sweep_staging(self, older_than: datetime) -> int:
+        # Staged files are the stored objects themselves
+        return 0
+
+    async def scan(self):
+        """Yields every stored object as {key, size, modified (naive UTC)}, a page at a time. The
+        walk is depth-first, so a directory's objects are listed together."""
+        def walk():
+            page = []
+            for dirpath, _, filenames in os.walk(self.root):
+                for name in filenames:
+                    path = Path(dirpath) / name
+                    try:
+                        st = path.stat()
+                    except FileNotFoundError:
+                        continue
+                    page.append({
+                        "key": path.relative_to(self.root).as_posix(),
+                        "size": st.st_size,
+                        "modified": datetime.utcfromtimestamp(st.st_mtime),
+                    })
+                    if len(page) >= STORAGE_SCAN_PAGE_SIZE:
+                        yield page
+                        page = []
+            if page:
+                yield page
+        pages = walk()
+        loop = asyncio.get_running_loop()
+        while page := await loop.run_in_executor(None, next, pages, None):
+            yield page
+
+    def close(self):
+        pass
+
+class S3Storage:
+    """S3-compatible bucket. boto3 is blocking, so every call runs on the storage thread pool."""
+
+    presigned = True
+
+    def __init__(self):
+        import boto3  # only needed with STORAGE_BACKEND=s3
+        from botocore.config import Config
+        from botocore.exceptions import ClientError
+
+        config = Config(signature_version="s3v4", s3={"addressing_style": "path"}, max_pool_connections=STORAGE_WORKERS)
+        params = {
+            "region_name": S3_REGION,
+            "aws_access_key_id": S3_ACCESS_KEY_ID or None,
+            "aws_secret_access_key": S3_SECRET_ACCESS_KEY or None,
+            "config": config,
+        }
+        self.client = boto3.client("s3", endpoint_url=S3_ENDPOINT_URL or None, **params)
+        # Presigned URLs go to browsers, which may reach the bucket under another host than the API does
+        self.signer = boto3.client("s3", endpoint_url=S3_PUBLIC_ENDPOINT_URL or S3_ENDPOINT_URL or None, **params)
+        self.bucket = S3_BUCKET
+        self.client_error = ClientError
+        self.scratch = Path(UPLOAD_DIR) / "staging"
+        self.executor = ThreadPoolExecutor(max_workers=STORAGE_WORKERS, thread_name_prefix="storage")
+
+    async def _call(self, fn, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, partial(fn, *args, **kwargs))
+
+    def _missing(self, e: Exception) -> bool:
+        return isinstance(e, self.client_error) and e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound")
+
+    def staging_path(self, key: str) -> Path:
+        path = self.scratch / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return path
+
+    async def put(self, key: str, src: Path, content_type: Optional[str] = None):
+        """Upload src and remove it. A failed upload leaves src in place so the caller can retry."""
+        extra = {"ContentType": content_type or media_type_for(PurePosixPath(key))}
+        await self._call(self.client.upload_file, str(src), self.bucket, key, ExtraArgs=extra)
+        src.unlink(missing_ok=True)
+
+    async def put_tree(self, prefix: str, src_dir: Path):
+        try:
+            await asyncio.gather(*(
+                self.put(f"{prefix}/{path.relative_to(src_dir).as_posix()}", path)
+                for path in src_dir.rglob("*") if path.is_file()
+            ))
+        finally:
+            shutil.rmtree(src_dir, ignore_errors=True)
+
+    @asynccontextmanager
+    async def fetch(self, key: str):
+        path = self.scratch / ".fetch" / f"{uuid.uuid4().hex[:8]}_{PurePosixPath(key).name}"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            try:
+                await self._call(self.client.download_file, self.bucket, key, str(path))
+            except Exception as e:
+                if self._missing(e):
+                    raise FileNotFoundError(key) from e
+                raise
+            yield path
+        finally:
+            path.unlink(missing_ok=True)
+
+    @asynccontextmanager
+    async def source(self, key: str):
+        """Where ffmpeg can read key from: a presigned GET, so each media job streams the
+        ranges it needs instead of downloading the whole video to scratch first."""
+        if not await self.head(key):
+            raise FileNotFoundError(key)
+        # Signed with the API's own endpoint and valid for as long as the longest job may run
+        yield self.client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": key},
+            ExpiresIn=max(S3_PRESIGN_EXPIRE_SECONDS, TRANSCODE_TIMEOUT_SECONDS),
+        )
+
+    async def read(self, key: str) -> bytes:
+        try:
+            obj = await self._call(self.client.get_object, Bucket=self.bucket, Key=key)
+        except Exception as e:
+            if self._missing(e):
+                raise FileNotFoundError(key) from e
+            raise
+        return await self._call(obj["Body"].read)
+
+    async def head(self, key: str) -> Optional[dict]:
+        try:
+            obj = await self._call(self.client.head_object, Bucket=self.bucket, Key=key)
+        except Exception as e:
+            if self._missing(e):
+                return None
+            raise
+        return {"size": obj["ContentLength"], "content_type": obj.get("ContentType")}
+
+    async def delete(self, key: str):
+        await self._call(self.client.delete_object, Bucket=self.bucket, Key=key)
+
+    async def delete_prefix(self, prefix: str):
+        def delete_all():
+            pages = self.client.get_paginator("list_objects_v2").paginate(Bucket=self.bucket, Prefix=f"{prefix}/")
+            for page in pages:
+                keys = [{"Key": obj["Key"]} for obj in page.get("Contents", [])]
+                if keys:
+                    self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": keys, "Quiet": True})
+        await self._call(delete_all)
+
+    async def sweep_staging(self, older_than: datetime) -> int:
+        """Remove scratch files (left behind by failed uploads) last modified before older_than."""
+        def sweep():
+            removed = 0
+            for path in self.scratch.rglob("*"):
+                try:
+                    if path.is_file() and datetime.utcfromtimestamp(path.stat().st_mtime) < older_than:
+                        path.unlink()
+                        removed += 1
+                except FileNotFoundError:
+                    continue
+            return removed
+        return await self._call(sweep)
+
+    async def scan(self):
+        """Yields every stored object as {key, size, modified (naive UTC)}, one listing page at a
+        time. Keys come back in order, so a prefix's objects are listed together."""
+        pages = iter(self.client.get_paginator("list_objects_v2").paginate(
+            Bucket=self.bucket, PaginationConfig={"PageSize": STORAGE_SCAN_PAGE_SIZE},
+        ))
+        while page := await self._call(next, pages, None):
+            yield [
+                {"key": obj["Key"], "size": obj["Size"], "modified": obj["LastModified"].astimezone(timezone.utc).replace(tzinfo=None)}
+                for obj in page.get("Contents", [])
+            ]
+
+    def presign_get(self, key: str) -> str:
+        return self.signer.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": key}, ExpiresIn=S3_PRESIGN_EXPIRE_SECONDS,
+        )
+
+    def presign_put(self, key: str, content_type: str, size: int) -> str:
+        # Content-Type and Content-Length are signed, so the client can only upload what was declared
+        return self.signer.generate_presigned_url(
+            "put_object",
+            Params={"Bucket": self.bucket, "Key": key, "ContentType": content_type, "ContentLength": size},
+            ExpiresIn=S3_PRESIGN_EXPIRE_SECONDS,
+        )
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+storage = S3Storage() if STORAGE_BACKEND == "s3" else LocalStorage(UPLOAD_DIR)
+
+def upload_key(url: str) -> str:
+    return url[len("/uploads/"):]
+
+@app.on_event("shutdown")
+async def shutdown_storage():
+    storage.close()
+
+# --- Media Derivatives ---
+#
+# Screenshots get a WebP thumbnail next to the original ({sha256}.thumb.webp, recorded on the
+# screenshots doc and in the submission's screenshot_thumbnails.{sha256}). Videos get a WebP
+# poster frame and a short low-res preview ({name}.poster.webp / {name}.preview.mp4, as
+# video_poster_url / video_preview_url). Work runs on a spawned process pool so the event
+# loop and request threads never decode media.
+
+media_executor = ProcessPoolExecutor(max_workers=MEDIA_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+media_tasks: set = set()
+
+def spawn_media_task(coro):
+    task = asyncio.create_task(coro)
+    media_tasks.add(task)
+    task.add_done_callback(media_tasks.discard)
+
+async def run_media_job(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(media_executor, fn, *args)
+
+async def make_screenshot_thumbnail(sha256: str):
+    blob = await screenshots_col.find_one({"_id": sha256})
+    if not blob:
+        return
+    thumb_url = blob.get("thumbnail_url")
+    if not thumb_url:
+        thumb_key = f"screenshots/{sha256}.thumb.webp"
+        try:
+            async with storage.fetch(f"screenshots/{blob['filename']}") as src:
+                # Uploads of the same image can race here, so each run writes its own file
+                dst = storage.staging_path(f"screenshots/.{uuid.uuid4().hex}.thumb.webp")
+                await run_media_job(media_jobs.image_thumbnail, str(src), str(dst), THUMBNAIL_MAX_PX)
+            await storage.put(thumb_key, dst, "image/webp")
+        except Exception as e:
+            logger.warning("Thumbnail failed for screenshot %s: %r", sha256, e)
+            await screenshots_col.update_one({"_id": sha256}, {"$set": {"thumbnail_status": "failed"}})
+            return
+        thumb_url = f"/uploads/{thumb_key}"
+        await screenshots_col.update_one({"_id": sha256}, {"$set": {"thumbnail_url": thumb_url, "thumbnail_status": "ready"}})
+
+    sub_ids = list(blob.get("refs", {}))
+    await submissions_col.update_many({"_id": {"$in": sub_ids}}, {"$set": {f"screenshot_thumbnails.{sha256}": thumb_url}})
+
+async def make_video_derivatives(sub_id: str, video_url: str):
+    key = upload_key(video_url)
+    stem = PurePosixPath(key).stem
+    poster_key, preview_key = f"{stem}.poster.webp", f"{stem}.preview.mp4"
+    updates = {"video_derivatives_status": "ready"}
+    try:
+        async with storage.source(key) as src:
+            poster = storage.staging_path(poster_key)
+            await run_media_job(media_jobs.video_poster, FFMPEG_BIN, src, str(poster), VIDEO_POSTER_WIDTH)
+            await storage.put(poster_key, poster, "image/webp")
+            updates["video_poster_url"] = f"/uploads/{poster_key}"
+            preview = storage.staging_path(preview_key)
+            await run_media_job(
+                media_jobs.video_preview, FFMPEG_BIN, src, str(preview),
+                VIDEO_PREVIEW_HEIGHT, VIDEO_PREVIEW_SECONDS,
+            )
+            await storage.put(preview_key, preview, "video/mp4")
+            updates["video_preview_url"] = f"/uploads/{preview_key}"
+    except Exception as e:
+        logger.warning("Video derivatives failed for %s: %r", sub_id, e)
+        updates["video_derivatives_status"] = "failed"
+
+    # Skip if the tester uploaded a different video meanwhile
+    await submissions_col.update_one({"_id": sub_id, "video_url": video_url}, {"$set": updates})
+
+# HLS: each video_url is transcoded to hls/{name}/master.m3u8 with one rendition per
+# HLS_LADDER rung up to the source height. Progress is in submission.video_transcode
+# (queued -> processing -> ready | failed); players use video_hls_url once it is set and
+# keep using video_url otherwise. ffmpeg is its own process, so the pool only bounds how
+# many run at once.
+
+transcode_executor = ThreadPoolExecutor(max_workers=TRANSCODE_WORKERS, thread_name_prefix="transcode")
+
+transcode_slots = asyncio.Semaphore(TRANSCODE_WORKERS)
+
+async def transcode_video(sub_id: str, video_url: str):
+    key = upload_key(video_url)
+    prefix = f"hls/{PurePosixPath(key).stem}"
+
+    async with transcode_slots:
+        # Skip a video that was replaced while it waited for a slot
+        started = await submissions_col.update_one(
+            {"_id": sub_id, "video_url": video_url},
+            {"$set": {"video_transcode.status": "processing", "video_transcode.started_at": datetime.utcnow().isoformat()}},
+        )
+        if not started.matched_count:
+            return
+        try:
+            async with storage.source(key) as src:
+                out_dir = storage.staging_path(prefix)
+                renditions = await asyncio.get_running_loop().run_in_executor(
+                    transcode_executor, media_jobs.hls_ladder, FFMPEG_BIN, FFPROBE_BIN, src, str(out_dir),
+                    HLS_LADDER, HLS_SEGMENT_SECONDS, TRANSCODE_TIMEOUT_SECONDS,
+                )
+            await storage.put_tree(prefix, out_dir)
+        except Exception as e:
+            logger.warning("HLS transcode failed for %s: %r", sub_id, e)
+            await submissions_col.update_one(
+                {"_id": sub_id, "video_url": video_url},
+                {"$set": {"video_transcode.status": "failed", "video_transcode.error": str(e)[:500], "video_transcode.finished_at": datetime.utcnow().isoformat()}},
+            )
+            return
+
+    result = await submissions_col.update_one(
+        {"_id": sub_id, "video_url": video_url},
+        {"$set": {
+            "video_hls_url": f"/uploads/{prefix}/master.m3u8",
+            "video_transcode.status": "ready",
+            "video_transcode.renditions": renditions,
+            "video_transcode.finished_at": datetime.utcnow().isoformat(),
+        }},
+    )
+    if not result.matched_count:
+        await storage.delete_prefix(prefix)
+
+async def set_submission_video(sub_id: str, video_url: str):
+    await submissions_col.update_one(
+        {"_id": sub_id},
+        {
+            "$set": {
+                "video_url": video_url,
+                "video_derivatives_status": "pending",
+                "video_transcode": {"status": "queued", "queued_at": datetime.utcnow().isoformat()},
+            },
+            "$unset": {"video_poster_url": "", "video_preview_url": "", "video_hls_url": ""},
+        },
+    )
+    spawn_media_task(make_video_derivatives(sub_id, video_url))
+    spawn_media_task(transcode_video(sub_id, video_url))
+
+@app.on_event("startup")
+async def backfill_media_derivatives():
+    async for blob in screenshots_col.find({"thumbnail_status": {"$exists": False}}, {"_id": 1}):
+        spawn_media_task(make_screenshot_thumbnail(blob["_id"]))
+    query = {"video_url": {"$ne": None}, "video_derivatives_status": {"$nin": ["ready", "failed"]}}
+    async for doc in submissions_col.find(query, {"video_url": 1}):
+        spawn_media_task(make_video_derivatives(doc["_id"], doc["video_url"]))
+    query = {"video_url": {"$ne": None}, "video_transcode.status": {"$nin": ["ready", "failed"]}}
+    async for doc in submissions_col.find(query, {"video_url": 1}):
+        spawn_media_task(transcode_video(doc["_id"], doc["video_url"]))
+
+@app.on_event("shutdown")
+async def shutdown_media_pool():
+    media_executor.shutdown(wait=False, cancel_futures=True)
+    transcode_executor.shutdown(wait=False, cancel_futures=True)
+
 # --- Video Upload & Tags ---
 
 @app.post("/api/submissions/{sub_id}/upload-video")
@@ -1736,10 +3353,11 @@ async def upload_video(sub_id: str, file: UploadFile = File(...), email: str = D
 
     if file.content_type not in ALLOWED_VIDEO_TYPES:
         raise HTTPException(status_code=400, detail=f"Invalid file type. Allowed: webm, mp4, quicktime")
+    await check_storage_quota(email)
 
     ext = file.filename.rsplit(".", 1)[-1] if "." in file.filename else "webm"
     filename = f"{sub_id}_{uuid.uuid4().hex[:8]}.{ext}"
-    filepath = Path(UPLOAD_DIR) / filename
+    filepath = storage.staging_path(filename)
 
     size = 0
     async with aiofiles.open(filepath, "wb") as f:
@@ -1750,11 +3368,239 @@ async def upload_video(sub_id: str, file: UploadFile = File(...), email: str = D
                 filepath.unlink(missing_ok=True)
                 raise HTTPException(status_code=400, detail="File too large (max 500MB)")
             await f.write(chunk)
+    await storage.put(filename, filepath, file.content_type)
 
     video_url = f"/uploads/{filename}"
-    await submissions_col.update_one({"_id": sub_id}, {"$set": {"video_url": video_url}})
+    await set_submission_video(sub_id, video_url)
     return {"video_url": video_url}
 
+# --- Resumable Video Upload ---
+#
+# 1. POST /api/submissions/{sub_id}/video-uploads   -> upload_id (file preallocated under partial/)
+# 2. PUT  /api/video-uploads/{upload_id}            -> one chunk, "Content-Range: bytes a-b/size"
+#    Chunks may arrive out of order and in parallel; each is written at its own offset.
+# 3. GET  /api/video-uploads/{upload_id}            -> contiguous offset + received ranges
+# 4. POST /api/video-uploads/{upload_id}/finalize   -> moved into storage, sets video_url
+# Sessions untouched for VIDEO_UPLOAD_EXPIRE_HOURS are swept with their partial file.
+
+def merge_ranges(ranges: list) -> list:
+    """Merge half-open [start, end) byte ranges."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+def parse_content_range(header: Optional[str], size: int) -> tuple:
+    """Parse "bytes a-b/total" into a half-open (start, end) range."""
+    try:
+        unit, spec = header.split(" ", 1)
+        span, total = spec.split("/", 1)
+        start, end = (int(x) for x in span.split("-", 1))
+        if unit != "bytes" or int(total) != size:
+            raise ValueError
+    except (AttributeError, ValueError):
+        raise HTTPException(status_code=400, detail="Content-Range must be 'bytes start-end/size'")
+    if start < 0 or end < start or end >= size:
+        raise HTTPException(status_code=416, detail="Content-Range outside of upload")
+    if end - start + 1 > VIDEO_CHUNK_MAX_SIZE:
+        raise HTTPException(status_code=400, detail="Chunk too large (max 64MB)")
+    return start, end + 1
+
+async def write_stream_at(request: Request, path: Path, offset: int, max_bytes: int) -> int:
+    """Stream the request body into an existing file at offset without buffering it. Returns bytes written."""
+    written = 0
+    async with aiofiles.open(path, "r+b") as f:
+        await f.seek(offset)
+        async for chunk in request.stream():
+            written += len(chunk)
+            if written > max_bytes:
+                raise HTTPException(status_code=400, detail="Chunk body longer than its Content-Range")
+            await f.write(chunk)
+    return written
+
+def partial_upload_path(upload_id: str) -> Path:
+    return Path(UPLOAD_DIR) / "partial" / f"{upload_id}.part"
+
+def upload_status(upload: dict) -> dict:
+    received = merge_ranges(upload.get("received", []))
+    offset = received[0][1] if received and received[0][0] == 0 else 0
+    return {
+        "upload_id": upload["_id"],
+        "size": upload["size"],
+        "offset": offset,
+        "received": received,
+        "status": upload["status"],
+        "chunk_size": VIDEO_CHUNK_SIZE,
+    }
+
+async def submission_is_draft(sub_id: str) -> bool:
+    """Uploads can outlive a submit; check again before attaching their media."""
+    return bool(await submissions_col.find_one({"_id": sub_id, "status": "draft"}, {"_id": 1}))
+
+async def get_upload_or_404(upload_id: str, email: str) -> dict:
+    upload = await video_uploads_col.find_one({"_id": upload_id, "tester_email": email})
+    if not upload:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if upload["status"] != "uploading":
+        raise HTTPException(status_code=400, detail=f"Upload is {upload['status']}")
+    return upload
+
+@app.post("/api/submissions/{sub_id}/video-uploads", status_code=201)
+async def create_video_upload(sub_id: str, body: VideoUploadCreate, email: str = Depends(verify_token)):
+    user = await get_user_or_404(email)
+    if user["role"] != "tester":
+        raise HTTPException(status_code=403, detail="Only testers can upload videos")
+
+    doc = await submissions_col.find_one({"_id": sub_id, "tester_email": email}, {"status": 1})
+    if not doc:
+        raise HTTPException(status_code=404, detail="Submission not found")
+    if doc["status"] != "draft":
+        raise HTTPException(status_code=400, detail="Can only upload video for draft submissions")
+    if body.content_type not in ALLOWED_VIDEO_TYPES:
+        raise HTTPException(status_code=400, detail="Invalid file type. Allowed: webm, mp4, quicktime")
+    await check_storage_quota(email, body.size)
+
+    upload_id = f"upl_{uuid.uuid4().hex}"
+    ext = body.filename.rsplit(".", 1)[-1].lower() if "." in body.filename else "webm"
+    if not ext.isalnum():
+        ext = "webm"
+
+    # Preallocate (sparse) so chunks can be written at their offsets in any order
+    async with aiofiles.open(partial_upload_path(upload_id), "wb") as f:
+        await f.truncate(body.size)
+
+    now = datetime.utcnow()
+    upload = {
+        "_id": upload_id,
+        "submission_id": sub_id,
+        "tester_email": email,
+        "ext": ext,
+        "content_type": body.content_type,
+        "size": body.size,
+        "received": [],
+        "status": "uploading",
+        "created_at": now.isoformat(),
+        "expires_at": now + timedelta(hours=VIDEO_UPLOAD_EXPIRE_HOURS),
+    }
+    await video_uploads_col.insert_one(upload)
+    return upload_status(upload)
+
+@app.get("/api/video-uploads/{upload_id}")
+async def get_video_upload(upload_id: str, email: str = Depends(verify_token)):
+    upload = await video_uploads_col.find_one({"_id": upload_id, "tester_email": email})
+    if not upload:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return upload_status(upload)
+
+@app.put("/api/video-uploads/{upload_id}")
+async def upload_video_chunk(upload_id: str, request: Request, email: str = Depends(verify_token)):
+    upload = await get_upload_or_404(upload_id, email)
+    start, end = parse_content_range(request.headers.get("content-range"), upload["size"])
+
+    written = await write_stream_at(request, partial_upload_path(upload_id), start, end - start)
+    if written != end - start:
+        raise HTTPException(status_code=400, detail=f"Chunk body was {written} bytes, Content-Range expects {end - start}")
+
+    upload = await video_uploads_col.find_one_and_update(
+        {"_id": upload_id, "status": "uploading"},
+        {
+            "$push": {"received": [start, end]},
+            "$set": {"expires_at": datetime.utcnow() + timedelta(hours=VIDEO_UPLOAD_EXPIRE_HOURS)},
+        },
+        return_document=True,
+    )
+    if not upload:
+        raise HTTPException(status_code=409, detail="Upload was finalized or cancelled")
+    return upload_status(upload)
+
+@app.post("/api/video-uploads/{upload_id}/finalize")
+async def finalize_video_upload(upload_id: str, email: str = Depends(verify_token)):
+    upload = await get_upload_or_404(upload_id, email)
+    if merge_ranges(upload["received"]) != [[0, upload["size"]]]:
+        raise HTTPException(status_code=409, detail="Upload is incomplete", headers={"Upload-Offset": str(upload_status(upload)["offset"])})
+
+    sub_id = upload["submission_id"]
+    if not await submission_is_draft(sub_id):
+        await video_uploads_col.update_one({"_id": upload_id, "status": "uploading"}, {"$set": {"status": "cancelled"}})
+        partial_upload_path(upload_id).unlink(missing_ok=True)
+        raise HTTPException(status_code=400, detail="Can only upload video for draft submissions")
+
+    claimed = await video_uploads_col.update_one(
+        {"_id": upload_id, "status": "uploading"},
+        {"$set": {"status": "finalizing", "expires_at": datetime.utcnow() + timedelta(hours=VIDEO_UPLOAD_EXPIRE_HOURS)}},
+    )
+    if not claimed.modified_count:
+        raise HTTPException(status_code=409, detail="Upload is already being finalized")
+
+    filename = f"{sub_id}_{uuid.uuid4().hex[:8]}.{upload['ext']}"
+    # Chunks were written in place, so with local storage this is a rename within UPLOAD_DIR
+    try:
+        await storage.put(filename, partial_upload_path(upload_id), upload["content_type"])
+    except Exception as e:
+        # The assembled file is still there; hand the session back so finalize can be retried
+        logger.error("Failed to store video upload %s: %s", upload_id, e)
+        await video_uploads_col.update_one({"_id": upload_id, "status": "finalizing"}, {"$set": {"status": "uploading"}})
+        raise HTTPException(status_code=503, detail="Could not store the video, please retry finalize")
+
+    # Storing a large file takes a while; the submission may have been submitted meanwhile
+    if not await submission_is_draft(sub_id):
+        await storage.delete(filename)
+        await video_uploads_col.update_one({"_id": upload_id}, {"$set": {"status": "cancelled"}})
+        raise HTTPException(status_code=400, detail="Can only upload video for draft submissions")
+
+    video_url = f"/uploads/{filename}"
+    await set_submission_video(sub_id, video_url)
+    await video_uploads_col.update_one({"_id": upload_id}, {"$set": {"status": "complete", "video_url": video_url}})
+    return {"video_url": video_url}
+
+@app.delete("/api/video-uploads/{upload_id}")
+async def cancel_video_upload(upload_id: str, email: str = Depends(verify_token)):
+    await get_upload_or_404(upload_id, email)
+    await video_uploads_col.update_one({"_id": upload_id}, {"$set": {"status": "cancelled"}})
+    partial_upload_path(upload_id).unlink(missing_ok=True)
+    return {"message": "Upload cancelled"}
+
+async def sweep_abandoned_uploads():
+    now = datetime.utcnow()
+    # A session left "finalizing" by a crashed worker is abandoned once it expires as well
+    stale = {"status": {"$in": ["uploading", "finalizing"]}, "expires_at": {"$lt": now}}
+    async for upload in video_uploads_col.find(stale, {"status": 1}):
+        result = await video_uploads_col.update_one({"_id": upload["_id"], "status": upload["status"]}, {"$set": {"status": "expired"}})
+        if result.modified_count:
+            partial_upload_path(upload["_id"]).unlink(missing_ok=True)
+            logger.info("Removed abandoned video upload %s", upload["_id"])
+    async for upload in direct_uploads_col.find({"status": "pending", "expires_at": {"$lt": now}}, {"key": 1}):
+        result = await direct_uploads_col.update_one({"_id": upload["_id"], "status": "pending"}, {"$set": {"status": "expired"}})
+        if result.modified_count:
+            await storage.delete(upload["key"])
+            logger.info("Removed abandoned direct upload %s", upload["_id"])
+    removed = await storage.sweep_staging(now - timedelta(hours=VIDEO_UPLOAD_EXPIRE_HOURS))
+    if removed:
+        logger.info("Removed %d stale staging files", removed)
+
+async def sweep_abandoned_uploads_loop():
+    while True:
+        try:
+            await sweep_abandoned_uploads()
+        except Exception as e:
+            logger.error("Failed to sweep abandoned uploads: %s", e)
+        await asyncio.sleep(3600)
+
+upload_sweeper_task: Optional[asyncio.Task] = None
+
+@app.on_event("startup")
+async def start_upload_sweeper():
+    global upload_sweeper_task
+    upload_sweeper_task = asyncio.create_task(sweep_abandoned_uploads_loop())
+
+@app.on_event("shutdown")
+async def stop_upload_sweeper():
+    if upload_sweeper_task:
+        upload_sweeper_task.cancel()
+
 @app.post("/api/submissions/{sub_id}/upload-screenshot")
 async def upload_screenshot(sub_id: str, file: UploadFile = File(...), email: str = Depends(verify_token)):
     user = await get_user_or_404(email)
@@ -1769,23 +3615,393 @@ async def upload_screenshot(sub_id: str, file: UploadFile = File(...), email: st
 
     if file.content_type not in ALLOWED_IMAGE_TYPES:
         raise HTTPException(status_code=400, detail="Invalid file type. Allowed: png, jpeg, webp")
+    await check_storage_quota(email)
 
-    ext = file.filename.rsplit(".", 1)[-1] if "." in file.filename else "png"
-    filename = f"{sub_id}_{uuid.uuid4().hex[:8]}.{ext}"
-    filepath = Path(UPLOAD_DIR) / "screenshots" / filename
+    # Stored by content digest: identical uploads share one file. screenshots_col counts
+    # references per submission (refs.{sub_id}) and in total (refcount); an upload counts
+    # once until the submission is saved, which sets the real count (sync_screenshot_refs)
+    tmp_path = storage.staging_path(f"screenshots/.{uuid.uuid4().hex}.tmp")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(tmp_path, "wb") as f:
+            while chunk := await file.read(1024 * 1024):
+                size += len(chunk)
+                if size > MAX_SCREENSHOT_SIZE:
+                    raise HTTPException(status_code=400, detail="File too large (max 10MB)")
+                digest.update(chunk)
+                await f.write(chunk)
+
+        sha256 = digest.hexdigest()
+        # The first upload names the blob; later copies reuse it whatever type they declare
+        known = await screenshots_col.find_one({"_id": sha256}, {"filename": 1, "content_type": 1})
+        filename = known["filename"] if known else f"{sha256}.{IMAGE_EXTENSIONS[file.content_type]}"
+        content_type = known.get("content_type", file.content_type) if known else file.content_type
+        deduplicated = await storage.head(f"screenshots/{filename}") is not None
+        if not deduplicated:
+            await storage.put(f"screenshots/{filename}", tmp_path, content_type)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+    blob = await screenshots_col.find_one_and_update(
+        {"_id": sha256},
+        {
+            "$inc": {"refcount": 1, f"refs.{sub_id}": 1},
+            "$set": {"last_uploaded_at": datetime.utcnow()},
+            "$setOnInsert": {"filename": filename, "size": size, "content_type": content_type, "created_at": datetime.utcnow().isoformat()},
+        },
+        {"filename": 1},
+        upsert=True,
+        return_document=True,
+    )
+    # A concurrent first upload under another type may have named it; ours is then an orphan for GC
+    filename = blob["filename"]
+
+    spawn_media_task(make_screenshot_thumbnail(sha256))
+
+    screenshot_url = f"/uploads/screenshots/{filename}"
+    return {"screenshot_url": screenshot_url, "sha256": sha256, "size": size, "deduplicated": deduplicated}
+
+def screenshot_digest_counts(doc: dict) -> Counter:
+    """How many times a submission uses each stored screenshot (screenshots[] and bug_reports[])."""
+    urls = list(doc.get("screenshots") or [])
+    urls += [bug.get("screenshot_url") for bug in doc.get("bug_reports") or [] if isinstance(bug, dict)]
+    counts = Counter()
+    for url in urls:
+        if isinstance(url, str) and url.startswith("/uploads/screenshots/"):
+            match = MEDIA_DIGEST_RE.match(PurePosixPath(url).name)
+            if match:
+                counts[match.group(1)] += 1
+    return counts
+
+async def sync_screenshot_refs(sub_id: str, before: dict, after: dict):
+    """Set refs.{sub_id} to the submission's actual use of each screenshot it gained or lost,
+    dropping it at zero, and move refcount by the same amount."""
+    old, new = screenshot_digest_counts(before), screenshot_digest_counts(after)
+    for sha256 in old.keys() | new.keys():
+        for _ in range(3):
+            blob = await screenshots_col.find_one({"_id": sha256}, {f"refs.{sub_id}": 1})
+            if not blob:
+                break
+            current = blob.get("refs", {}).get(sub_id)
+            if current == (new[sha256] or None):
+                break
+            update = {"$inc": {"refcount": new[sha256] - (current or 0)}}
+            if new[sha256]:
+                update["$set"] = {f"refs.{sub_id}": new[sha256]}
+            else:
+                update["$unset"] = {f"refs.{sub_id}": ""}
+            # Conditional on the count we read, so a concurrent upload is not overwritten
+            result = await screenshots_col.update_one({"_id": sha256, f"refs.{sub_id}": current}, update)
+            if result.modified_count:
+                break
+
+def verify_screenshot(sha256: str, path: Path) -> bool:
+    """Re-hash a stored screenshot and compare it with its content address."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest() == sha256
+
+@app.get("/api/screenshots/{sha256}/verify")
+async def verify_screenshot_integrity(sha256: str, email: str = Depends(verify_token)):
+    blob = await screenshots_col.find_one({"_id": sha256})
+    if not blob or not await can_view_any_submission(list(blob.get("refs", {})), email):
+        raise HTTPException(status_code=404, detail="Screenshot not found")
+    try:
+        async with storage.fetch(f"screenshots/{blob['filename']}") as path:
+            ok = await asyncio.get_running_loop().run_in_executor(None, verify_screenshot, sha256, path)
+    except FileNotFoundError:
+        ok = False
+    return {"sha256": sha256, "size": blob["size"], "refcount": blob["refcount"], "valid": ok}
 
+class GzipValidator:
+    """Checks gzip framing incrementally. Decompressed output is discarded in bounded slices.
+
+    With max_decompressed set, bodies that inflate past it are rejected (gzip bombs).
+    """
+
+    def __init__(self, max_decompressed: int = 0):
+        self._d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self.fed = False
+        self.max_decompressed = max_decompressed
+        self.decompressed = 0
+
+    def feed(self, data: bytes):
+        self.fed = self.fed or bool(data)
+        try:
+            while data:
+                self.decompressed += len(self._d.decompress(data, 1024 * 1024))
+                if self.max_decompressed and self.decompressed > self.max_decompressed:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Body decompresses past {self.max_decompressed // (1024 * 1024)}MB",
+                    )
+                data = self._d.unconsumed_tail
+                if self._d.eof and self._d.unused_data:
+                    # Concatenated gzip members are valid gzip
+                    data = self._d.unused_data
+                    self._d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        except zlib.error:
+            raise HTTPException(status_code=400, detail="Body is not valid gzip")
+
+    def close(self):
+        if not self.fed or not self._d.eof:
+            raise HTTPException(status_code=400, detail="Body is not valid gzip (truncated)")
+
+async def stream_gzip_to_file(
+    request: Request, path: Path, max_bytes: int, too_large: str, max_decompressed: int = 0,
+) -> int:
+    """Write a gzip request body to path chunk by chunk, enforcing max_bytes and gzip framing. Returns bytes written."""
     size = 0
-    async with aiofiles.open(filepath, "wb") as f:
-        while chunk := await file.read(1024 * 1024):
+    validator = GzipValidator(max_decompressed)
+    async with aiofiles.open(path, "wb") as f:
+        async for chunk in request.stream():
             size += len(chunk)
-            if size > MAX_SCREENSHOT_SIZE:
-                await f.close()
-                filepath.unlink(missing_ok=True)
-                raise HTTPException(status_code=400, detail="File too large (max 10MB)")
+            if size > max_bytes:
+                raise HTTPException(status_code=400, detail=too_large)
+            validator.feed(chunk)
             await f.write(chunk)
+    validator.close()
+    return size
+
+# --- rrweb Processing ---
+#
+# After a recording lands it is compacted in place (pointer/scroll events thinned to one per
+# RRWEB_POINTER_SAMPLE_MS, snapshots closer together than half a segment dropped, re-gzipped;
+# kept only if it saves RRWEB_COMPACT_MIN_SAVINGS), then cut into ~RRWEB_INDEX_SEGMENT_SECONDS segments that each begin at a
+# Meta + FullSnapshot pair (the recorder checks out a snapshot periodically), so replay can
+# start from any segment alone. Segments live under rrweb/index/{key}/ and the submission's
+# rrweb_index holds their time ranges.
+
+RRWEB_META = 4
+RRWEB_FULL_SNAPSHOT = 2
+RRWEB_INCREMENTAL = 3
+# IncrementalSource values whose intermediate samples can be dropped without changing the end state
+RRWEB_SAMPLED_SOURCES = {1: "mousemove", 3: "scroll", 6: "touchmove", 12: "drag"}
+
+rrweb_tasks: set = set()
+
+rrweb_executor = ThreadPoolExecutor(max_workers=RRWEB_PROCESS_WORKERS, thread_name_prefix="rrweb")
+
+# Held from download to upload, so no more than RRWEB_PROCESS_WORKERS recordings are on disk or in memory
+rrweb_slots = asyncio.Semaphore(RRWEB_PROCESS_WORKERS)
+
+def rrweb_index_prefix(key: str) -> str:
+    return f"rrweb/index/{key}"
+
+def segment_rrweb_events(events: list, segment_ms: int) -> list:
+    """Split events at snapshot boundaries at least segment_ms apart. Returns a list of event lists."""
+    segments, start = [], 0
+    for i, event in enumerate(events):
+        if event.get("type") != RRWEB_FULL_SNAPSHOT:
+            continue
+        cut = i - 1 if i > 0 and events[i - 1].get("type") == RRWEB_META else i
+        if cut > start and event["timestamp"] - events[start]["timestamp"] >= segment_ms:
+            segments.append(events[start:cut])
+            start = cut
+    segments.append(events[start:])
+    return segments
+
+def thin_positions(positions: list, sample_ms: int) -> list:
+    kept = []
+    for pos in positions:
+        if kept and pos.get("timeOffset", 0) - kept[-1].get("timeOffset", 0) < sample_ms:
+            kept[-1] = pos
+        else:
+            kept.append(pos)
+    return kept
+
+def compact_rrweb_events(events: list, sample_ms: int, snapshot_gap_ms: int) -> list:
+    """Drop redundant events while keeping every state the replay passes through at sample_ms resolution."""
+    out = []
+    # (source, target id) -> output slot of the last sampled event; a newer sample inside
+    # the window overwrites that slot. Any other event closes all windows, so ordering holds.
+    slots = {}
+    last_snapshot_ts = None
+    meta, prev_meta = None, None
+    for event in events:
+        etype, ts = event.get("type"), event.get("timestamp", 0)
+        data = event.get("data") or {}
+
+        if etype == RRWEB_INCREMENTAL and data.get("source") in RRWEB_SAMPLED_SOURCES:
+            if "positions" in data:
+                event = {**event, "data": {**data, "positions": thin_positions(data["positions"], sample_ms)}}
+            key = (data["source"], data.get("id"))
+            slot = slots.get(key)
+            if slot is not None and ts - out[slot]["timestamp"] < sample_ms:
+                if "positions" in data:
+                    # Keep the earlier timestamp; shift offsets so samples replay at their real time
+                    shift = ts - out[slot]["timestamp"]
+                    merged = out[slot]["data"]["positions"] + [
+                        {**p, "timeOffset": p.get("timeOffset", 0) + shift} for p in event["data"]["positions"]
+                    ]
+                    out[slot] = {**out[slot], "data": {**out[slot]["data"], "positions": thin_positions(merged, sample_ms)}}
+                else:
+                    out[slot] = {**event, "timestamp": out[slot]["timestamp"]}
+                continue
+            slots[key] = len(out)
+            out.append(event)
+            continue
+
+        slots.clear()
+        if etype == RRWEB_META:
+            meta, prev_meta = data, meta
+        elif etype == RRWEB_FULL_SNAPSHOT:
+            if last_snapshot_ts is not None and ts - last_snapshot_ts < snapshot_gap_ms:
+                # rrweb keeps node ids stable across checkouts, so later events still apply.
+                # The checkout's Meta goes too unless it carries a new viewport size.
+                if out and out[-1].get("type") == RRWEB_META and meta == prev_meta:
+                    out.pop()
+                continue
+            last_snapshot_ts = ts
+        out.append(event)
+    return out
+
+def write_rrweb_index(events: list, out_dir: Path, segment_ms: int) -> dict:
+    out_dir.mkdir(parents=True)
+    entries = []
+    for n, segment in enumerate(segment_rrweb_events(events, segment_ms)):
+        path = out_dir / f"{n:04d}.json.gz"
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump(segment, f, separators=(",", ":"))
+        entries.append({
+            "start": segment[0]["timestamp"],
+            "end": segment[-1]["timestamp"],
+            "events": len(segment),
+            "bytes": path.stat().st_size,
+        })
+    return {"start": entries[0]["start"], "end": entries[-1]["end"], "segments": entries}
+
+def process_rrweb_file(src: Path, out_dir: Path, segment_ms: int) -> tuple:
+    """Compact the recording at src in place and write its segment index. Returns (index, compaction stats)."""
+    original_bytes = src.stat().st_size
+    with gzip.open(src, "rb") as f:
+        raw = f.read(MAX_RRWEB_DECOMPRESSED_SIZE + 1)
+    if len(raw) > MAX_RRWEB_DECOMPRESSED_SIZE:
+        raise ValueError(f"recording decompresses past {MAX_RRWEB_DECOMPRESSED_SIZE // (1024 * 1024)}MB")
+    events = json.loads(raw)
+    del raw
+    if not events:
+        raise ValueError("recording has no events")
+
+    original_events = len(events)
+    compacted = compact_rrweb_events(events, RRWEB_POINTER_SAMPLE_MS, segment_ms // 2)
+    if len(compacted) == original_events:
+        # Nothing was dropped; thinned positions alone rarely pay for a rewrite. The index is
+        # cut from the events as stored, so segments replay exactly like the full recording
+        compacted, compacted_bytes = events, original_bytes
+    else:
+        tmp_path = src.with_name(f".{src.name}.compact")
+        try:
+            with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+                json.dump(compacted, f, separators=(",", ":"))
+            compacted_bytes = tmp_path.stat().st_size
+            if compacted_bytes <= original_bytes * (1 - RRWEB_COMPACT_MIN_SAVINGS):
+                os.replace(tmp_path, src)
+            else:
+                compacted, compacted_bytes = events, original_bytes
+        finally:
+            tmp_path.unlink(missing_ok=True)
+    # Only one of the two event lists is needed from here on
+    del events
+
+    stats = {
+        "original_bytes": original_bytes,
+        "compacted_bytes": compacted_bytes,
+        "original_events": original_events,
+        "compacted_events": len(compacted),
+    }
+    return write_rrweb_index(compacted, out_dir, segment_ms), stats
 
-    screenshot_url = f"/uploads/screenshots/{filename}"
-    return {"screenshot_url": screenshot_url}
+async def process_rrweb_recording(sub_id: str, rrweb_url: str):
+    key = f"{sub_id}_{uuid.uuid4().hex[:8]}"
+    prefix = rrweb_index_prefix(key)
+    out_dir = storage.staging_path(prefix)
+    updates = {}
+    try:
+        async with rrweb_slots:
+            async with storage.fetch(upload_key(rrweb_url)) as src:
+                index, stats = await asyncio.get_running_loop().run_in_executor(
+                    rrweb_executor, process_rrweb_file, src, out_dir, RRWEB_INDEX_SEGMENT_SECONDS * 1000
+                )
+                if stats["compacted_bytes"] < stats["original_bytes"]:
+                    # Compacted in place; a no-op with local storage. Skipped when compaction
+                    # saved too little to be worth uploading the recording again
+                    await storage.put(upload_key(rrweb_url), src, "application/gzip")
+            await storage.put_tree(prefix, out_dir)
+        updates["rrweb_compaction"] = stats
+        updates["rrweb_index"] = {"status": "ready", "key": key, **index}
+    except Exception as e:
+        logger.warning("Failed to process rrweb recording for %s: %s", sub_id, e)
+        shutil.rmtree(out_dir, ignore_errors=True)
+        await storage.delete_prefix(prefix)
+        updates["rrweb_index"] = {"status": "failed"}
+
+    # Only attach the results if the recording was not replaced in the meantime
+    result = await submissions_col.update_one(
+        {"_id": sub_id, "rrweb_recording_url": rrweb_url}, {"$set": updates}
+    )
+    if not result.matched_count:
+        await storage.delete_prefix(prefix)
+
+def schedule_rrweb_processing(sub_id: str, rrweb_url: str):
+    task = asyncio.create_task(process_rrweb_recording(sub_id, rrweb_url))
+    rrweb_tasks.add(task)
+    task.add_done_callback(rrweb_tasks.discard)
+
+async def set_rrweb_recording(sub_id: str, rrweb_url: str):
+    previous = await submissions_col.find_one_and_update(
+        {"_id": sub_id},
+        {"$set": {"rrweb_recording_url": rrweb_url, "rrweb_index": {"status": "pending"}}, "$unset": {"rrweb_compaction": ""}},
+        {"rrweb_index": 1},
+    )
+    if previous and (previous.get("rrweb_index") or {}).get("key"):
+        await storage.delete_prefix(rrweb_index_prefix(previous["rrweb_index"]["key"]))
+    schedule_rrweb_processing(sub_id, rrweb_url)
+
+async def backfill_rrweb_indexes():
+    query = {"rrweb_recording_url": {"$ne": None}, "rrweb_index.status": {"$nin": ["ready", "failed"]}}
+    async for doc in submissions_col.find(query, {"rrweb_recording_url": 1}):
+        # Feed the backlog in as slots free up instead of queueing every recording at once
+        while len(rrweb_tasks) >= RRWEB_PROCESS_WORKERS:
+            await asyncio.wait(set(rrweb_tasks), return_when=asyncio.FIRST_COMPLETED)
+        schedule_rrweb_processing(doc["_id"], doc["rrweb_recording_url"])
+
+rrweb_backfill_task: Optional[asyncio.Task] = None
+
+@app.on_event("startup")
+async def start_rrweb_backfill():
+    global rrweb_backfill_task
+    rrweb_backfill_task = asyncio.create_task(backfill_rrweb_indexes())
+
+@app.on_event("shutdown")
+async def stop_rrweb_processing():
+    if rrweb_backfill_task:
+        rrweb_backfill_task.cancel()
+    for task in list(rrweb_tasks):
+        task.cancel()
+    rrweb_executor.shutdown(wait=False, cancel_futures=True)
+
+@app.get("/api/submissions/{sub_id}/rrweb/index")
+async def get_rrweb_index(sub_id: str, email: str = Depends(verify_token)):
+    doc = await get_viewable_submission(sub_id, email, {"rrweb_index": 1})
+    index = doc.get("rrweb_index")
+    if not index or index.get("status") != "ready":
+        raise HTTPException(status_code=404, detail="Recording is not indexed")
+    return index
+
+@app.get("/api/submissions/{sub_id}/rrweb/segments/{n}")
+async def get_rrweb_segment(sub_id: str, n: int, request: Request, email: str = Depends(verify_token)):
+    doc = await get_viewable_submission(sub_id, email, {"rrweb_index": 1})
+    index = doc.get("rrweb_index") or {}
+    if index.get("status") != "ready" or not 0 <= n < len(index["segments"]):
+        raise HTTPException(status_code=404, detail="Segment not found")
+    # Segment files never change under a given key, so clients may cache them indefinitely
+    return await send_stored_file(
+        request, f"{rrweb_index_prefix(index['key'])}/{n:04d}.json.gz", "private, max-age=31536000, immutable", proxy=True,
+    )
 
 @app.post("/api/submissions/{sub_id}/upload-rrweb")
 async def upload_rrweb(sub_id: str, request: Request, email: str = Depends(verify_token)):
@@ -1798,23 +4014,215 @@ async def upload_rrweb(sub_id: str, request: Request, email: str = Depends(verif
         raise HTTPException(status_code=404, detail="Submission not found")
     if doc["status"] != "draft":
         raise HTTPException(status_code=400, detail="Can only upload rrweb for draft submissions")
+    await check_storage_quota(email)
 
-    body = await request.body()
-    if len(body) > 50 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="rrweb recording too large (max 50MB)")
-
-    rrweb_dir = Path(UPLOAD_DIR) / "rrweb"
-    rrweb_dir.mkdir(exist_ok=True)
     filename = f"{sub_id}_{uuid.uuid4().hex[:8]}.json.gz"
-    filepath = rrweb_dir / filename
 
-    async with aiofiles.open(filepath, "wb") as f:
-        await f.write(body)
+    # Stream to a temp file, then store it so readers never see a partial recording
+    tmp_path = storage.staging_path(f"rrweb/.{filename}.tmp")
+    try:
+        await stream_gzip_to_file(
+            request, tmp_path, MAX_RRWEB_SIZE, "rrweb recording too large (max 50MB)", MAX_RRWEB_DECOMPRESSED_SIZE,
+        )
+        await storage.put(f"rrweb/{filename}", tmp_path, "application/gzip")
+    finally:
+        tmp_path.unlink(missing_ok=True)
 
     rrweb_url = f"/uploads/rrweb/{filename}"
-    await submissions_col.update_one({"_id": sub_id}, {"$set": {"rrweb_recording_url": rrweb_url}})
+    await set_rrweb_recording(sub_id, rrweb_url)
     return {"rrweb_recording_url": rrweb_url}
 
+# --- Incremental rrweb Upload ---
+#
+# While recording, the client POSTs gzipped JSON arrays of events as numbered segments
+# (seq 0, 1, 2, ...). Re-sending a seq overwrites it, so retries are safe. Finalize
+# stitches the segments into a single recording at rrweb_recording_url, one segment in memory at a time.
+
+def rrweb_segment_dir(sub_id: str) -> Path:
+    return Path(UPLOAD_DIR) / "rrweb" / "segments" / sub_id
+
+async def get_draft_rrweb_submission(sub_id: str, email: str) -> dict:
+    user = await get_user_or_404(email)
+    if user["role"] != "tester":
+        raise HTTPException(status_code=403, detail="Only testers can upload session recordings")
+
+    doc = await submissions_col.find_one({"_id": sub_id, "tester_email": email}, {"status": 1})
+    if not doc:
+        raise HTTPException(status_code=404, detail="Submission not found")
+    if doc["status"] != "draft":
+        raise HTTPException(status_code=400, detail="Can only upload rrweb for draft submissions")
+    return doc
+
+def read_rrweb_segment(path: Path) -> list:
+    """Load one segment's events, refusing it before parsing if it inflates past the segment cap."""
+    with gzip.open(path, "rb") as f:
+        raw = f.read(MAX_RRWEB_SEGMENT_DECOMPRESSED_SIZE + 1)
+    if len(raw) > MAX_RRWEB_SEGMENT_DECOMPRESSED_SIZE:
+        raise ValueError(f"{path.name} decompresses past {MAX_RRWEB_SEGMENT_DECOMPRESSED_SIZE // (1024 * 1024)}MB")
+    return json.loads(raw)
+
+def assemble_rrweb_segments(paths: list, out_path: Path) -> int:
+    """Concatenate the event arrays of gzipped segments into one gzipped array. Returns the event count."""
+    count = size = 0
+    with gzip.open(out_path, "wt", encoding="utf-8") as out:
+        out.write("[")
+        for path in paths:
+            events = read_rrweb_segment(path)
+            if not isinstance(events, list):
+                raise ValueError(f"{path.name} is not an event array")
+            for event in events:
+                out.write("," if count else "")
+                size += out.write(json.dumps(event, separators=(",", ":"))) + 1
+                count += 1
+            if size > MAX_RRWEB_DECOMPRESSED_SIZE:
+                raise ValueError(f"recording decompresses past {MAX_RRWEB_DECOMPRESSED_SIZE // (1024 * 1024)}MB")
+        out.write("]")
+    return count
+
+@app.post("/api/submissions/{sub_id}/rrweb-segments", status_code=201)
+async def append_rrweb_segment(
+    sub_id: str,
+    request: Request,
+    seq: int = Query(..., ge=0, lt=MAX_RRWEB_SEGMENTS),
+    email: str = Depends(verify_token),
+):
+    await get_draft_rrweb_submission(sub_id, email)
+
+    seg_dir = rrweb_segment_dir(sub_id)
+    seg_dir.mkdir(parents=True, exist_ok=True)
+    seg_path = seg_dir / f"{seq:05d}.json.gz"
+    tmp_path = seg_dir / f".{seq:05d}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        size = await stream_gzip_to_file(
+            request, tmp_path, MAX_RRWEB_SEGMENT_SIZE, "rrweb segment too large (max 10MB)", MAX_RRWEB_SEGMENT_DECOMPRESSED_SIZE,
+        )
+        os.replace(tmp_path, seg_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+    return {"seq": seq, "size": size}
+
+class RrwebFinalizeBody(BaseModel):
+    segments: int = Field(..., gt=0, le=MAX_RRWEB_SEGMENTS)
+
+@app.post("/api/submissions/{sub_id}/rrweb-segments/finalize")
+async def finalize_rrweb_segments(sub_id: str, body: RrwebFinalizeBody, email: str = Depends(verify_token)):
+    await get_draft_rrweb_submission(sub_id, email)
+
+    seg_dir = rrweb_segment_dir(sub_id)
+    paths = [seg_dir / f"{seq:05d}.json.gz" for seq in range(body.segments)]
+    missing = [seq for seq, path in enumerate(paths) if not path.exists()]
+    if missing:
+        raise HTTPException(status_code=409, detail=f"Missing rrweb segments: {', '.join(map(str, missing[:20]))}")
+
+    filename = f"{sub_id}_{uuid.uuid4().hex[:8]}.json.gz"
+    tmp_path = storage.staging_path(f"rrweb/.{filename}.tmp")
+    try:
+        # Shares the bound with recording processing: assembly parses one segment at a time
+        async with rrweb_slots:
+            events = await asyncio.get_running_loop().run_in_executor(rrweb_executor, assemble_rrweb_segments, paths, tmp_path)
+            await storage.put(f"rrweb/{filename}", tmp_path, "application/gzip")
+    except (ValueError, OSError, EOFError) as e:
+        logger.warning("Could not assemble rrweb segments for %s: %s", sub_id, e)
+        raise HTTPException(status_code=400, detail="rrweb segments are not valid event arrays")
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+    shutil.rmtree(seg_dir, ignore_errors=True)
+    rrweb_url = f"/uploads/rrweb/{filename}"
+    await set_rrweb_recording(sub_id, rrweb_url)
+    return {"rrweb_recording_url": rrweb_url, "events": events}
+
+# --- Direct Uploads ---
+#
+# With STORAGE_BACKEND=s3 the bytes can skip the API entirely:
+# 1. POST /api/submissions/{sub_id}/direct-uploads  -> presigned PUT url + the headers it was signed with
+# 2. PUT the file to that url (straight to the bucket)
+# 3. POST /api/direct-uploads/{upload_id}/complete  -> object size is checked, then it is attached as
+#    video_url and processed exactly like a proxied upload
+# Sessions not completed within VIDEO_UPLOAD_EXPIRE_HOURS are swept with their object.
+# With the local driver step 1 answers 501 and clients fall back to the proxied endpoints.
+# Only videos go direct: rrweb recordings must pass gzip and size checks on the way in,
+# which a presigned PUT cannot enforce.
+
+DIRECT_UPLOAD_KINDS = {
+    "video": (ALLOWED_VIDEO_TYPES, MAX_UPLOAD_SIZE),
+}
+
+@app.post("/api/submissions/{sub_id}/direct-uploads", status_code=201)
+async def create_direct_upload(sub_id: str, body: DirectUploadCreate, email: str = Depends(verify_token)):
+    if not storage.presigned:
+        raise HTTPException(status_code=501, detail="Direct uploads need STORAGE_BACKEND=s3")
+    user = await get_user_or_404(email)
+    if user["role"] != "tester":
+        raise HTTPException(status_code=403, detail="Only testers can upload media")
+
+    doc = await submissions_col.find_one({"_id": sub_id, "tester_email": email}, {"status": 1})
+    if not doc:
+        raise HTTPException(status_code=404, detail="Submission not found")
+    if doc["status"] != "draft":
+        raise HTTPException(status_code=400, detail="Can only upload media for draft submissions")
+
+    allowed_types, max_size = DIRECT_UPLOAD_KINDS[body.kind]
+    if body.content_type not in allowed_types:
+        raise HTTPException(status_code=400, detail="Invalid file type")
+    if body.size > max_size:
+        raise HTTPException(status_code=400, detail=f"File too large (max {max_size // (1024 * 1024)}MB)")
+    await check_storage_quota(email, body.size)
+
+    ext = body.filename.rsplit(".", 1)[-1].lower() if "." in body.filename else "webm"
+    key = f"{sub_id}_{uuid.uuid4().hex[:8]}.{ext if ext.isalnum() else 'webm'}"
+
+    now = datetime.utcnow()
+    upload_id = f"dup_{uuid.uuid4().hex}"
+    await direct_uploads_col.insert_one({
+        "_id": upload_id,
+        "submission_id": sub_id,
+        "tester_email": email,
+        "kind": body.kind,
+        "key": key,
+        "content_type": body.content_type,
+        "size": body.size,
+        "status": "pending",
+        "created_at": now.isoformat(),
+        "expires_at": now + timedelta(hours=VIDEO_UPLOAD_EXPIRE_HOURS),
+    })
+    return {
+        "upload_id": upload_id,
+        "method": "PUT",
+        "url": storage.presign_put(key, body.content_type, body.size),
+        "headers": {"Content-Type": body.content_type},
+        "expires_in": S3_PRESIGN_EXPIRE_SECONDS,
+    }
+
+@app.post("/api/direct-uploads/{upload_id}/complete")
+async def complete_direct_upload(upload_id: str, email: str = Depends(verify_token)):
+    upload = await direct_uploads_col.find_one({"_id": upload_id, "tester_email": email})
+    if not upload:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if upload["status"] != "pending":
+        raise HTTPException(status_code=400, detail=f"Upload is {upload['status']}")
+    if upload["kind"] not in DIRECT_UPLOAD_KINDS:
+        raise HTTPException(status_code=400, detail="Upload kind is no longer supported")
+
+    obj = await storage.head(upload["key"])
+    if not obj:
+        raise HTTPException(status_code=409, detail="Object has not been uploaded yet")
+    if obj["size"] != upload["size"]:
+        raise HTTPException(status_code=400, detail="Uploaded object does not match the declared size")
+
+    claimed = await direct_uploads_col.update_one({"_id": upload_id, "status": "pending"}, {"$set": {"status": "complete"}})
+    if not claimed.modified_count:
+        raise HTTPException(status_code=409, detail="Upload is already being completed")
+
+    sub_id, url = upload["submission_id"], f"/uploads/{upload['key']}"
+    if not await submission_is_draft(sub_id):
+        await direct_uploads_col.update_one({"_id": upload_id}, {"$set": {"status": "cancelled"}})
+        await storage.delete(upload["key"])
+        raise HTTPException(status_code=400, detail="Can only upload media for draft submissions")
+    await set_submission_video(sub_id, url)
+    return {"video_url": url}
+
 @app.put("/api/submissions/{sub_id}/session-timing")
 async def update_session_timing(sub_id: str, request: Request, email: str = Depends(verify_token)):
     user = await get_user_or_404(email)
@@ -1853,9 +4261,100 @@ async def update_video_tags(sub_id: str, body: VideoTagsUpdate, email: str = Dep
         raise HTTPException(status_code=400, detail="No video uploaded for this submission")
 
     tags = [t.model_dump() for t in body.video_tags]
+    for tag in tags:
+        if not 0 <= tag["start_seconds"] < tag["end_seconds"] or tag["end_seconds"] - tag["start_seconds"] > CLIP_MAX_SECONDS:
+            raise HTTPException(status_code=400, detail=f"Tag ranges must be increasing and at most {CLIP_MAX_SECONDS}s long")
     await submissions_col.update_one({"_id": sub_id}, {"$set": {"video_tags": tags}})
+    for tag in tags:
+        await ensure_clip(sub_id, doc["video_url"], tag["start_seconds"], tag["end_seconds"])
     return {"video_tags": tags}
 
+# --- Video Clips ---
+#
+# Every tagged range is cut into its own file under clips/. clips_col is keyed by a hash of
+# (video_url, start, end), so each distinct range of a given upload is extracted once and
+# later requests return the stored file. Extraction runs on its own small pool so clips
+# never queue behind HLS transcodes.
+
+clip_executor = ThreadPoolExecutor(max_workers=CLIP_WORKERS, thread_name_prefix="clips")
+
+def clip_key(video_url: str, start: float, end: float) -> str:
+    return hashlib.sha1(f"{video_url}|{start:.3f}|{end:.3f}".encode()).hexdigest()
+
+def clip_public(clip: dict) -> dict:
+    return {
+        "start_seconds": clip["start"],
+        "end_seconds": clip["end"],
+        "status": clip["status"],
+        "clip_url": clip.get("clip_url"),
+        "mode": clip.get("mode"),
+        "bytes": clip.get("bytes"),
+        # Stream-copied clips begin at the preceding keyframe; players skip this much
+        "start_offset": clip.get("start_offset", 0),
+    }
+
+async def ensure_clip(sub_id: str, video_url: str, start: float, end: float) -> dict:
+    """Return the cached clip for this range, scheduling extraction on first request (or after a failure)."""
+    key = clip_key(video_url, start, end)
+    result = await clips_col.update_one(
+        {"_id": key},
+        {"$setOnInsert": {
+            "submission_id": sub_id, "video_url": video_url, "start": start, "end": end,
+            "status": "pending", "created_at": datetime.utcnow().isoformat(),
+        }},
+        upsert=True,
+    )
+    if result.upserted_id is not None:
+        spawn_media_task(extract_clip(key))
+    else:
+        retried = await clips_col.update_one({"_id": key, "status": "failed"}, {"$set": {"status": "pending"}})
+        if retried.modified_count:
+            spawn_media_task(extract_clip(key))
+    return await clips_col.find_one({"_id": key})
+
+async def extract_clip(key: str):
+    clip = await clips_col.find_one({"_id": key})
+    dst_stem = storage.staging_path(f"clips/{clip['submission_id']}_{key[:12]}")
+    try:
+        async with storage.source(upload_key(clip["video_url"])) as src:
+            result = await asyncio.get_running_loop().run_in_executor(
+                clip_executor, media_jobs.extract_clip, FFMPEG_BIN, FFPROBE_BIN, src, str(dst_stem),
+                clip["start"], clip["end"], CLIP_KEYFRAME_TOLERANCE_SECONDS, TRANSCODE_TIMEOUT_SECONDS,
+            )
+        await storage.put(f"clips/{result['filename']}", dst_stem.with_name(result["filename"]))
+    except Exception as e:
+        logger.warning("Clip extraction failed for %s: %r", key, e)
+        await clips_col.update_one({"_id": key}, {"$set": {"status": "failed", "error": str(e)[:500]}})
+        return
+    await clips_col.update_one({"_id": key}, {"$set": {
+        "status": "ready",
+        "clip_url": f"/uploads/clips/{result['filename']}",
+        "mode": result["mode"],
+        "bytes": result["bytes"],
+        "start_offset": round(clip["start"] - result["keyframe"], 3) if result["mode"] == "copy" else 0,
+        "finished_at": datetime.utcnow().isoformat(),
+    }})
+
+@app.get("/api/submissions/{sub_id}/clips")
+async def list_clips(sub_id: str, email: str = Depends(verify_token)):
+    doc = await get_viewable_submission(sub_id, email, {"video_url": 1, "video_tags": 1})
+    if not doc.get("video_url"):
+        return []
+    clips = []
+    for tag in doc.get("video_tags", []):
+        clip = await ensure_clip(sub_id, doc["video_url"], tag["start_seconds"], tag["end_seconds"])
+        clips.append({**clip_public(clip), "tag_type": tag["tag_type"], "note": tag.get("note", "")})
+    return clips
+
+@app.on_event("startup")
+async def resume_pending_clips():
+    async for clip in clips_col.find({"status": "pending"}, {"_id": 1}):
+        spawn_media_task(extract_clip(clip["_id"]))
+
+@app.on_event("shutdown")
+async def shutdown_clip_pool():
+    clip_executor.shutdown(wait=False, cancel_futures=True)
+
 # --- Stripe Connect ---
 
 @app.post("/api/stripe/connect/onboard")
@@ -1866,7 +4365,7 @@ async def stripe_connect_onboard(email: str = Depends(verify_token)):
 
     account_id = user.get("stripe_connect_id")
     if not account_id:
-        account = stripe.Account.create(
+        account = await payments.create_account(
             type="express",
             email=email,
             metadata={"peertesthub_email": email},
@@ -1874,8 +4373,9 @@ async def stripe_connect_onboard(email: str = Depends(verify_token)):
         )
         account_id = account.id
         await users_col.update_one({"email": email}, {"$set": {"stripe_connect_id": account_id}})
+        invalidate_user(email)
 
-    link = stripe.AccountLink.create(
+    link = await payments.create_account_link(
         account=account_id,
         refresh_url=f"{FRONTEND_URL}/settings?stripe=refresh",
         return_url=f"{FRONTEND_URL}/settings?stripe=success",
@@ -1895,10 +4395,11 @@ async def stripe_connect_status(email: str = Depends(verify_token)):
     # If we have an account but haven't marked onboarded, check with Stripe
     if account_id and not onboarded:
         try:
-            account = stripe.Account.retrieve(account_id)
+            account = await payments.retrieve_account(account_id)
             if account.charges_enabled or account.payouts_enabled:
                 onboarded = True
                 await users_col.update_one({"email": email}, {"$set": {"stripe_connect_onboarded": True}})
+                invalidate_user(email)
         except Exception:
             pass
 
@@ -1920,23 +4421,28 @@ async def stripe_webhook(request: Request):
         pi = event["data"]["object"]
         # Backup: mark job open if confirm-payment wasn't called (v1)
         job = await jobs_col.find_one({"stripe_payment_intent_id": pi["id"], "status": "pending_payment"})
-        if job:
-            await jobs_col.update_one({"_id": job["_id"]}, {"$set": {"status": "open"}})
+        if job and await transition_job_status(job["_id"], ["pending_payment"], "open"):
             logger.info("Webhook: marked job %s as open (PI %s)", job["_id"], pi["id"])
 
-        # Backup: mark bid payment as paid if confirm-payment wasn't called (v2)
-        bid = await bids_col.find_one({"stripe_payment_intent_id": pi["id"], "payment_status": "pending"})
-        if bid:
-            await bids_col.update_one({"_id": bid["_id"]}, {"$set": {"payment_status": "paid"}})
-            logger.info("Webhook: marked bid %s as paid (PI %s)", bid["_id"], pi["id"])
+        # Backup: fulfill the bid if confirm-payment wasn't called (v2)
+        bid = await bids_col.find_one({"stripe_payment_intent_id": pi["id"], "submissions_created": {"$ne": True}})
+        if bid and bid["status"] == "accepted":
+            job = await jobs_col.find_one({"_id": bid["job_id"]})
+            if job:
+                _, fulfilled_now = await fulfill_bid_payment(bid, job)
+                if fulfilled_now:
+                    logger.info("Webhook: fulfilled bid %s (PI %s)", bid["_id"], pi["id"])
 
     elif event["type"] == "account.updated":
         account = event["data"]["object"]
         if account.get("charges_enabled") or account.get("payouts_enabled"):
-            await users_col.update_one(
+            updated = await users_col.find_one_and_update(
                 {"stripe_connect_id": account["id"]},
                 {"$set": {"stripe_connect_onboarded": True}},
+                projection={"email": 1},
             )
+            if updated:
+                invalidate_user(updated["email"])
             logger.info("Webhook: marked Connect account %s as onboarded", account["id"])
 
     return {"received": True}
@@ -1951,16 +4457,572 @@ async def stripe_config():
 
 @app.get("/api/stats")
 async def get_stats():
+    counters = await get_counters()
     return {
-        "total_users": await users_col.count_documents({}),
-        "builders": await users_col.count_documents({"role": "builder"}),
-        "testers": await users_col.count_documents({"role": "tester"}),
-        "total_projects": await projects_col.count_documents({}),
-        "total_jobs": await jobs_col.count_documents({}),
-        "open_jobs": await jobs_col.count_documents({"status": "open"}),
+        "total_users": counters.get("users", 0),
+        "builders": counters.get("builders", 0),
+        "testers": counters.get("testers", 0),
+        "total_projects": counters.get("projects", 0),
+        "total_jobs": counters.get("jobs", 0),
+        "open_jobs": counters.get("open_jobs", 0),
+    }
+
+# --- Media ---
+#
+# Uploaded files keep their /uploads/... URLs but are served here: the caller must be able
+# to view the submission the file belongs to (every upload name starts with its submission
+# id). Single byte ranges, If-None-Match / If-Range and ETag/Cache-Control are handled here;
+# the body goes out via the ASGI zero-copy extension when the server offers it, or via nginx
+# X-Accel-Redirect when MEDIA_ACCEL_REDIRECT_PREFIX is set, otherwise in 256KB reads.
+# With s3 storage the caller is authorized here and then redirected to a short-lived
+# presigned URL, so the bucket (or a CDN in front of it) handles ranges and caching.
+
+MEDIA_SUBMISSION_RE = re.compile(r"^(sub_[0-9a-f]+)_")
+MEDIA_DIGEST_RE = re.compile(r"^([0-9a-f]{64})\.")
+MEDIA_PRIVATE_DIRS = {"partial", "staging"}
+
+optional_security = HTTPBearer(auto_error=False)
+media_bytes_served: dict = {}
+
+def media_email(request: Request, credentials: Optional[HTTPAuthorizationCredentials]) -> str:
+    if credentials:
+        token, expected_type = credentials.credentials, "access"
+    else:
+        token, expected_type = request.cookies.get("media_token"), "media"
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if payload.get("type") != expected_type or not payload.get("sub"):
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return payload["sub"]
+
+def media_key(path: str) -> PurePosixPath:
+    """Storage key for an /uploads path, rejecting traversal and private directories."""
+    key = PurePosixPath(posixpath.normpath("/" + path).lstrip("/"))
+    if not key.parts or key.parts[0] in MEDIA_PRIVATE_DIRS:
+        raise HTTPException(status_code=404, detail="File not found")
+    return key
+
+async def media_submission_id(key: PurePosixPath, email: str) -> str:
+    """The submission a file is served under, after checking the caller may view it."""
+    # HLS renditions live under hls/{video name}/, so the directory carries the submission id
+    match = MEDIA_SUBMISSION_RE.match(key.parts[1] if key.parts[0] == "hls" and len(key.parts) > 2 else key.name)
+    if match:
+        await get_viewable_submission(match.group(1), email, {"_id": 1})
+        return match.group(1)
+
+    match = MEDIA_DIGEST_RE.match(key.name)
+    if match and key.parent.name == "screenshots":
+        blob = await screenshots_col.find_one({"_id": match.group(1)}, {"refs": 1})
+        sub_id = blob and await can_view_any_submission(list(blob.get("refs", {})), email)
+        if sub_id:
+            return sub_id
+    raise HTTPException(status_code=404, detail="File not found")
+
+def media_type_for(full: PurePosixPath) -> str:
+    media_type, encoding = mimetypes.guess_type(full.name)
+    if encoding == "gzip":
+        return "application/gzip"
+    return media_type or "application/octet-stream"
+
+def parse_range(header: Optional[str], size: int) -> Optional[tuple]:
+    """Single "bytes=" range as inclusive (start, end). None means send the whole file."""
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    spec = header[len("bytes="):].strip()
+    try:
+        first, last = spec.split("-", 1)
+        if first:
+            start, end = int(first), int(last) if last else size - 1
+        else:
+            start, end = max(size - int(last), 0), size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    return start, min(end, size - 1)
+
+class MediaFileResponse(Response):
+    chunk_size = 256 * 1024
+
+    def __init__(self, path: Path, start: int, end: int, status_code: int, headers: dict, media_type: str):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.path = path
+        self.start = start
+        self.length = end - start + 1
+        self.headers["content-length"] = str(self.length)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"] == "HEAD" or not self.length:
+            await send({"type": "http.response.body", "body": b""})
+            return
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.path, "rb") as f:
+                await send({"type": "http.response.zerocopysend", "file": f, "offset": self.start, "count": self.length})
+            return
+        remaining = self.length
+        async with aiofiles.open(self.path, "rb") as f:
+            await f.seek(self.start)
+            while remaining:
+                chunk = await f.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining:
+            await send({"type": "http.response.body", "body": b""})
+
+async def send_stored_file(request: Request, key: str, cache_control: str, sub_id: Optional[str] = None,
+                           etag: Optional[str] = None, proxy: bool = False) -> Response:
+    """Respond with a stored object. Bytes sent by the API itself are counted against sub_id.
+
+    With s3 storage, proxy=True sends the body from here instead of redirecting; meant for small
+    objects that API clients fetch with credentials, which a cross-origin redirect would drop.
+    """
+    if storage.presigned:
+        if proxy or key.endswith(".m3u8"):
+            # Playlists reference their renditions and segments by relative URL, so they are sent
+            # from here to keep those requests on /uploads (and authorized) rather than the bucket
+            try:
+                body = await storage.read(key)
+            except FileNotFoundError:
+                raise HTTPException(status_code=404, detail="File not found")
+            if sub_id and request.method == "GET":
+                media_bytes_served[sub_id] = media_bytes_served.get(sub_id, 0) + len(body)
+            return Response(body, headers={"Cache-Control": cache_control}, media_type=media_type_for(PurePosixPath(key)))
+        # The redirect is cached for at most half the URL's lifetime so browsers never follow an expired one
+        max_age = min(MEDIA_CACHE_MAX_AGE_SECONDS, S3_PRESIGN_EXPIRE_SECONDS // 2)
+        return RedirectResponse(storage.presign_get(key), status_code=307, headers={"Cache-Control": f"private, max-age={max_age}"})
+
+    full = storage.root / key
+    if not full.is_file():
+        raise HTTPException(status_code=404, detail="File not found")
+    stat = full.stat()
+    etag = f'"{etag}"' if etag else f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Accept-Ranges": "bytes"}
+    if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    if MEDIA_ACCEL_REDIRECT_PREFIX:
+        # nginx handles Range and sendfile itself
+        accel_path = MEDIA_ACCEL_REDIRECT_PREFIX.rstrip("/") + "/" + key
+        return Response(headers={**headers, "X-Accel-Redirect": accel_path}, media_type=media_type_for(full))
+
+    byte_range = None
+    if request.headers.get("if-range", etag) == etag:
+        byte_range = parse_range(request.headers.get("range"), stat.st_size)
+    if byte_range:
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+        status_code = 206
+    else:
+        start, end, status_code = 0, stat.st_size - 1, 200
+
+    if sub_id and request.method == "GET":
+        media_bytes_served[sub_id] = media_bytes_served.get(sub_id, 0) + end - start + 1
+    return MediaFileResponse(full, start, end, status_code, headers, media_type_for(full))
+
+@app.api_route("/uploads/{path:path}", methods=["GET", "HEAD"])
+async def serve_media(path: str, request: Request, credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)):
+    email = media_email(request, credentials)
+    key = media_key(path)
+    sub_id = await media_submission_id(key, email)
+
+    digest = MEDIA_DIGEST_RE.match(key.name)
+    if digest:
+        # Content-addressed: the name is the hash, so the bytes can never change
+        return await send_stored_file(request, key.as_posix(), "private, max-age=31536000, immutable", sub_id, digest.group(1))
+    return await send_stored_file(request, key.as_posix(), f"private, max-age={MEDIA_CACHE_MAX_AGE_SECONDS}", sub_id)
+
+async def flush_media_bytes():
+    pending = dict(media_bytes_served)
+    media_bytes_served.clear()
+    for sub_id, served in pending.items():
+        await submissions_col.update_one({"_id": sub_id}, {"$inc": {"media_bytes_served": served}})
+
+async def flush_media_bytes_loop():
+    while True:
+        await asyncio.sleep(60)
+        try:
+            await flush_media_bytes()
+        except Exception as e:
+            logger.error("Failed to record media bandwidth: %s", e)
+
+media_flush_task: Optional[asyncio.Task] = None
+
+@app.on_event("startup")
+async def start_media_flush():
+    global media_flush_task
+    media_flush_task = asyncio.create_task(flush_media_bytes_loop())
+
+@app.on_event("shutdown")
+async def stop_media_flush():
+    if media_flush_task:
+        media_flush_task.cancel()
+    await flush_media_bytes()
+
+# --- Storage GC & Usage ---
+#
+# Every STORAGE_GC_INTERVAL_SECONDS one node (holding a lease on the "storage" counters doc)
+# lists the storage backend and checks it, STORAGE_GC_BATCH_SIZE units at a time through
+# indexed $in lookups, against what submissions reference: current video, rrweb and
+# derivative URLs, HLS and rrweb index directories, screenshots in screenshots[] or
+# bug_reports[].screenshot_url (with their thumbnails), clips of the current video, and
+# pending direct uploads. Anything else older than STORAGE_GC_GRACE_HOURS is
+# deleted: replaced videos and their derivatives, screenshots uploaded but never saved,
+# replaced rrweb recordings, stale clips, temp files left by crashes. Drafts created more than
+# STORAGE_GC_DRAFT_IDLE_DAYS ago lose video and rrweb media that is as old: the fields are
+# cleared (only while the submission is still a draft pointing at them) and the files go.
+# The same pass records bytes per submission (submission.storage_usage) and per tester
+# (storage_usage_col), which uploads are checked against when TESTER_STORAGE_QUOTA_MB is set.
+
+STORAGE_COUNTERS_ID = "storage"
+# Managed by the upload sweeper, the storage driver and the rrweb segment sweep respectively
+STORAGE_GC_SKIP_PREFIXES = ("partial/", "staging/", "rrweb/segments/")
+
+def storage_unit(key: str) -> str:
+    """HLS renditions and rrweb indexes are referenced, attributed and deleted as whole directories."""
+    parts = key.split("/")
+    if parts[0] == "hls" and len(parts) > 2:
+        return "/".join(parts[:2])
+    if parts[:2] == ["rrweb", "index"] and len(parts) > 3:
+        return "/".join(parts[:3])
+    return key
+
+def storage_owner(unit: str) -> Optional[str]:
+    match = MEDIA_SUBMISSION_RE.match(PurePosixPath(unit).name)
+    return match.group(1) if match else None
+
+STORAGE_MEDIA_FIELDS = ("video_url", "video_poster_url", "video_preview_url", "video_hls_url", "rrweb_recording_url")
+# Cleared along with a detached field so the submission doesn't report work on a file that is gone
+STORAGE_MEDIA_COMPANIONS = {
+    "video_url": ("video_transcode", "video_derivatives_status"),
+    "rrweb_recording_url": ("rrweb_compaction",),
+}
+
+def submission_storage_units(doc: dict, draft_cutoff: Optional[datetime]):
+    """Yields (unit, field, value, idle) for every stored unit a submission references. idle marks
+    video and rrweb media of a draft older than draft_cutoff, which the pass may detach."""
+    idle = bool(draft_cutoff) and doc.get("status") == "draft" and doc.get("created_at", "") < draft_cutoff.isoformat()
+
+    def units(url):
+        if not isinstance(url, str) or not url.startswith("/uploads/"):
+            return
+        key = upload_key(url)
+        yield storage_unit(key)
+        digest = MEDIA_DIGEST_RE.match(PurePosixPath(key).name)
+        if digest:
+            yield f"screenshots/{digest.group(1)}.thumb.webp"
+
+    for field in STORAGE_MEDIA_FIELDS:
+        for unit in units(doc.get(field)):
+            yield unit, field, doc[field], idle
+    index_key = (doc.get("rrweb_index") or {}).get("key")
+    if index_key:
+        yield rrweb_index_prefix(index_key), "rrweb_index.key", index_key, idle
+    for url in doc.get("screenshots") or []:
+        for unit in units(url):
+            yield unit, "screenshots", url, False
+    for bug in doc.get("bug_reports") or []:
+        if isinstance(bug, dict):
+            for unit in units(bug.get("screenshot_url")):
+                yield unit, "bug_reports.screenshot_url", bug["screenshot_url"], False
+
+async def storage_unit_batches():
+    """Groups storage.scan() into dicts of up to STORAGE_GC_BATCH_SIZE units (unit -> objects). The
+    listing keeps a directory's objects together, so a unit is complete once the next one starts."""
+    batch: dict = {}
+    async for page in storage.scan():
+        for obj in page:
+            if obj["key"].startswith(STORAGE_GC_SKIP_PREFIXES):
+                continue
+            unit = storage_unit(obj["key"])
+            if unit not in batch and len(batch) >= STORAGE_GC_BATCH_SIZE:
+                yield batch
+                batch = {}
+            batch.setdefault(unit, []).append(obj)
+    if batch:
+        yield batch
+
+async def referenced_storage_units(units, cutoff: datetime, draft_cutoff: Optional[datetime] = None) -> tuple:
+    """Checks one batch of units against the database with indexed $in lookups. Returns (unit -> ids
+    of the submissions referencing it, units still in their grace period, unit -> (submission id,
+    field, value) for media held only by idle drafts)."""
+    refs: dict = {}
+    protected: set = set()
+    idle: dict = {}
+    urls, index_keys, clip_urls, digests = [], [], [], []
+    for unit in units:
+        parts = unit.split("/")
+        if parts[0] == "hls" and len(parts) == 2:
+            urls.append(f"/uploads/{unit}/master.m3u8")
+        elif parts[:2] == ["rrweb", "index"] and len(parts) == 3:
+            index_keys.append(parts[2])
+        else:
+            urls.append(f"/uploads/{unit}")
+        if parts[0] == "clips":
+            clip_urls.append(f"/uploads/{unit}")
+        digest = MEDIA_DIGEST_RE.match(parts[-1])
+        if parts[0] == "screenshots" and digest:
+            digests.append(digest.group(1))
+
+    # A thumbnail is referenced through its screenshot. A dedup hit reuses an old file without
+    # rewriting it, so recent uploads are protected by date
+    async for blob in screenshots_col.find({"_id": {"$in": digests}}, {"filename": 1, "last_uploaded_at": 1}):
+        urls.append(f"/uploads/screenshots/{blob['filename']}")
+        if blob.get("last_uploaded_at") and blob["last_uploaded_at"] >= cutoff:
+            protected.update({f"screenshots/{blob['filename']}", f"screenshots/{blob['_id']}.thumb.webp"})
+
+    projection = {
+        "status": 1, "created_at": 1, **{field: 1 for field in STORAGE_MEDIA_FIELDS},
+        "rrweb_index.key": 1, "screenshots": 1, "bug_reports.screenshot_url": 1,
     }
+    query = {"$or": [
+        *({field: {"$in": urls}} for field in (*STORAGE_MEDIA_FIELDS, "screenshots", "bug_reports.screenshot_url")),
+        {"rrweb_index.key": {"$in": index_keys}},
+    ]}
+    async for doc in submissions_col.find(query, projection):
+        for unit, field, value, held_idle in submission_storage_units(doc, draft_cutoff):
+            if unit not in units:
+                continue
+            if held_idle:
+                idle.setdefault(unit, (doc["_id"], field, value))
+            else:
+                refs.setdefault(unit, set()).add(doc["_id"])
+
+    # Clips are kept while they belong to the submission's current video (an idle draft's go
+    # the pass after its video is detached)
+    clips = await clips_col.find({"clip_url": {"$in": clip_urls}}, {"submission_id": 1, "video_url": 1, "clip_url": 1}).to_list(None)
+    if clips:
+        current = {
+            sub["_id"]: sub.get("video_url")
+            async for sub in submissions_col.find({"_id": {"$in": list({c["submission_id"] for c in clips})}}, {"video_url": 1})
+        }
+        for clip in clips:
+            if current.get(clip["submission_id"]) == clip["video_url"]:
+                refs.setdefault(upload_key(clip["clip_url"]), set()).add(clip["submission_id"])
+
+    async for upload in direct_uploads_col.find({"status": "pending", "key": {"$in": list(units)}}, {"key": 1}):
+        protected.add(upload["key"])
+    return refs, protected, {unit: held for unit, held in idle.items() if unit not in refs}
+
+async def prune_stale_clips(cutoff: datetime):
+    """Drop clip records past the grace period whose submission has moved on to another video."""
+    cursor = clips_col.find({"created_at": {"$lt": cutoff.isoformat()}}, {"submission_id": 1, "video_url": 1})
+    while batch := await cursor.to_list(STORAGE_GC_BATCH_SIZE):
+        current = {
+            sub["_id"]: sub.get("video_url")
+            async for sub in submissions_col.find({"_id": {"$in": list({c["submission_id"] for c in batch})}}, {"video_url": 1})
+        }
+        stale = [clip["_id"] for clip in batch if current.get(clip["submission_id"]) != clip["video_url"]]
+        if stale:
+            await clips_col.delete_many({"_id": {"$in": stale}})
+
+async def detach_idle_draft_media(sub_id: str, field: str, value) -> bool:
+    """Clear an idle draft's reference to media about to be deleted. False if the draft moved on meanwhile."""
+    base = field.split(".")[0]
+    unset = {base: "", **{companion: "" for companion in STORAGE_MEDIA_COMPANIONS.get(base, ())}}
+    result = await submissions_col.update_one({"_id": sub_id, "status": "draft", field: value}, {"$unset": unset})
+    return bool(result.modified_count)
+
+async def delete_storage_unit(unit: str, single_key: bool):
+    if single_key:
+        await storage.delete(unit)
+    else:
+        await storage.delete_prefix(unit)
+    digest = MEDIA_DIGEST_RE.match(PurePosixPath(unit).name)
+    if digest and unit.startswith("screenshots/") and not unit.endswith(".thumb.webp"):
+        await screenshots_col.delete_one({"_id": digest.group(1)})
+        await submissions_col.update_many(
+            {f"screenshot_thumbnails.{digest.group(1)}": {"$exists": True}},
+            {"$unset": {f"screenshot_thumbnails.{digest.group(1)}": ""}},
+        )
+
+async def collect_storage_garbage() -> dict:
+    now = datetime.utcnow()
+    cutoff = now - timedelta(hours=STORAGE_GC_GRACE_HOURS)
+    draft_cutoff = now - timedelta(days=STORAGE_GC_DRAFT_IDLE_DAYS) if STORAGE_GC_DRAFT_IDLE_DAYS else None
+    if not STORAGE_GC_DRY_RUN:
+        await prune_stale_clips(cutoff)
+
+    stats = {"files": 0, "bytes": 0, "orphaned_files": 0, "orphaned_bytes": 0, "deleted_files": 0, "deleted_bytes": 0}
+    usage: dict = {}
+    async for units in storage_unit_batches():
+        refs, protected, idle = await referenced_storage_units(units, cutoff, draft_cutoff)
+        for unit, objects in units.items():
+            size = sum(obj["size"] for obj in objects)
+            stats["files"] += len(objects)
+            stats["bytes"] += size
+            owners = refs.get(unit)
+            if owners is None and unit in idle:
+                sub_id, field, value = idle[unit]
+                newest = max(obj["modified"] for obj in objects)
+                if unit in protected or newest >= min(cutoff, draft_cutoff):
+                    owners = {sub_id}
+                elif STORAGE_GC_DRY_RUN:
+                    logger.info("Storage GC (dry run) would delete %s of idle draft %s (%d bytes)", unit, sub_id, size)
+                    stats["orphaned_files"] += len(objects)
+                    stats["orphaned_bytes"] += size
+                    continue
+                elif await detach_idle_draft_media(sub_id, field, value):
+                    await delete_storage_unit(unit, len(objects) == 1 and objects[0]["key"] == unit)
+                    stats["orphaned_files"] += len(objects)
+                    stats["orphaned_bytes"] += size
+                    stats["deleted_files"] += len(objects)
+                    stats["deleted_bytes"] += size
+                    continue
+                else:
+                    owners = {sub_id}
+            if owners is None:
+                stats["orphaned_files"] += len(objects)
+                stats["orphaned_bytes"] += size
+                deletable = unit not in protected and max(obj["modified"] for obj in objects) < cutoff
+                if deletable:
+                    if STORAGE_GC_DRY_RUN:
+                        logger.info("Storage GC (dry run) would delete %s (%d bytes)", unit, size)
+                    else:
+                        await delete_storage_unit(unit, len(objects) == 1 and objects[0]["key"] == unit)
+                        stats["deleted_files"] += len(objects)
+                        stats["deleted_bytes"] += size
+                    continue
+                # Still in its grace period: counts against the submission named in it
+                owner = storage_owner(unit)
+                owners = {owner} if owner else set()
+            for sub_id in owners:
+                entry = usage.setdefault(sub_id, {"bytes": 0, "files": 0})
+                entry["bytes"] += size
+                entry["files"] += len(objects)
+
+    # Only submissions holding files are in usage; the rest are reset if the last pass counted some
+    async for doc in submissions_col.find({"storage_usage.files": {"$gt": 0}}, {"_id": 1}):
+        usage.setdefault(doc["_id"], {"bytes": 0, "files": 0})
+    testers: dict = {}
+    sub_ids = list(usage)
+    for start in range(0, len(sub_ids), STORAGE_GC_BATCH_SIZE):
+        chunk = sub_ids[start:start + STORAGE_GC_BATCH_SIZE]
+        async for doc in submissions_col.find({"_id": {"$in": chunk}}, {"tester_email": 1, "storage_usage": 1}):
+            entry = usage[doc["_id"]]
+            if doc.get("storage_usage") != entry:
+                await submissions_col.update_one({"_id": doc["_id"]}, {"$set": {"storage_usage": entry}})
+            if doc.get("tester_email"):
+                total = testers.setdefault(doc["tester_email"], {"bytes": 0, "files": 0, "submissions": 0})
+                total["bytes"] += entry["bytes"]
+                total["files"] += entry["files"]
+                total["submissions"] += 1 if entry["files"] else 0
+    async for doc in storage_usage_col.find({"files": {"$gt": 0}}, {"_id": 1}):
+        testers.setdefault(doc["_id"], {"bytes": 0, "files": 0, "submissions": 0})
+    for email, total in testers.items():
+        await storage_usage_col.update_one({"_id": email}, {"$set": {**total, "measured_at": now.isoformat()}}, upsert=True)
+
+    await counters_col.update_one(
+        {"_id": STORAGE_COUNTERS_ID},
+        {"$set": {**stats, "dry_run": STORAGE_GC_DRY_RUN, "collected_at": now.isoformat()}},
+    )
+    return stats
+
+def sweep_rrweb_segment_dirs(cutoff: datetime) -> int:
+    """Remove incremental rrweb segments (node-local) that have not been appended to within the grace period."""
+    root = Path(UPLOAD_DIR) / "rrweb" / "segments"
+    removed = 0
+    if not root.is_dir():
+        return removed
+    for seg_dir in root.iterdir():
+        try:
+            newest = max((p.stat().st_mtime for p in seg_dir.iterdir()), default=seg_dir.stat().st_mtime)
+        except FileNotFoundError:
+            continue  # finalized meanwhile
+        if datetime.utcfromtimestamp(newest) < cutoff:
+            shutil.rmtree(seg_dir, ignore_errors=True)
+            removed += 1
+    return removed
+
+STORAGE_GC_LEASE_SECONDS = max(STORAGE_GC_INTERVAL_SECONDS // 2, 60)
+
+async def claim_storage_gc_lease() -> Optional[str]:
+    """Returns the lease token, or None while another node holds the lease."""
+    now = datetime.utcnow()
+    token = uuid.uuid4().hex
+    try:
+        await counters_col.find_one_and_update(
+            {"_id": STORAGE_COUNTERS_ID, "$or": [{"gc_lease_until": {"$lt": now}}, {"gc_lease_until": {"$exists": False}}]},
+            {"$set": {"gc_lease_until": now + timedelta(seconds=STORAGE_GC_LEASE_SECONDS), "gc_lease_owner": token}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        # Another node holds the lease
+        return None
+    return token
+
+async def renew_storage_gc_lease(token: str):
+    """Extend the lease for as long as the pass runs, so a slow scan never overlaps another node's."""
+    while True:
+        await asyncio.sleep(STORAGE_GC_LEASE_SECONDS / 3)
+        result = await counters_col.update_one(
+            {"_id": STORAGE_COUNTERS_ID, "gc_lease_owner": token},
+            {"$set": {"gc_lease_until": datetime.utcnow() + timedelta(seconds=STORAGE_GC_LEASE_SECONDS)}},
+        )
+        if not result.matched_count:
+            logger.warning("Storage GC lease was lost during a pass")
+            return
+
+async def storage_gc_loop():
+    while True:
+        try:
+            cutoff = datetime.utcnow() - timedelta(hours=STORAGE_GC_GRACE_HOURS)
+            removed = await asyncio.get_running_loop().run_in_executor(None, sweep_rrweb_segment_dirs, cutoff)
+            if removed:
+                logger.info("Removed %d abandoned rrweb segment directories", removed)
+            token = await claim_storage_gc_lease()
+            if token:
+                renewer = asyncio.create_task(renew_storage_gc_lease(token))
+                try:
+                    stats = await collect_storage_garbage()
+                finally:
+                    renewer.cancel()
+                logger.info("Storage GC: %d files, %d bytes, deleted %d files (%d bytes)",
+                            stats["files"], stats["bytes"], stats["deleted_files"], stats["deleted_bytes"])
+        except Exception as e:
+            logger.error("Storage GC failed: %r", e)
+        await asyncio.sleep(STORAGE_GC_INTERVAL_SECONDS)
+
+storage_gc_task: Optional[asyncio.Task] = None
 
-app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
+@app.on_event("startup")
+async def start_storage_gc():
+    global storage_gc_task
+    storage_gc_task = asyncio.create_task(storage_gc_loop())
+
+@app.on_event("shutdown")
+async def stop_storage_gc():
+    if storage_gc_task:
+        storage_gc_task.cancel()
+
+async def check_storage_quota(email: str, incoming: int = 0):
+    """Reject an upload once the tester's measured usage (as of the last GC pass) would exceed the quota."""
+    if not TESTER_STORAGE_QUOTA_MB:
+        return
+    usage = await storage_usage_col.find_one({"_id": email}, {"bytes": 1})
+    if (usage or {}).get("bytes", 0) + incoming > TESTER_STORAGE_QUOTA_MB * 1024 * 1024:
+        raise HTTPException(status_code=400, detail=f"Storage quota exceeded (max {TESTER_STORAGE_QUOTA_MB}MB)")
+
+@app.get("/api/storage/usage")
+async def get_storage_usage(email: str = Depends(verify_token)):
+    usage = await storage_usage_col.find_one({"_id": email}) or {}
+    cursor = submissions_col.find(
+        {"tester_email": email, "storage_usage.bytes": {"$gt": 0}},
+        {"job_title": 1, "status": 1, "storage_usage": 1},
+    ).sort("storage_usage.bytes", -1)
+    return {
+        "bytes": usage.get("bytes", 0),
+        "files": usage.get("files", 0),
+        "quota_bytes": TESTER_STORAGE_QUOTA_MB * 1024 * 1024 or None,
+        "measured_at": usage.get("measured_at"),
+        "submissions": [doc_to_dict(doc) async for doc in cursor],
+    }
 
 if __name__ == "__main__":
     import uvicorn
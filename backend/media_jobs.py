@@ -0,0 +1,184 @@
+"""CPU-heavy media work, run off the event loop: derivatives on the API's process pool,
+HLS transcodes on their own bounded pool.
+
+Everything here is a plain function of file paths so it can be pickled by reference and
+executed in a spawned worker without importing the web app. Video sources may also be
+URLs (presigned object storage GETs), which ffmpeg and ffprobe read with range requests.
+"""
+import json
+import os
+import shutil
+import subprocess
+from pathlib import Path
+from urllib.parse import urlparse
+
+
+def _replace_from_tmp(tmp: Path, dst: Path):
+    os.replace(tmp, dst)
+    return dst.stat().st_size
+
+
+def image_thumbnail(src: str, dst: str, max_px: int, quality: int = 80) -> dict:
+    """Downscale an image to fit max_px x max_px and write it as WebP."""
+    from PIL import Image, ImageOps  # Pillow is only needed in the worker
+
+    dst_path = Path(dst)
+    tmp = dst_path.with_name(f".{dst_path.name}.tmp")
+    with Image.open(src) as im:
+        im = ImageOps.exif_transpose(im)
+        im.thumbnail((max_px, max_px))
+        if im.mode not in ("RGB", "RGBA"):
+            im = im.convert("RGBA")
+        im.save(tmp, "WEBP", quality=quality, method=4)
+        width, height = im.size
+    return {"width": width, "height": height, "bytes": _replace_from_tmp(tmp, dst_path)}
+
+
+def run_ffmpeg(ffmpeg: str, args: list, timeout: float):
+    proc = subprocess.run(
+        [ffmpeg, "-hide_banner", "-loglevel", "error", "-y", *args],
+        capture_output=True, timeout=timeout,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.decode("utf-8", "replace").strip()[-500:] or f"ffmpeg exited {proc.returncode}")
+
+
+def video_poster(ffmpeg: str, src: str, dst: str, width: int, at_seconds: float = 1.0, timeout: float = 120) -> dict:
+    """Grab one frame (falling back to the first frame for very short clips) as a WebP poster."""
+    dst_path = Path(dst)
+    tmp = dst_path.with_name(f".{dst_path.name}.tmp.webp")
+    scale = f"scale={width}:-2"
+    try:
+        run_ffmpeg(ffmpeg, ["-ss", str(at_seconds), "-i", src, "-frames:v", "1", "-vf", scale, "-c:v", "libwebp", str(tmp)], timeout)
+        if not tmp.exists() or not tmp.stat().st_size:
+            raise RuntimeError("no frame at offset")
+    except RuntimeError:
+        run_ffmpeg(ffmpeg, ["-i", src, "-frames:v", "1", "-vf", scale, "-c:v", "libwebp", str(tmp)], timeout)
+    return {"bytes": _replace_from_tmp(tmp, dst_path)}
+
+
+def video_preview(ffmpeg: str, src: str, dst: str, height: int, seconds: int, timeout: float = 600) -> dict:
+    """Short, muted, low-resolution H.264 clip with the moov atom up front for instant start."""
+    dst_path = Path(dst)
+    tmp = dst_path.with_name(f".{dst_path.name}.tmp.mp4")
+    run_ffmpeg(ffmpeg, [
+        "-i", src, "-t", str(seconds), "-an",
+        "-vf", f"scale=-2:{height}", "-c:v", "libx264", "-preset", "veryfast", "-crf", "30",
+        "-pix_fmt", "yuv420p", "-movflags", "+faststart", str(tmp),
+    ], timeout)
+    return {"bytes": _replace_from_tmp(tmp, dst_path)}
+
+
+def probe_video(ffprobe: str, src: str, timeout: float = 60) -> dict:
+    """Height of the first video stream and whether there is an audio stream."""
+    proc = subprocess.run(
+        [ffprobe, "-v", "error", "-show_entries", "stream=codec_type,height", "-of", "json", src],
+        capture_output=True, timeout=timeout,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.decode("utf-8", "replace").strip()[-500:] or f"ffprobe exited {proc.returncode}")
+    streams = json.loads(proc.stdout or b"{}").get("streams", [])
+    video = [s for s in streams if s.get("codec_type") == "video"]
+    if not video:
+        raise RuntimeError("no video stream")
+    return {
+        "height": video[0].get("height") or 0,
+        "has_audio": any(s.get("codec_type") == "audio" for s in streams),
+    }
+
+
+def hls_ladder(ffmpeg: str, ffprobe: str, src: str, out_dir: str, ladder: list, segment_seconds: int, timeout: float) -> list:
+    """Transcode src into a VOD HLS ladder under out_dir (master.m3u8 + one dir per rendition).
+
+    ladder is [(height, video_kbps), ...]; rungs taller than the source are skipped, but
+    at least the smallest rung is always produced. Returns the renditions written.
+    """
+    info = probe_video(ffprobe, src)
+    rungs = [r for r in ladder if r[0] <= info["height"]] or [min(ladder)]
+
+    out = Path(out_dir)
+    tmp = out.with_name(f".{out.name}.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    n = len(rungs)
+    split = f"[0:v]split={n}" + "".join(f"[v{i}]" for i in range(n))
+    scales = ";".join(f"[v{i}]scale=-2:{h}[v{i}o]" for i, (h, _) in enumerate(rungs))
+    args = ["-i", src, "-filter_complex", f"{split};{scales}"]
+    stream_map = []
+    for i, (height, kbps) in enumerate(rungs):
+        args += [
+            "-map", f"[v{i}o]", f"-c:v:{i}", "libx264", f"-b:v:{i}", f"{kbps}k",
+            f"-maxrate:v:{i}", f"{int(kbps * 1.07)}k", f"-bufsize:v:{i}", f"{kbps * 2}k",
+        ]
+        if info["has_audio"]:
+            args += ["-map", "a:0", f"-c:a:{i}", "aac", f"-b:a:{i}", "128k" if height >= 720 else "96k"]
+            stream_map.append(f"v:{i},a:{i},name:{height}p")
+        else:
+            stream_map.append(f"v:{i},name:{height}p")
+    # Fixed keyframe interval so every rendition cuts segments at the same instants
+    args += [
+        "-preset", "veryfast", "-pix_fmt", "yuv420p", "-sc_threshold", "0",
+        "-force_key_frames", f"expr:gte(t,n_forced*{segment_seconds})",
+        "-f", "hls", "-hls_time", str(segment_seconds), "-hls_playlist_type", "vod",
+        "-hls_flags", "independent_segments",
+        "-hls_segment_filename", str(tmp / "%v" / "seg_%04d.ts"),
+        "-master_pl_name", "master.m3u8",
+        "-var_stream_map", " ".join(stream_map),
+        str(tmp / "%v" / "index.m3u8"),
+    ]
+    try:
+        run_ffmpeg(ffmpeg, args, timeout)
+        shutil.rmtree(out, ignore_errors=True)
+        os.replace(tmp, out)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return [{"height": h, "video_kbps": kbps} for h, kbps in rungs]
+
+
+def keyframe_before(ffprobe: str, src: str, t: float, lookback: float = 30, timeout: float = 60) -> float:
+    """Timestamp of the last video keyframe at or before t (0.0 if none is found in the lookback window)."""
+    proc = subprocess.run(
+        [ffprobe, "-v", "error", "-select_streams", "v:0", "-read_intervals", f"{max(t - lookback, 0)}%{t + 0.001}",
+         "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", src],
+        capture_output=True, timeout=timeout,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.decode("utf-8", "replace").strip()[-500:] or f"ffprobe exited {proc.returncode}")
+    best = 0.0
+    for line in proc.stdout.decode().splitlines():
+        pts, _, flags = line.partition(",")
+        try:
+            ts = float(pts)
+        except ValueError:
+            continue
+        if "K" in flags and best <= ts <= t:
+            best = ts
+    return best
+
+
+def extract_clip(ffmpeg: str, ffprobe: str, src: str, dst_stem: str, start: float, end: float,
+                 keyframe_tolerance: float, timeout: float) -> dict:
+    """Cut [start, end) from src.
+
+    If a keyframe sits within keyframe_tolerance before start, the clip is a stream copy from
+    that keyframe in the source container (fast, lossless). Otherwise the range is
+    re-encoded to H.264/AAC MP4 so it starts exactly at start. Returns the file written.
+    """
+    src_ext = Path(urlparse(src).path).suffix.lower()
+    keyframe = keyframe_before(ffprobe, src, start)
+    if start - keyframe <= keyframe_tolerance:
+        mode, ext = "copy", src_ext or ".mp4"
+        args = ["-ss", f"{keyframe:.3f}", "-i", src, "-t", f"{end - keyframe:.3f}", "-map", "0", "-c", "copy",
+                "-avoid_negative_ts", "make_zero"]
+    else:
+        mode, ext = "reencode", ".mp4"
+        args = ["-ss", f"{start:.3f}", "-i", src, "-t", f"{end - start:.3f}",
+                "-c:v", "libx264", "-preset", "veryfast", "-crf", "23", "-pix_fmt", "yuv420p", "-c:a", "aac"]
+    if ext in (".mp4", ".mov"):
+        args += ["-movflags", "+faststart"]
+
+    dst = Path(f"{dst_stem}{ext}")
+    tmp = dst.with_name(f".{dst.name}.tmp{ext}")
+    run_ffmpeg(ffmpeg, [*args, str(tmp)], timeout)
+    return {"filename": dst.name, "mode": mode, "bytes": _replace_from_tmp(tmp, dst), "keyframe": keyframe}
@@ -0,0 +1,31 @@
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# main reads its configuration at import time
+os.environ.setdefault("UPLOAD_DIR", tempfile.mkdtemp(prefix="peertesthub-test-uploads-"))
+os.environ.setdefault("PAYMENTS_BACKEND", "fake")
+os.environ.setdefault("EMAIL_BACKEND", "stub")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import main
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """Point every *_col in main at a fresh in-memory database."""
+    mdb = AsyncMongoMockClient()["peertesthub_test"]
+    monkeypatch.setattr(main, "db", mdb)
+    for name in list(vars(main)):
+        if name.endswith("_col"):
+            monkeypatch.setattr(main, name, getattr(mdb, name[: -len("_col")]))
+    return mdb
+
+
+def run(coro):
+    return asyncio.run(coro)
@@ -0,0 +1,56 @@
+import pytest
+
+import main
+from conftest import run
+
+BID = "bid_1"
+JOB = "job_1"
+
+
+@pytest.fixture
+def paid_bid(db, monkeypatch):
+    monkeypatch.setattr(main, "transactions_supported", False)
+    job = {
+        "_id": JOB, "version": 2, "title": "Checkout", "project_id": "proj_1", "builder_email": "builder@example.com",
+        "status": "open", "assignment_type": "per_job", "assigned_testers": [], "submissions": [],
+        "roles": [{"id": "role_1", "items": [
+            {"id": "item_1", "service_type": "test", "proposed_price": 20},
+            {"id": "item_2", "service_type": "record", "proposed_price": 30},
+        ]}],
+    }
+    bid = {
+        "_id": BID, "job_id": JOB, "tester_email": "tester@example.com", "tester_name": "Tess Ter",
+        "scope_type": "per_job", "bid_price": 50, "status": "accepted", "payment_status": "pending",
+    }
+    run(main.jobs_col.insert_one(job))
+    run(main.bids_col.insert_one(bid))
+    return bid, job
+
+
+def test_submission_ids_are_derived_from_bid_and_item(paid_bid):
+    sub_ids, fulfilled_now = run(main.fulfill_bid_payment(*paid_bid))
+    assert fulfilled_now
+    assert sub_ids == [main.bid_submission_id(BID, "item_1"), main.bid_submission_id(BID, "item_2")]
+    assert all(sub_id.startswith("sub_") for sub_id in sub_ids)
+    assert main.bid_submission_id(BID, "item_1") != main.bid_submission_id("bid_2", "item_1")
+
+
+def test_fulfilling_twice_creates_nothing_more(paid_bid):
+    first, _ = run(main.fulfill_bid_payment(*paid_bid))
+    again, fulfilled_now = run(main.fulfill_bid_payment(*paid_bid))
+    assert not fulfilled_now
+    assert sorted(again) == sorted(first)
+    assert run(main.submissions_col.count_documents({"bid_id": BID})) == 2
+    job = run(main.jobs_col.find_one({"_id": JOB}))
+    assert sorted(job["submissions"]) == sorted(first)
+    assert job["status"] == "in_progress"
+
+
+def test_an_interrupted_attempt_is_completed_without_duplicates(paid_bid):
+    # A crash after the first insert leaves one row and the bid unmarked
+    run(main.submissions_col.insert_one({"_id": main.bid_submission_id(BID, "item_1"), "bid_id": BID}))
+    sub_ids, fulfilled_now = run(main.fulfill_bid_payment(*paid_bid))
+    assert fulfilled_now
+    assert run(main.submissions_col.count_documents({"bid_id": BID})) == 2
+    assert run(main.bids_col.find_one({"_id": BID}))["submissions_created"] is True
+    assert len(sub_ids) == 2
@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import main
+from conftest import run
+
+JOB = "job_1"
+
+
+async def _tester(email):
+    return {"email": email, "role": "tester", "first_name": "Tess", "last_name": email.split("@")[0]}
+
+
+@pytest.fixture
+def open_job(db, monkeypatch):
+    monkeypatch.setattr(main, "get_user_or_404", _tester)
+    run(main.jobs_col.insert_one({
+        "_id": JOB, "title": "Checkout", "project_id": "proj_1", "builder_email": "builder@example.com",
+        "status": "open", "payout_amount": 10, "max_testers": 2, "assigned_testers": [], "submissions": [],
+    }))
+    return JOB
+
+
+async def claim_all(emails):
+    return await asyncio.gather(*(main.claim_job(JOB, email) for email in emails), return_exceptions=True)
+
+
+def test_racing_testers_never_overbook_the_job(open_job):
+    results = run(claim_all([f"tester{i}@example.com" for i in range(6)]))
+
+    claimed = [r for r in results if isinstance(r, dict)]
+    refused = [r for r in results if isinstance(r, HTTPException)]
+    assert len(claimed) == 2 and len(refused) == 4
+    assert {r.detail for r in refused} == {"Job has reached maximum testers"}
+    job = run(main.jobs_col.find_one({"_id": JOB}))
+    assert len(job["assigned_testers"]) == 2
+    assert sorted(job["submissions"]) == sorted(r["submission_id"] for r in claimed)
+    assert run(main.submissions_col.count_documents({"job_id": JOB})) == 2
+
+
+def test_one_tester_claiming_twice_gets_one_slot(open_job):
+    results = run(claim_all(["tester@example.com"] * 3))
+
+    assert sum(isinstance(r, dict) for r in results) == 1
+    assert {r.detail for r in results if isinstance(r, HTTPException)} == {"You already claimed this job"}
+    assert run(main.jobs_col.find_one({"_id": JOB}))["assigned_testers"] == ["tester@example.com"]
+
+
+def test_a_failed_insert_gives_the_slot_back(open_job, monkeypatch):
+    async def fail(doc):
+        raise RuntimeError("insert failed")
+    monkeypatch.setattr(main.submissions_col, "insert_one", fail)
+
+    with pytest.raises(RuntimeError):
+        run(main.claim_job(JOB, "tester@example.com"))
+    job = run(main.jobs_col.find_one({"_id": JOB}))
+    assert job["assigned_testers"] == [] and job["submissions"] == []
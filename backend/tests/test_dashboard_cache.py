@@ -0,0 +1,32 @@
+import main
+from conftest import run
+
+BUILDER = "builder@example.com"
+TESTER = "tester@example.com"
+
+
+async def _tester(email):
+    return {"email": email, "role": "tester", "first_name": "Tess", "last_name": "Ter"}
+
+
+def test_claiming_a_job_drops_both_dashboards(db, monkeypatch):
+    monkeypatch.setattr(main, "get_user_or_404", _tester)
+    run(main.jobs_col.insert_one({
+        "_id": "job_1", "title": "Checkout", "project_id": "proj_1", "builder_email": BUILDER, "status": "open",
+        "payout_amount": 10, "max_testers": 2, "assigned_testers": [], "submissions": [],
+    }))
+    for email in (BUILDER, TESTER):
+        main.dashboard_cache.set(email, {"stale": True})
+
+    run(main.claim_job("job_1", TESTER))
+
+    assert main.dashboard_cache.get(BUILDER) is None
+    assert main.dashboard_cache.get(TESTER) is None
+
+
+def test_a_job_status_change_drops_the_builders_dashboard(db):
+    run(main.jobs_col.insert_one({"_id": "job_1", "builder_email": BUILDER, "status": "pending_payment"}))
+    main.dashboard_cache.set(BUILDER, {"stale": True})
+
+    assert run(main.transition_job_status("job_1", ["pending_payment"], "open"))
+    assert main.dashboard_cache.get(BUILDER) is None
@@ -0,0 +1,29 @@
+import pytest
+from fastapi import HTTPException
+
+import main
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    # An end past the file is clamped to its last byte
+    ("bytes=990-2000", (990, 999)),
+])
+def test_single_ranges_resolve_to_inclusive_offsets(header, expected):
+    assert main.parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", [None, "", "items=0-9", "bytes=0-9,20-29", "bytes=a-b", "bytes=-"])
+def test_unsupported_or_malformed_ranges_send_the_whole_file(header):
+    assert main.parse_range(header, 1000) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=500-400", "bytes=-0"])
+def test_unsatisfiable_ranges_are_416_with_the_size(header):
+    with pytest.raises(HTTPException) as e:
+        main.parse_range(header, 1000)
+    assert e.value.status_code == 416
+    assert e.value.headers["Content-Range"] == "bytes */1000"
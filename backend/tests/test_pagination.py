@@ -0,0 +1,42 @@
+import base64
+import json
+
+import pytest
+from fastapi import HTTPException, Response
+
+import main
+from conftest import run
+
+
+def test_cursor_round_trips():
+    doc = {"_id": "job_2", "created_at": "2026-01-02T00:00:00"}
+    assert main.decode_cursor(main.encode_cursor(doc)) == ("2026-01-02T00:00:00", "job_2")
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    base64.urlsafe_b64encode(b"not json").decode(),
+    base64.urlsafe_b64encode(json.dumps(["only one"]).encode()).decode(),
+    # An operator expression must never reach the query
+    base64.urlsafe_b64encode(json.dumps([{"$gt": ""}, "job_1"]).encode()).decode(),
+])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(HTTPException) as e:
+        main.decode_cursor(cursor)
+    assert e.value.status_code == 400
+
+
+def test_pages_cover_every_row_once_across_equal_timestamps(db):
+    run(main.jobs_col.insert_many([
+        {"_id": f"job_{i}", "builder_email": "b@example.com", "created_at": f"2026-01-0{1 + i // 2}T00:00:00"}
+        for i in range(5)
+    ]))
+    seen, cursor = [], None
+    while True:
+        response = Response()
+        page = run(main.find_page(main.jobs_col, {"builder_email": "b@example.com"}, response, 2, cursor))
+        seen += [doc["_id"] for doc in page]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert seen == ["job_4", "job_3", "job_2", "job_1", "job_0"]
@@ -0,0 +1,40 @@
+import pytest
+from fastapi import HTTPException
+
+import main
+
+
+def test_overlapping_and_adjacent_ranges_merge():
+    assert main.merge_ranges([(10, 20), (0, 5), (5, 8), (15, 30), (40, 50)]) == [[0, 8], [10, 30], [40, 50]]
+
+
+def test_out_of_order_chunks_merge_into_the_whole_file():
+    assert main.merge_ranges([(4, 8), (0, 4), (8, 10)]) == [[0, 10]]
+    assert main.merge_ranges([]) == []
+
+
+def test_content_range_is_returned_half_open():
+    assert main.parse_content_range("bytes 0-99/1000", 1000) == (0, 100)
+    assert main.parse_content_range("bytes 900-999/1000", 1000) == (900, 1000)
+
+
+@pytest.mark.parametrize("header", [None, "bytes 0-99", "items 0-99/1000", "bytes a-b/1000", "bytes -1-10/1000", "bytes 0-99/999"])
+def test_malformed_content_range_is_a_bad_request(header):
+    with pytest.raises(HTTPException) as e:
+        main.parse_content_range(header, 1000)
+    assert e.value.status_code == 400
+
+
+@pytest.mark.parametrize("header", ["bytes 0-1000/1000", "bytes 50-10/1000"])
+def test_content_range_outside_the_upload_is_unsatisfiable(header):
+    with pytest.raises(HTTPException) as e:
+        main.parse_content_range(header, 1000)
+    assert e.value.status_code == 416
+
+
+def test_chunks_over_the_limit_are_refused(monkeypatch):
+    monkeypatch.setattr(main, "VIDEO_CHUNK_MAX_SIZE", 10)
+    assert main.parse_content_range("bytes 0-9/100", 100) == (0, 10)
+    with pytest.raises(HTTPException) as e:
+        main.parse_content_range("bytes 0-10/100", 100)
+    assert e.value.status_code == 400
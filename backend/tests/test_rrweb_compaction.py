@@ -0,0 +1,88 @@
+import gzip
+import json
+
+import main
+
+META, FULL, INCR = main.RRWEB_META, main.RRWEB_FULL_SNAPSHOT, main.RRWEB_INCREMENTAL
+
+
+def mousemove(ts, x, node=1):
+    return {"type": INCR, "timestamp": ts, "data": {"source": 1, "id": node, "positions": [{"x": x, "y": 0, "timeOffset": 0}]}}
+
+
+def scroll(ts, y, node=9):
+    return {"type": INCR, "timestamp": ts, "data": {"source": 3, "id": node, "x": 0, "y": y}}
+
+
+def test_samples_inside_window_collapse_to_latest_state():
+    events = [scroll(0, 10), scroll(10, 20), scroll(20, 30), scroll(100, 40)]
+    out = main.compact_rrweb_events(events, sample_ms=50, snapshot_gap_ms=1000)
+    # First window keeps its start time but ends on the last position
+    assert [(e["timestamp"], e["data"]["y"]) for e in out] == [(0, 30), (100, 40)]
+
+
+def test_other_events_close_the_sampling_window():
+    click = {"type": INCR, "timestamp": 15, "data": {"source": 2, "id": 1}}
+    events = [scroll(0, 10), click, scroll(20, 30)]
+    out = main.compact_rrweb_events(events, sample_ms=50, snapshot_gap_ms=1000)
+    assert out == events
+
+
+def test_merged_positions_keep_their_real_offsets():
+    out = main.compact_rrweb_events([mousemove(0, 1), mousemove(30, 2), mousemove(80, 3)], sample_ms=50, snapshot_gap_ms=1000)
+    # The 30ms sample merges into the first event with its offset shifted to keep its real
+    # time; the 80ms one is outside the window and starts a new event
+    assert [(e["timestamp"], [(p["x"], p["timeOffset"]) for p in e["data"]["positions"]]) for e in out] == [
+        (0, [(2, 30)]),
+        (80, [(3, 0)]),
+    ]
+
+
+def test_close_snapshots_are_dropped_with_their_meta():
+    events = [
+        {"type": META, "timestamp": 0, "data": {"width": 800}},
+        {"type": FULL, "timestamp": 0, "data": {}},
+        {"type": META, "timestamp": 100, "data": {"width": 800}},
+        {"type": FULL, "timestamp": 100, "data": {}},
+        {"type": META, "timestamp": 200, "data": {"width": 1024}},
+        {"type": FULL, "timestamp": 200, "data": {}},
+    ]
+    out = main.compact_rrweb_events(events, sample_ms=50, snapshot_gap_ms=1000)
+    # The second checkout goes entirely; the third keeps its Meta since the viewport changed
+    assert [(e["type"], e["timestamp"]) for e in out] == [(META, 0), (FULL, 0), (META, 200)]
+
+
+def recording(tmp_path, events):
+    src = tmp_path / "rec.json.gz"
+    src.write_bytes(gzip.compress(json.dumps(events).encode()))
+    return src
+
+
+def read_segments(out_dir):
+    return [e for path in sorted(out_dir.iterdir()) for e in json.loads(gzip.decompress(path.read_bytes()))]
+
+
+def test_index_matches_stored_recording_when_nothing_is_dropped(tmp_path):
+    # One event whose positions get thinned: the count is unchanged, so the file is not rewritten
+    positions = [{"x": i, "y": 0, "timeOffset": i} for i in range(10)]
+    events = [
+        {"type": META, "timestamp": 0, "data": {}},
+        {"type": FULL, "timestamp": 0, "data": {}},
+        {"type": INCR, "timestamp": 5, "data": {"source": 1, "id": 1, "positions": positions}},
+    ]
+    src = recording(tmp_path, events)
+    _, stats = main.process_rrweb_file(src, tmp_path / "index", 30000)
+    stored = json.loads(gzip.decompress(src.read_bytes()))
+    assert stats["compacted_bytes"] == stats["original_bytes"]
+    assert read_segments(tmp_path / "index") == stored == events
+
+
+def test_index_matches_stored_recording_after_compaction(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "RRWEB_COMPACT_MIN_SAVINGS", 0)
+    events = [{"type": META, "timestamp": 0, "data": {}}, {"type": FULL, "timestamp": 0, "data": {}}]
+    events += [scroll(t, t) for t in range(1, 5000)]
+    src = recording(tmp_path, events)
+    _, stats = main.process_rrweb_file(src, tmp_path / "index", 30000)
+    stored = json.loads(gzip.decompress(src.read_bytes()))
+    assert stats["compacted_events"] < stats["original_events"] == len(events)
+    assert read_segments(tmp_path / "index") == stored
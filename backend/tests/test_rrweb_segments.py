@@ -0,0 +1,42 @@
+import gzip
+import json
+
+import pytest
+
+import main
+
+
+def write_segment(path, payload: bytes):
+    path.write_bytes(gzip.compress(payload))
+    return path
+
+
+def test_assemble_concatenates_segments_in_order(tmp_path):
+    paths = [
+        write_segment(tmp_path / "00000.json.gz", json.dumps([{"type": 4, "timestamp": 1}]).encode()),
+        write_segment(tmp_path / "00001.json.gz", json.dumps([{"type": 2, "timestamp": 2}, {"type": 3, "timestamp": 3}]).encode()),
+    ]
+    out = tmp_path / "out.json.gz"
+    assert main.assemble_rrweb_segments(paths, out) == 3
+    assert [e["timestamp"] for e in json.loads(gzip.decompress(out.read_bytes()))] == [1, 2, 3]
+
+
+def test_segment_that_is_not_an_array_is_rejected(tmp_path):
+    path = write_segment(tmp_path / "00000.json.gz", b'{"type": 4}')
+    with pytest.raises(ValueError, match="not an event array"):
+        main.assemble_rrweb_segments([path], tmp_path / "out.json.gz")
+
+
+def test_segment_over_decompressed_cap_is_refused_before_parsing(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "MAX_RRWEB_SEGMENT_DECOMPRESSED_SIZE", 1024)
+    # Valid JSON, so only the size check can reject it
+    path = write_segment(tmp_path / "00000.json.gz", b"[" + b" " * 4096 + b"]")
+    with pytest.raises(ValueError, match="decompresses past"):
+        main.read_rrweb_segment(path)
+
+
+def test_gzip_validator_enforces_decompressed_cap():
+    validator = main.GzipValidator(max_decompressed=1024)
+    with pytest.raises(main.HTTPException) as exc:
+        validator.feed(gzip.compress(b"x" * 4096))
+    assert exc.value.status_code == 400
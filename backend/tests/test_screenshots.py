@@ -0,0 +1,64 @@
+import io
+
+import pytest
+from starlette.datastructures import Headers, UploadFile
+
+import main
+from conftest import run
+
+SUB = "sub_shots"
+TESTER = "tester@example.com"
+
+
+@pytest.fixture
+def draft(db, monkeypatch):
+    monkeypatch.setattr(main, "get_user_or_404", lambda email: _async({"email": email, "role": "tester"}))
+    monkeypatch.setattr(main, "spawn_media_task", lambda coro: coro.close())
+    run(main.submissions_col.insert_one({"_id": SUB, "tester_email": TESTER, "status": "draft", "screenshots": [], "bug_reports": []}))
+    return SUB
+
+
+async def _async(value):
+    return value
+
+
+def upload(data: bytes, content_type: str) -> dict:
+    file = UploadFile(io.BytesIO(data), filename="shot", headers=Headers({"content-type": content_type}))
+    return run(main.upload_screenshot(SUB, file, TESTER))
+
+
+def blob(sha256):
+    return run(main.screenshots_col.find_one({"_id": sha256}))
+
+
+def test_same_bytes_under_another_type_reuse_the_first_name(draft):
+    first = upload(b"\x89PNG same bytes", "image/png")
+    second = upload(b"\x89PNG same bytes", "image/jpeg")
+    assert second["deduplicated"] is True
+    assert second["screenshot_url"] == first["screenshot_url"] == f"/uploads/screenshots/{first['sha256']}.png"
+    assert not (main.storage.root / "screenshots" / f"{first['sha256']}.jpg").exists()
+    assert blob(first["sha256"])["refcount"] == 2
+
+
+def test_digest_counts_cover_screenshots_and_bug_reports():
+    sha_a, sha_b = "a" * 64, "b" * 64
+    doc = {
+        "screenshots": [f"/uploads/screenshots/{sha_a}.png", f"/uploads/screenshots/{sha_a}.png", "https://elsewhere/x.png"],
+        "bug_reports": [{"screenshot_url": f"/uploads/screenshots/{sha_b}.webp"}, {"title": "no shot"}, "junk"],
+    }
+    assert main.screenshot_digest_counts(doc) == {sha_a: 2, sha_b: 1}
+
+
+def test_saving_sets_and_dropping_clears_refs(draft):
+    shot = upload(b"one", "image/png")
+    other_sub = "sub_other"
+    run(main.screenshots_col.update_one({"_id": shot["sha256"]}, {"$inc": {"refcount": 1, f"refs.{other_sub}": 1}}))
+
+    url = shot["screenshot_url"]
+    run(main.update_submission(SUB, main.SubmissionUpdate(screenshots=[url], bug_reports=[{"screenshot_url": url}]), TESTER))
+    assert blob(shot["sha256"])["refs"] == {SUB: 2, other_sub: 1}
+    assert blob(shot["sha256"])["refcount"] == 3
+
+    run(main.update_submission(SUB, main.SubmissionUpdate(screenshots=[], bug_reports=[]), TESTER))
+    assert blob(shot["sha256"])["refs"] == {other_sub: 1}
+    assert blob(shot["sha256"])["refcount"] == 1
@@ -0,0 +1,93 @@
+import os
+import time
+
+import pytest
+
+import main
+from conftest import run
+
+SUB = "sub_0c"
+TESTER = "tester@example.com"
+
+
+@pytest.fixture
+def store(db, tmp_path, monkeypatch):
+    storage = main.LocalStorage(str(tmp_path))
+    monkeypatch.setattr(main, "storage", storage)
+    # Small batches so a unit's references are looked up across several of them
+    monkeypatch.setattr(main, "STORAGE_GC_BATCH_SIZE", 2)
+    monkeypatch.setattr(main, "STORAGE_GC_DRY_RUN", False)
+    return storage
+
+
+def put(storage, key: str, size: int = 10, age_hours: float = 48):
+    path = storage.root / key
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x" * size)
+    stamp = time.time() - age_hours * 3600
+    os.utime(path, (stamp, stamp))
+
+
+def exists(storage, key: str) -> bool:
+    return (storage.root / key).exists()
+
+
+def test_unreferenced_files_past_the_grace_period_are_deleted(store):
+    run(main.submissions_col.insert_one({
+        "_id": SUB, "tester_email": TESTER, "status": "submitted", "created_at": "2026-01-01T00:00:00",
+        "video_url": f"/uploads/{SUB}_video.webm", "video_hls_url": f"/uploads/hls/{SUB}_video/master.m3u8",
+        "screenshots": ["/uploads/screenshots/" + "a" * 64 + ".png"],
+    }))
+    put(store, f"{SUB}_video.webm", size=100)
+    put(store, f"hls/{SUB}_video/master.m3u8")
+    put(store, f"hls/{SUB}_video/480p/seg0.ts", size=50)
+    put(store, "screenshots/" + "a" * 64 + ".png")
+    put(store, "screenshots/" + "a" * 64 + ".thumb.webp")
+    put(store, f"{SUB}_old_video.webm", size=70)
+    put(store, f"{SUB}_fresh_video.webm", size=30, age_hours=1)
+    put(store, "partial/upload.bin")
+
+    stats = run(main.collect_storage_garbage())
+
+    assert not exists(store, f"{SUB}_old_video.webm")
+    for key in (f"{SUB}_video.webm", f"hls/{SUB}_video/480p/seg0.ts", "screenshots/" + "a" * 64 + ".thumb.webp",
+                f"{SUB}_fresh_video.webm", "partial/upload.bin"):
+        assert exists(store, key)
+    assert stats["deleted_files"] == 1 and stats["deleted_bytes"] == 70
+    # The fresh orphan is still in its grace period and counts against the submission it names
+    usage = run(main.submissions_col.find_one({"_id": SUB}))["storage_usage"]
+    assert usage == {"bytes": 100 + 10 + 50 + 10 + 10 + 30, "files": 6}
+    assert run(main.storage_usage_col.find_one({"_id": TESTER}))["files"] == 6
+
+
+def test_idle_draft_media_is_detached_then_deleted(store):
+    run(main.submissions_col.insert_one({
+        "_id": SUB, "tester_email": TESTER, "status": "draft", "created_at": "2020-01-01T00:00:00",
+        "video_url": f"/uploads/{SUB}_video.webm", "video_transcode": {"status": "done"},
+        "storage_usage": {"bytes": 10, "files": 1},
+    }))
+    put(store, f"{SUB}_video.webm", age_hours=24 * 365)
+
+    run(main.collect_storage_garbage())
+
+    assert not exists(store, f"{SUB}_video.webm")
+    doc = run(main.submissions_col.find_one({"_id": SUB}))
+    assert "video_url" not in doc and "video_transcode" not in doc
+    assert doc["storage_usage"] == {"bytes": 0, "files": 0}
+
+
+def test_only_one_node_holds_the_gc_lease(db):
+    token = run(main.claim_storage_gc_lease())
+    assert token
+    assert run(main.claim_storage_gc_lease()) is None
+    lease = run(main.counters_col.find_one({"_id": main.STORAGE_COUNTERS_ID}))
+    assert lease["gc_lease_owner"] == token
+
+
+def test_renewal_stops_once_the_lease_belongs_to_another_node(db, monkeypatch):
+    monkeypatch.setattr(main, "STORAGE_GC_LEASE_SECONDS", 0.03)
+    run(main.claim_storage_gc_lease())
+    before = run(main.counters_col.find_one({"_id": main.STORAGE_COUNTERS_ID}))["gc_lease_until"]
+    # Returns instead of extending a lease it no longer owns
+    run(main.renew_storage_gc_lease("not-the-owner"))
+    assert run(main.counters_col.find_one({"_id": main.STORAGE_COUNTERS_ID}))["gc_lease_until"] == before
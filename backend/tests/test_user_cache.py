@@ -0,0 +1,18 @@
+import main
+from conftest import run
+
+EMAIL = "tester@example.com"
+
+
+def test_mutating_a_returned_user_leaves_the_cache_alone(db, monkeypatch):
+    monkeypatch.setattr(main, "user_cache", main.TTLCache(10, 60))
+    run(main.users_col.insert_one({"email": EMAIL, "role": "tester", "specialties": ["mobile"], "prefs": {"digest": True}}))
+
+    user = run(main.get_user(EMAIL))
+    user["specialties"].append("payments")
+    user["prefs"]["digest"] = False
+
+    cached = run(main.get_user(EMAIL))
+    assert cached["specialties"] == ["mobile"]
+    assert cached["prefs"] == {"digest": True}
+    assert main.user_cache.hits == 1
@@ -88,3 +88,71 @@ export async function tryRefresh() {
     return null
   }
 }
+
+// Upload straight to object storage via a presigned URL. Resolves to null when the
+// server stores media locally (501), so callers can fall back to proxied uploads.
+export async function uploadDirect(submissionId, kind, blob, filename, contentType) {
+  let upload
+  try {
+    ({ data: upload } = await axios.post(`/api/submissions/${submissionId}/direct-uploads`, {
+      kind,
+      filename,
+      content_type: contentType,
+      size: blob.size,
+    }))
+  } catch (err) {
+    if (err.response?.status === 501) return null
+    throw err
+  }
+  // Plain fetch so the API's Authorization header is never sent to the bucket
+  const res = await fetch(upload.url, { method: upload.method, headers: upload.headers, body: blob })
+  if (!res.ok) throw new Error(`Direct upload failed (${res.status})`)
+  const { data } = await axios.post(`/api/direct-uploads/${upload.upload_id}/complete`)
+  return data
+}
+
+// Resumable, chunked video upload. Chunks go up in parallel; a failed chunk is
+// retried, and only the ranges the server is missing are re-sent. When the server
+// uses object storage the file goes directly to the bucket instead.
+export async function uploadVideoResumable(submissionId, blob, filename = 'recording.webm', { concurrency = 3, retries = 3 } = {}) {
+  const contentType = blob.type?.split(';')[0] || 'video/webm'
+  const direct = await uploadDirect(submissionId, 'video', blob, filename, contentType)
+  if (direct) return direct
+
+  const { data: upload } = await axios.post(`/api/submissions/${submissionId}/video-uploads`, {
+    filename,
+    content_type: contentType,
+    size: blob.size,
+  })
+  const chunkSize = upload.chunk_size
+
+  for (let attempt = 0; ; attempt++) {
+    const { data: status } = await axios.get(`/api/video-uploads/${upload.upload_id}`)
+    const missing = []
+    let pos = 0
+    for (const [start, end] of [...status.received, [blob.size, blob.size]]) {
+      for (let s = pos; s < start; s += chunkSize) missing.push([s, Math.min(s + chunkSize, start)])
+      pos = Math.max(pos, end)
+    }
+    if (!missing.length) break
+    if (attempt > retries) throw new Error('Video upload did not complete')
+
+    const queue = [...missing]
+    const worker = async () => {
+      while (queue.length) {
+        const [start, end] = queue.shift()
+        try {
+          await axios.put(`/api/video-uploads/${upload.upload_id}`, blob.slice(start, end), {
+            headers: { 'Content-Type': 'application/octet-stream', 'Content-Range': `bytes ${start}-${end - 1}/${blob.size}` },
+          })
+        } catch {
+          // Picked up again from the server's received ranges on the next pass
+        }
+      }
+    }
+    await Promise.all(Array.from({ length: concurrency }, worker))
+  }
+
+  const { data } = await axios.post(`/api/video-uploads/${upload.upload_id}/finalize`)
+  return data
+}
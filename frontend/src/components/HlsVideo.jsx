@@ -0,0 +1,39 @@
+import { forwardRef, useEffect, useImperativeHandle, useRef } from 'react'
+import Hls from 'hls.js'
+
+const canPlayHlsNatively = typeof document !== 'undefined' && !!document.createElement('video').canPlayType('application/vnd.apple.mpegurl')
+
+// A <video> that prefers the server's HLS ladder: natively where the browser plays HLS
+// (Safari, iOS), through hls.js on Media Source Extensions elsewhere, and the original
+// upload (src) when neither works or the stream fails.
+const HlsVideo = forwardRef(function HlsVideo({ src, hlsSrc, ...props }, ref) {
+  const videoRef = useRef(null)
+  useImperativeHandle(ref, () => videoRef.current)
+  const viaHlsJs = !!hlsSrc && !canPlayHlsNatively && Hls.isSupported()
+  const lazy = props.preload === 'none'
+
+  useEffect(() => {
+    const video = videoRef.current
+    if (!viaHlsJs || !video) return
+    // With preload="none" nothing is fetched until the viewer presses play
+    const hls = new Hls({ autoStartLoad: !lazy })
+    const startLoad = () => hls.startLoad()
+    if (lazy) video.addEventListener('play', startLoad, { once: true })
+    hls.on(Hls.Events.ERROR, (_, data) => {
+      if (!data.fatal) return
+      hls.destroy()
+      video.src = src
+    })
+    hls.loadSource(hlsSrc)
+    hls.attachMedia(video)
+    return () => {
+      video.removeEventListener('play', startLoad)
+      hls.destroy()
+    }
+  }, [viaHlsJs, hlsSrc, src, lazy])
+
+  const directSrc = hlsSrc && canPlayHlsNatively ? hlsSrc : src
+  return <video ref={videoRef} src={viaHlsJs ? undefined : directSrc} {...props} />
+})
+
+export default HlsVideo
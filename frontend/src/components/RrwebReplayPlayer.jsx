@@ -1,7 +1,15 @@
 import { useState, useEffect, useRef } from 'react'
 import pako from 'pako'
+import axios from 'axios'
 
-export default function RrwebReplayPlayer({ rrwebUrl, sessionDuration }) {
+async function fetchGzipJson(url) {
+  const { data } = await axios.get(url, { responseType: 'arraybuffer' })
+  return JSON.parse(pako.ungzip(new Uint8Array(data), { to: 'string' }))
+}
+
+// Plays an indexed recording from the segment covering seekTo (seconds from the start),
+// streaming later segments into the player; falls back to the full file when not indexed.
+export default function RrwebReplayPlayer({ rrwebUrl, submissionId, sessionDuration, seekTo = 0 }) {
   const containerRef = useRef(null)
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState('')
@@ -12,12 +20,25 @@ export default function RrwebReplayPlayer({ rrwebUrl, sessionDuration }) {
     let cancelled = false
 
     const loadPlayer = async () => {
+      setLoading(true)
       try {
-        const resp = await fetch(rrwebUrl)
-        if (!resp.ok) throw new Error('Failed to fetch recording')
-        const buffer = await resp.arrayBuffer()
-        const decompressed = pako.ungzip(new Uint8Array(buffer), { to: 'string' })
-        const events = JSON.parse(decompressed)
+        let index = null
+        if (submissionId) {
+          index = await axios.get(`/api/submissions/${submissionId}/rrweb/index`).then((r) => r.data).catch(() => null)
+        }
+
+        let events
+        let first = 0
+        if (index) {
+          const target = index.start + seekTo * 1000
+          first = Math.max(0, index.segments.findLastIndex((seg) => seg.start <= target))
+          events = await fetchGzipJson(`/api/submissions/${submissionId}/rrweb/segments/${first}`)
+        } else {
+          const resp = await fetch(rrwebUrl)
+          if (!resp.ok) throw new Error('Failed to fetch recording')
+          const buffer = await resp.arrayBuffer()
+          events = JSON.parse(pako.ungzip(new Uint8Array(buffer), { to: 'string' }))
+        }
 
         if (cancelled || !containerRef.current) return
 
@@ -37,8 +58,19 @@ export default function RrwebReplayPlayer({ rrwebUrl, sessionDuration }) {
             speedOption: [0.5, 1, 2, 4],
           },
         })
+        if (index) {
+          playerRef.current.goto(Math.max(0, index.start + seekTo * 1000 - events[0].timestamp))
+        }
 
         setLoading(false)
+
+        if (index) {
+          for (let n = first + 1; n < index.segments.length && !cancelled; n++) {
+            const more = await fetchGzipJson(`/api/submissions/${submissionId}/rrweb/segments/${n}`)
+            if (cancelled) break
+            more.forEach((event) => playerRef.current.addEvent(event))
+          }
+        }
       } catch (err) {
         if (!cancelled) {
           setError(err.message || 'Failed to load session replay')
@@ -49,7 +81,7 @@ export default function RrwebReplayPlayer({ rrwebUrl, sessionDuration }) {
 
     loadPlayer()
     return () => { cancelled = true }
-  }, [rrwebUrl])
+  }, [rrwebUrl, submissionId, seekTo])
 
   const formatDuration = (s) => {
     if (!s) return ''
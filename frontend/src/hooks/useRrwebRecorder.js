@@ -1,34 +1,79 @@
 import { useState, useRef, useCallback, useEffect } from 'react'
 import { record } from 'rrweb'
 import pako from 'pako'
+import axios from 'axios'
 
-export default function useRrwebRecorder() {
+const FLUSH_INTERVAL_MS = 10000
+const FLUSH_MAX_EVENTS = 2000
+const MAX_RETRIES = 5
+
+// Periodic full snapshots let the server cut the replay into independently playable segments
+const CHECKOUT_EVERY_MS = 30000
+
+// Events are flushed to the server as numbered gzip segments while recording, so
+// only the current batch (plus any segments still retrying) is held in memory.
+export default function useRrwebRecorder(submissionId) {
   const [isRecording, setIsRecording] = useState(false)
   const [duration, setDuration] = useState(0)
   const [startedAt, setStartedAt] = useState(null)
   const eventsRef = useRef([])
+  const seqRef = useRef(0)
+  const uploadsRef = useRef(Promise.resolve())
+  const failedRef = useRef(null)
   const stopFnRef = useRef(null)
   const timerRef = useRef(null)
+  const flushTimerRef = useRef(null)
+
+  const flush = useCallback(() => {
+    if (!eventsRef.current.length) return
+    const seq = seqRef.current++
+    const blob = new Blob([pako.gzip(JSON.stringify(eventsRef.current))], { type: 'application/gzip' })
+    eventsRef.current = []
+
+    // Segments upload one after another; a segment is retried before the next one is sent
+    uploadsRef.current = uploadsRef.current.then(async () => {
+      for (let attempt = 0; ; attempt++) {
+        try {
+          await axios.post(`/api/submissions/${submissionId}/rrweb-segments`, blob, {
+            params: { seq },
+            headers: { 'Content-Type': 'application/gzip' },
+          })
+          return
+        } catch (err) {
+          if (attempt >= MAX_RETRIES) {
+            failedRef.current = err
+            return
+          }
+          await new Promise((r) => setTimeout(r, 500 * 2 ** attempt))
+        }
+      }
+    })
+  }, [submissionId])
 
   const startSession = useCallback(() => {
     eventsRef.current = []
+    seqRef.current = 0
+    failedRef.current = null
     const now = new Date()
     setStartedAt(now)
     setDuration(0)
     setIsRecording(true)
 
     stopFnRef.current = record({
+      checkoutEveryNms: CHECKOUT_EVERY_MS,
       emit(event) {
         eventsRef.current.push(event)
+        if (eventsRef.current.length >= FLUSH_MAX_EVENTS) flush()
       },
     })
 
     timerRef.current = setInterval(() => {
       setDuration(Math.floor((Date.now() - now.getTime()) / 1000))
     }, 1000)
-  }, [])
+    flushTimerRef.current = setInterval(flush, FLUSH_INTERVAL_MS)
+  }, [flush])
 
-  const endSession = useCallback(() => {
+  const endSession = useCallback(async () => {
     if (stopFnRef.current) {
       stopFnRef.current()
       stopFnRef.current = null
@@ -37,6 +82,10 @@ export default function useRrwebRecorder() {
       clearInterval(timerRef.current)
       timerRef.current = null
     }
+    if (flushTimerRef.current) {
+      clearInterval(flushTimerRef.current)
+      flushTimerRef.current = null
+    }
 
     const endedAt = new Date()
     const sessionDuration = startedAt
@@ -45,22 +94,27 @@ export default function useRrwebRecorder() {
 
     setIsRecording(false)
 
-    const json = JSON.stringify(eventsRef.current)
-    const compressed = pako.gzip(json)
-    const blob = new Blob([compressed], { type: 'application/gzip' })
+    flush()
+    await uploadsRef.current
+    if (failedRef.current) throw failedRef.current
+
+    const { data } = await axios.post(`/api/submissions/${submissionId}/rrweb-segments/finalize`, {
+      segments: seqRef.current,
+    })
 
     return {
-      blob,
+      rrwebRecordingUrl: data.rrweb_recording_url,
       duration: sessionDuration,
       startedAt: startedAt?.toISOString(),
       endedAt: endedAt.toISOString(),
     }
-  }, [startedAt, duration])
+  }, [startedAt, duration, flush, submissionId])
 
   useEffect(() => {
     return () => {
       if (stopFnRef.current) stopFnRef.current()
       if (timerRef.current) clearInterval(timerRef.current)
+      if (flushTimerRef.current) clearInterval(flushTimerRef.current)
     }
   }, [])
 
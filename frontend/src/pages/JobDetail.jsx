@@ -1,11 +1,13 @@
 import { useState, useEffect, useRef } from 'react'
 import { useParams, Link } from 'react-router-dom'
 import axios from 'axios'
+import { uploadVideoResumable } from '../api'
 import { loadStripe } from '@stripe/stripe-js'
 import { Elements, PaymentElement, useStripe, useElements } from '@stripe/react-stripe-js'
 import useRrwebRecorder from '../hooks/useRrwebRecorder'
 import RrwebReplayPlayer from '../components/RrwebReplayPlayer'
 import ScreenshotAnnotator from '../components/ScreenshotAnnotator'
+import HlsVideo from '../components/HlsVideo'
 
 const stripeKey = import.meta.env.VITE_STRIPE_PUBLISHABLE_KEY
 const stripePromise = stripeKey ? loadStripe(stripeKey) : null
@@ -58,6 +60,17 @@ function formatTime(seconds) {
   return `${m}:${s.toString().padStart(2, '0')}`
 }
 
+// Screenshots are stored by SHA-256; the server adds a WebP thumbnail per digest once it's ready
+function screenshotThumb(submission, url) {
+  const digest = url?.match(/([0-9a-f]{64})\.\w+$/)?.[1]
+  return (digest && submission.screenshot_thumbnails?.[digest]) || url
+}
+
+// The HLS ladder belongs to the stored upload, not to a video the tester just replaced it with
+function hlsVideoUrl(submission, url) {
+  return url === submission.video_url ? submission.video_hls_url : null
+}
+
 function parseTimeToSeconds(str) {
   const parts = str.split(':').map(Number)
   if (parts.length === 2 && !isNaN(parts[0]) && !isNaN(parts[1])) {
@@ -790,7 +803,7 @@ function V2TesterSubmission({ submission, onUpdate, setError }) {
   const isEditable = submission.status === 'draft'
 
   // Session recording
-  const rrweb = useRrwebRecorder()
+  const rrweb = useRrwebRecorder(submission.id)
   const [sessionStarted, setSessionStarted] = useState(false)
   const [sessionEnded, setSessionEnded] = useState(!!submission.rrweb_recording_url)
   const [uploadingRrweb, setUploadingRrweb] = useState(false)
@@ -849,12 +862,9 @@ function V2TesterSubmission({ submission, onUpdate, setError }) {
   }
 
   const handleEndSession = async () => {
-    const result = rrweb.endSession()
     setUploadingRrweb(true)
     try {
-      await axios.post(`/api/submissions/${submission.id}/upload-rrweb`, result.blob, {
-        headers: { 'Content-Type': 'application/gzip' },
-      })
+      const result = await rrweb.endSession()
       await axios.put(`/api/submissions/${submission.id}/session-timing`, {
         session_ended_at: result.endedAt,
         session_duration_seconds: result.duration,
@@ -895,10 +905,8 @@ function V2TesterSubmission({ submission, onUpdate, setError }) {
     if (!recordedBlob) return
     setUploading(true)
     try {
-      const formData = new FormData()
-      formData.append('file', recordedBlob, 'recording.webm')
-      const res = await axios.post(`/api/submissions/${submission.id}/upload-video`, formData, { headers: { 'Content-Type': 'multipart/form-data' } })
-      setVideoUrl(res.data.video_url)
+      const res = await uploadVideoResumable(submission.id, recordedBlob)
+      setVideoUrl(res.video_url)
       setRecordedBlob(null)
       setRecordedUrl(null)
       setRecordingState('idle')
@@ -1049,7 +1057,7 @@ function V2TesterSubmission({ submission, onUpdate, setError }) {
                         </div>
                         {bug.screenshot_url && (
                           <a href={bug.screenshot_url} target="_blank" rel="noopener noreferrer" className="block mt-2">
-                            <img src={bug.screenshot_url} alt="Bug screenshot" className="h-24 rounded border border-gray-200 object-cover hover:opacity-80" />
+                            <img src={screenshotThumb(submission, bug.screenshot_url)} alt="Bug screenshot" loading="lazy" className="h-24 rounded border border-gray-200 object-cover hover:opacity-80" />
                           </a>
                         )}
                       </div>
@@ -1172,7 +1180,7 @@ function V2TesterSubmission({ submission, onUpdate, setError }) {
                 {form.screenshots.map((url, i) => (
                   <div key={i} className="relative group">
                     <a href={url} target="_blank" rel="noopener noreferrer">
-                      <img src={url} alt={`Screenshot ${i + 1}`} className="h-20 rounded border border-gray-200 object-cover hover:opacity-80" />
+                      <img src={screenshotThumb(submission, url)} alt={`Screenshot ${i + 1}`} loading="lazy" className="h-20 rounded border border-gray-200 object-cover hover:opacity-80" />
                     </a>
                     {isEditable && (
                       <button type="button" onClick={() => setForm((f) => ({ ...f, screenshots: f.screenshots.filter((_, j) => j !== i) }))} className="absolute -top-1.5 -right-1.5 w-5 h-5 bg-red-500 text-white rounded-full text-xs flex items-center justify-center opacity-0 group-hover:opacity-100 transition-opacity">&times;</button>
@@ -1260,6 +1268,7 @@ function BuilderSubmissionCard({ submission, onUpdate, setError }) {
   const [processing, setProcessing] = useState(false)
   const [rating, setRating] = useState(0)
   const videoRef = useRef(null)
+  const [replaySeek, setReplaySeek] = useState(0)
 
   const handleApprove = async () => {
     if (!confirm('Approve this submission? This will release payment to the tester.')) return
@@ -1291,6 +1300,7 @@ function BuilderSubmissionCard({ submission, onUpdate, setError }) {
 
   const handleTagSeek = (seconds) => {
     if (videoRef.current) { videoRef.current.currentTime = seconds; videoRef.current.play() }
+    setReplaySeek(seconds)
   }
 
   const subStatusColors = {
@@ -1323,7 +1333,7 @@ function BuilderSubmissionCard({ submission, onUpdate, setError }) {
           {submission.video_url && (
             <div className="mb-4">
               <label className="block text-sm font-medium text-gray-500 mb-2">Screen Recording</label>
-              <video ref={videoRef} src={submission.video_url} controls className="w-full rounded-lg bg-black" style={{ maxHeight: '400px' }} />
+              <HlsVideo ref={videoRef} src={submission.video_url} hlsSrc={submission.video_hls_url} poster={submission.video_poster_url} preload={submission.video_poster_url ? 'none' : 'metadata'} controls className="w-full rounded-lg bg-black" style={{ maxHeight: '400px' }} />
             </div>
           )}
 
@@ -1374,7 +1384,7 @@ function BuilderSubmissionCard({ submission, onUpdate, setError }) {
                       {bug.steps_to_reproduce && <p className="text-xs text-gray-500 mt-1"><strong>Steps:</strong> {bug.steps_to_reproduce}</p>}
                       {bug.screenshot_url && (
                         <a href={bug.screenshot_url} target="_blank" rel="noopener noreferrer" className="block mt-2">
-                          <img src={bug.screenshot_url} alt="Bug screenshot" className="h-24 rounded border border-gray-200 object-cover hover:opacity-80" />
+                          <img src={screenshotThumb(submission, bug.screenshot_url)} alt="Bug screenshot" loading="lazy" className="h-24 rounded border border-gray-200 object-cover hover:opacity-80" />
                         </a>
                       )}
                     </div>
@@ -1396,7 +1406,7 @@ function BuilderSubmissionCard({ submission, onUpdate, setError }) {
                 <div className="flex flex-wrap gap-2">
                   {submission.screenshots.map((url, i) => (
                     <a key={i} href={url} target="_blank" rel="noopener noreferrer">
-                      <img src={url} alt={`Screenshot ${i + 1}`} className="h-24 rounded border border-gray-200 object-cover hover:opacity-80" />
+                      <img src={screenshotThumb(submission, url)} alt={`Screenshot ${i + 1}`} loading="lazy" className="h-24 rounded border border-gray-200 object-cover hover:opacity-80" />
                     </a>
                   ))}
                 </div>
@@ -1414,7 +1424,7 @@ function BuilderSubmissionCard({ submission, onUpdate, setError }) {
               {submission.session_duration_seconds > 0 && (
                 <p className="text-sm text-gray-700 mb-2">Tester worked for <strong>{formatDurationBadge(submission.session_duration_seconds)}</strong></p>
               )}
-              <RrwebReplayPlayer rrwebUrl={submission.rrweb_recording_url} sessionDuration={submission.session_duration_seconds} />
+              <RrwebReplayPlayer rrwebUrl={submission.rrweb_recording_url} submissionId={submission.id} sessionDuration={submission.session_duration_seconds} seekTo={replaySeek} />
             </div>
           )}
 
@@ -1500,7 +1510,7 @@ function TesterSubmission({ submission, onUpdate, setError }) {
   const videoRef = useRef(null)
 
   // Session recording
-  const rrweb = useRrwebRecorder()
+  const rrweb = useRrwebRecorder(submission.id)
   const [sessionStarted, setSessionStarted] = useState(false)
   const [sessionEnded, setSessionEnded] = useState(!!submission.rrweb_recording_url)
   const [uploadingRrweb, setUploadingRrweb] = useState(false)
@@ -1517,12 +1527,9 @@ function TesterSubmission({ submission, onUpdate, setError }) {
   }
 
   const handleEndSession = async () => {
-    const result = rrweb.endSession()
     setUploadingRrweb(true)
     try {
-      await axios.post(`/api/submissions/${submission.id}/upload-rrweb`, result.blob, {
-        headers: { 'Content-Type': 'application/gzip' },
-      })
+      const result = await rrweb.endSession()
       await axios.put(`/api/submissions/${submission.id}/session-timing`, {
         session_ended_at: result.endedAt,
         session_duration_seconds: result.duration,
@@ -1564,10 +1571,8 @@ function TesterSubmission({ submission, onUpdate, setError }) {
     setUploading(true)
     setError('')
     try {
-      const formData = new FormData()
-      formData.append('file', recordedBlob, 'recording.webm')
-      const res = await axios.post(`/api/submissions/${submission.id}/upload-video`, formData, { headers: { 'Content-Type': 'multipart/form-data' } })
-      setVideoUrl(res.data.video_url)
+      const res = await uploadVideoResumable(submission.id, recordedBlob)
+      setVideoUrl(res.video_url)
       setRecordedBlob(null)
       setRecordedUrl(null)
       setRecordingState('idle')
@@ -1693,7 +1698,7 @@ function TesterSubmission({ submission, onUpdate, setError }) {
           {!isEditable && videoUrl && (
             <div>
               <label className="block text-sm font-medium text-gray-700 mb-2">Screen Recording</label>
-              <video ref={videoRef} src={videoUrl} controls className="w-full rounded-lg bg-black" style={{ maxHeight: '360px' }} />
+              <HlsVideo ref={videoRef} src={videoUrl} hlsSrc={hlsVideoUrl(submission, videoUrl)} poster={submission.video_poster_url} preload={submission.video_poster_url ? 'none' : 'metadata'} controls className="w-full rounded-lg bg-black" style={{ maxHeight: '360px' }} />
             </div>
           )}
 
@@ -1767,7 +1772,7 @@ function TesterSubmission({ submission, onUpdate, setError }) {
                     </div>
                     {bug.screenshot_url && (
                       <a href={bug.screenshot_url} target="_blank" rel="noopener noreferrer" className="block mt-2">
-                        <img src={bug.screenshot_url} alt="Bug screenshot" className="h-24 rounded border border-gray-200 object-cover hover:opacity-80" />
+                        <img src={screenshotThumb(submission, bug.screenshot_url)} alt="Bug screenshot" loading="lazy" className="h-24 rounded border border-gray-200 object-cover hover:opacity-80" />
                       </a>
                     )}
                   </div>
@@ -1788,7 +1793,7 @@ function TesterSubmission({ submission, onUpdate, setError }) {
                 {form.screenshots.map((url, i) => (
                   <div key={i} className="relative group">
                     <a href={url} target="_blank" rel="noopener noreferrer">
-                      <img src={url} alt={`Screenshot ${i + 1}`} className="h-24 rounded border border-gray-200 object-cover hover:opacity-80" />
+                      <img src={screenshotThumb(submission, url)} alt={`Screenshot ${i + 1}`} loading="lazy" className="h-24 rounded border border-gray-200 object-cover hover:opacity-80" />
                     </a>
                     {isEditable && (
                       <button type="button" onClick={() => setForm((f) => ({ ...f, screenshots: f.screenshots.filter((_, j) => j !== i) }))} className="absolute -top-1.5 -right-1.5 w-5 h-5 bg-red-500 text-white rounded-full text-xs flex items-center justify-center opacity-0 group-hover:opacity-100 transition-opacity">&times;</button>
@@ -1840,10 +1845,29 @@ function TesterSubmission({ submission, onUpdate, setError }) {
 
 function VideoTagPanel({ submission, onUpdate, setError, onSeek }) {
   const [tags, setTags] = useState(submission.video_tags || [])
+  const [clips, setClips] = useState([])
   const [adding, setAdding] = useState(false)
   const [tagForm, setTagForm] = useState({ start: '', end: '', tag_type: 'bug', note: '' })
   const [saving, setSaving] = useState(false)
 
+  // Clips are cut server-side per tag; poll while any are still being extracted
+  useEffect(() => {
+    let timer
+    const loadClips = async () => {
+      try {
+        const { data } = await axios.get(`/api/submissions/${submission.id}/clips`)
+        setClips(data)
+        if (data.some((c) => c.status === 'pending')) timer = setTimeout(loadClips, 3000)
+      } catch {
+        setClips([])
+      }
+    }
+    loadClips()
+    return () => clearTimeout(timer)
+  }, [submission.id, tags])
+
+  const clipFor = (tag) => clips.find((c) => c.start_seconds === tag.start_seconds && c.end_seconds === tag.end_seconds && c.status === 'ready')
+
   const handleAddTag = async () => {
     const startSec = parseTimeToSeconds(tagForm.start)
     const endSec = parseTimeToSeconds(tagForm.end)
@@ -1915,12 +1939,17 @@ function VideoTagPanel({ submission, onUpdate, setError, onSeek }) {
       ) : (
         <div className="flex flex-wrap gap-2">
           {tags.map((tag, i) => (
-            <button key={i} type="button" onClick={() => onSeek(tag.start_seconds)} className={`inline-flex items-center gap-1.5 px-2.5 py-1.5 text-xs font-medium rounded-lg border cursor-pointer hover:opacity-80 transition-opacity ${TAG_COLORS[tag.tag_type] || 'bg-gray-100 text-gray-600 border-gray-200'}`} title={tag.note || tag.tag_type}>
+            <span key={i} className="inline-flex items-center gap-1">
+            <button type="button" onClick={() => onSeek(tag.start_seconds)} className={`inline-flex items-center gap-1.5 px-2.5 py-1.5 text-xs font-medium rounded-lg border cursor-pointer hover:opacity-80 transition-opacity ${TAG_COLORS[tag.tag_type] || 'bg-gray-100 text-gray-600 border-gray-200'}`} title={tag.note || tag.tag_type}>
               <span>{formatTime(tag.start_seconds)}-{formatTime(tag.end_seconds)}</span>
               <span className="opacity-70">{tag.tag_type.replace('-', ' ')}</span>
               {tag.note && <span className="max-w-[120px] truncate">{tag.note}</span>}
               <span onClick={(e) => { e.stopPropagation(); handleRemoveTag(i) }} className="ml-1 opacity-50 hover:opacity-100">&times;</span>
             </button>
+            {clipFor(tag) && (
+              <a href={`${clipFor(tag).clip_url}#t=${clipFor(tag).start_offset}`} target="_blank" rel="noopener noreferrer" className="text-xs text-primary-600 hover:text-primary-700 font-medium">Clip</a>
+            )}
+            </span>
           ))}
         </div>
       )}